@@ -300,9 +300,11 @@ function canonicalJson(obj) {
     return JSON.stringify(sortObject(obj));
 }
 
+// Firma v2 (X-Signature-Version): HMAC sobre los bytes exactos del cuerpo que se envía,
+// así el analizador verifica sin parsear ni re-serializar el JSON
 function signNodeToAnalyzer(payload) {
     const ts = Date.now().toString();
-    const body = canonicalJson(payload);
+    const body = JSON.stringify(payload);
     const msg = `${ts}.${body}`;
 
     const sig = crypto
@@ -310,7 +312,7 @@ function signNodeToAnalyzer(payload) {
         .update(msg)
         .digest("hex");
 
-    return { sig, ts };
+    return { sig, ts, body };
 }
 
 // Funcion para firmar comunicacion con con el plug-in -> pass autofill
@@ -1087,7 +1089,7 @@ app.post("/api/registro-finalizado", async (req, res) => {
                 throw new Error("Analyzer no disponible");
             }
 
-            const { sig, ts } = signNodeToAnalyzer(payload);
+            const { sig, ts, body } = signNodeToAnalyzer(payload);
 
             try {
                 const response = await fetch(`${ANALYSIS_BASE_URL}/api/biometric-registration`, {
@@ -1095,9 +1097,10 @@ app.post("/api/registro-finalizado", async (req, res) => {
                     headers: {
                         "Content-Type": "application/json",
                         "X-Payload-Signature": sig,
+                        "X-Signature-Version": "v2",
                         "X-Timestamp": ts
                     },
-                    body: JSON.stringify(payload)
+                    body
                 });
                 if (!response.ok) {
                     if (response.status === 405) {
@@ -1,23 +1,28 @@
 print("🚨 SERVER KEY MANAGER CARGADO")
 # app.py
-from fastapi import FastAPI, HTTPException, Header
-from models.schemas import StoreEncryptedItemRequest, GetKeyMaterialRequest, GenerationServerRequest
+from fastapi import FastAPI, HTTPException, Header, Request, Response
+from fastapi.responses import JSONResponse
+from models.schemas import StoreEncryptedItemRequest, GetKeyMaterialRequest, GenerationServerRequest, GenerationServerBatchRequest, GenerationServerBulkRequest
 from services.key_service import store_key, get_key_material
 from services.password_storage import store_password_ciphertext
-from services.storage import vault_password
-from services.password_service import get_plain_password_for_user
+from services.storage import vault_password, vault_keys
+from services.versioning import run_compactor, COMPACT_INTERVAL_SECONDS
+from services.indexes import bootstrap_indexes
+from services.password_service import retrieve_password_for_user, retrieve_passwords_for_user
 from services.auth_service import verify_auth_token_with_backend
 from cryptography.hazmat.primitives import serialization
-from km_crypto.aes_gcm import encrypt_with_kdb
-from services import password_generation
-from services.plugin_handshake_service import (get_or_create_server_private_key, store_plugin_public_key, load_plugin_public_key)
-from km_crypto.plugin_channel_crypto import envelope_decrypt, envelope_encrypt, derive_shared_channel_key, verify_request_signature, resolve_user_handle
+from services.plugin_handshake_service import (get_or_create_server_private_key, reload_server_private_key, store_plugin_public_key, get_channel_key)
+from services.channel_key_cache import channel_key_cache
+from services.data_keys import password_deks, rewrap_data_keys
+from services.reencryption import run_reencryption, REENCRYPT_RATE
+from services.crypto_workers import crypto_pool, generar_material_password, CryptoPoolSaturated, CRYPTO_RETRY_AFTER_SECONDS
+from km_crypto.plugin_channel_crypto import envelope_decrypt, envelope_encrypt, verify_request_signature, resolve_user_handle
 from datetime import datetime
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
-from typing import Optional
-import uuid, os, json, base64
+from typing import List, Optional
+import uuid, os, json, base64, asyncio
 import hmac, hashlib
-from config import K_DB_PASS
 from flask import Flask
 from config import KEY_MANAGER_ALLOWED_CLIENTS
 
@@ -25,7 +30,46 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
-app = FastAPI(title="Key Manager Secure API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Índices de vault_keys / vault_password / plugin_keys y verificación de planes (KM_INDEX_CHECK)
+    await bootstrap_indexes()
+    # Workers del pool criptográfico (KM_CRYPTO_WORKERS)
+    await crypto_pool.start()
+    # Rotación de la KEK (KM_KEK_VERSION): re-envolver las DEK que sigan con la versión anterior
+    await rewrap_data_keys()
+    # Migración perezosa de registros cifrados directamente con la KEK (KM_REENCRYPT_RATE=0 la desactiva)
+    recifrado = None
+    if REENCRYPT_RATE > 0:
+        recifrado = asyncio.create_task(run_reencryption())
+    # Compactación de versiones reemplazadas (KM_COMPACT_INTERVAL=0 la desactiva)
+    compactador = None
+    if COMPACT_INTERVAL_SECONDS > 0:
+        compactador = asyncio.create_task(run_compactor([vault_keys, vault_password]))
+    yield
+    for tarea in (compactador, recifrado):
+        if tarea is None:
+            continue
+        tarea.cancel()
+        try:
+            await tarea
+        except asyncio.CancelledError:
+            pass
+    await crypto_pool.shutdown()
+
+
+app = FastAPI(title="Key Manager Secure API", lifespan=lifespan)
+
+
+@app.exception_handler(CryptoPoolSaturated)
+async def crypto_pool_saturated(request: Request, exc: CryptoPoolSaturated):
+    # Control de admisión: el cliente reintenta en lugar de esperar detrás de una cola larga
+    print(f"⏳ {request.url.path} rechazado: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Crypto workers busy"},
+        headers={"Retry-After": str(CRYPTO_RETRY_AFTER_SECONDS)}
+    )
 
 # ================ Configuración de seguridad para plugin ==================
 # Allowlist de plugins permitidos (plugin_id)->para asegurar que solo plugin autorizado acceda
@@ -87,8 +131,8 @@ async def store_encrypted_item(req: StoreEncryptedItemRequest):
         # AAD coherente con el resto del KM
         aad = f"{req.user_id}|{req.module_type}|{req.purpose}".encode("utf-8")
 
-        # Cifrar con AES-GCM(K_DB_PASS)
-        encrypted_ct = encrypt_with_kdb(K_DB_PASS, raw_ciphertext, aad=aad)
+        # Cifrar con AES-GCM(DEK del usuario, envuelta con K_DB_PASS)
+        dek_id, encrypted_ct = await password_deks.encrypt(req.user_id, raw_ciphertext, aad)
 
         doc = {
             "vault_id": vault_id,
@@ -99,6 +143,7 @@ async def store_encrypted_item(req: StoreEncryptedItemRequest):
             "purpose": req.purpose,
             "platform": req.platform,
             "ciphertext_encrypted": encrypted_ct,   # <-- unificado
+            "dek_id": dek_id,
             "ciphertext_type": req.ciphertext_type,
             "metadata": req.metadata or {},
             "created_at": datetime.utcnow(),
@@ -132,15 +177,86 @@ class KeyManagerPayload(BaseModel):
 # ---------------------------
 #  RECIBIR CONTRASEÑA
 # ---------------------------
+def verificar_api_key(authorization: str | None) -> None:
+    if not authorization or authorization.replace("Bearer ", "") != API_KEY:
+        print("❌ ERROR: Invalid API key")
+        raise HTTPException(status_code=401, detail="Invalid API key")
+
+
+async def procesar_generacion(
+    user_id: str,
+    email: str,
+    platform: str,
+    password: str,
+    numeric_code: int,
+    psy_values: list,
+    metadata: dict
+) -> str:
+    """
+    Exponente -> clave privada ECC -> cifrado de la contraseña -> guardado en
+    vault_keys y vault_password. Devuelve el key_id.
+    Idempotente por request_id + plataforma: si ya se guardó, devuelve el key_id existente
+    (el generador puede reentregar un payload desde su outbox), aunque esa versión ya se haya
+    reemplazado: reentregar un payload antiguo no debe crear una versión nueva.
+    """
+    request_id = (metadata or {}).get("request_id")
+    if request_id:
+        previo = await vault_password.find_one(
+            {
+                "user_id": user_id,
+                "platform": platform.lower().strip(),
+                "metadata.request_id": request_id
+            },
+            {"pass_id": 1}
+        )
+        if previo:
+            print(f"↩️ request_id={request_id} ya procesado, se reutiliza")
+            return previo["pass_id"]
+
+    # Exponente -> clave privada ECC -> cifrado de la contraseña -> DER, en el pool criptográfico
+    # (pow de 256 bits, derive_private_key, ECDH efímero, HKDF y AES-GCM fuera del event loop)
+    print("➡️ Generando clave privada ECC y cifrando contraseña...")
+    priv_bytes, cipher_struct = await crypto_pool.run(
+        generar_material_password, psy_values, numeric_code, password
+    )
+    print("✔ Clave privada ECC y cipher_struct generados")
+
+    # Guardar private key en vault_keys
+    print("➡️ Guardando clave privada en vault_keys...")
+    key_id = await store_key(
+        user_id=user_id,
+        email=email,
+        module_type="PASSWORD_GENERATOR",
+        purpose="ECC_PRIVATE_KEY",
+        platform=platform,
+        key_material_raw=priv_bytes,
+        key_algo="ECC",
+        metadata=metadata
+    )
+    #print("✔ Key guardada con key_id:", key_id)
+    platform = platform.lower().strip()
+    # Guardar ciphertext en vault_passwords
+    print("➡️ Guardando ciphertext en vault_password...")
+    await store_password_ciphertext(
+        pass_id=key_id,
+        user_id=user_id,
+        email=email,
+        platform= platform,
+        cipher_struct=cipher_struct,
+        key_algo="ECC",
+        metadata=metadata
+    )
+    print("✔ Ciphertext guardado correctamente")
+    return key_id
+
+
 @app.post("/process_generation")
 async def process_generation(
     req: GenerationServerRequest,
     authorization: str = Header(None)
 ):
     # Validar API KEY
-    if not authorization or authorization.replace("Bearer ", "") != API_KEY:
-        print("❌ ERROR: Invalid API key")
-        raise HTTPException(status_code=401, detail="Invalid API key")
+    verificar_api_key(authorization)
     
     #print("\n======================")
     #print(" DEBUG: Payload recibido en KeyManager")
@@ -160,67 +276,116 @@ async def process_generation(
             "request_id": req.request_id,
             "session_token": req.session_token
         }
-
-        # Calcular exponente
-        print("➡️ Calculando exponente...")
-        exponente = password_generation.calcular_exponente(req.psy_values, req.numeric_code)
-        print("✔ Exponente generado")
-
-        # ECC private key + public key
-        print("➡️ Construyendo clave privada ECC...")
-        llave_privada = password_generation.construir_clave_privada(exponente)
-        if llave_privada is None:
-            raise ValueError("No se pudo construir la clave privada ECC")
-        print("✔ Clave privada ECC OK")
-
-        llave_publica = llave_privada.public_key()
-        print("✔ Clave pública ECC OK")
-
-        # Cifrar la contraseña
-        print("➡️ Cifrando contraseña mediante ECC...")
-        pw_bytes = req.password.encode()
-        cipher_struct = password_generation.ecc_encriptar_password(llave_publica, pw_bytes)
-        print("✔ Cipher_struct generado")
-
-        # Serializar private key
-        print("➡️ Serializando clave privada a DER...")
-        priv_bytes = llave_privada.private_bytes(
-            encoding=serialization.Encoding.DER,
-            format=serialization.PrivateFormat.PKCS8,
-            encryption_algorithm=serialization.NoEncryption()
-        )
-        #print("✔ private_key_bytes length:", len(priv_bytes))
-
-
-        # Guardar private key en vault_keys
-        print("➡️ Guardando clave privada en vault_keys...")
-        key_id = await store_key(
+        key_id = await procesar_generacion(
             user_id=req.user_id,
             email=req.email,
-            module_type="PASSWORD_GENERATOR",
-            purpose="ECC_PRIVATE_KEY",
             platform=req.platform,
-            key_material_raw=priv_bytes,
-            key_algo="ECC",
+            password=req.password,
+            numeric_code=req.numeric_code,
+            psy_values=req.psy_values,
             metadata=metadata
         )
-        #print("✔ Key guardada con key_id:", key_id)
-        platform = req.platform.lower().strip()
-        # Guardar ciphertext en vault_passwords
-        print("➡️ Guardando ciphertext en vault_password...")
-        await store_password_ciphertext(
-            pass_id=key_id,
-            user_id=req.user_id,
-            email=req.email,
-            platform= platform,
-            cipher_struct=cipher_struct,
-            key_algo="ECC",
-            metadata=metadata
-        )
-        print("✔ Ciphertext guardado correctamente")
-
         return {"status": "ok", "key_id": key_id}
 
+    except CryptoPoolSaturated:
+        raise
+    except Exception as e:
+        print("🔥 EXCEPCIÓN DETECTADA EN KM:", str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/process_generation_bulk")
+async def process_generation_bulk(
+    req: GenerationServerBulkRequest,
+    authorization: str = Header(None)
+):
+    """
+    Varias peticiones /process_generation (de distintos usuarios) en una sola llamada,
+    usada por el outbox del generador. El resultado es por request_id para que el
+    generador solo reintente las que fallaron.
+    """
+    verificar_api_key(authorization)
+
+    results = {}
+    # Los items se procesan a la vez, como mucho uno por worker del pool criptográfico
+    limite = asyncio.Semaphore(max(1, crypto_pool.workers))
+
+    async def procesar_item(item):
+        if item.purpose != "PASSWORD":
+            results[item.request_id] = {
+                "status": "error",
+                "code": 400,
+                "detail": f"Invalid purpose: {item.purpose}. Expected 'PASSWORD'."
+            }
+            return
+        try:
+            async with limite:
+                key_id = await procesar_generacion(
+                    user_id=item.user_id,
+                    email=item.email,
+                    platform=item.platform,
+                    password=item.password,
+                    numeric_code=item.numeric_code,
+                    psy_values=item.psy_values,
+                    metadata={
+                        "request_id": item.request_id,
+                        "session_token": item.session_token
+                    }
+                )
+            results[item.request_id] = {"status": "ok", "key_id": key_id}
+        except CryptoPoolSaturated as e:
+            results[item.request_id] = {"status": "error", "code": 503, "detail": str(e)}
+        except Exception as e:
+            print("🔥 EXCEPCIÓN DETECTADA EN KM:", str(e))
+            results[item.request_id] = {"status": "error", "code": 500, "detail": str(e)}
+
+    await asyncio.gather(*(procesar_item(item) for item in req.items))
+    return {"status": "ok", "results": results}
+
+
+@app.post("/process_generation_batch")
+async def process_generation_batch(
+    req: GenerationServerBatchRequest,
+    authorization: str = Header(None)
+):
+    """
+    Igual que /process_generation pero con una contraseña por plataforma
+    para el mismo usuario en una sola petición.
+    """
+    verificar_api_key(authorization)
+
+    if req.purpose != "PASSWORD":
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid purpose: {req.purpose}. Expected 'PASSWORD'."
+        )
+
+    try:
+        metadata = {
+            "request_id": req.request_id,
+            "session_token": req.session_token
+        }
+        # Una plataforma por worker del pool criptográfico a la vez
+        limite = asyncio.Semaphore(max(1, crypto_pool.workers))
+
+        async def procesar_item(item):
+            async with limite:
+                return await procesar_generacion(
+                    user_id=req.user_id,
+                    email=req.email,
+                    platform=item.platform,
+                    password=item.password,
+                    numeric_code=item.numeric_code,
+                    psy_values=req.psy_values,
+                    metadata=metadata
+                )
+
+        resultados = await asyncio.gather(*(procesar_item(item) for item in req.items))
+        key_ids = {item.platform: key_id for item, key_id in zip(req.items, resultados)}
+        return {"status": "ok", "key_ids": key_ids}
+
+    except CryptoPoolSaturated:
+        raise
     except Exception as e:
         print("🔥 EXCEPCIÓN DETECTADA EN KM:", str(e))
         raise HTTPException(status_code=500, detail=str(e))
@@ -239,6 +404,31 @@ async def init_handshake():
         "server_public_key_b64": base64.b64encode(pub_bytes).decode("utf-8")
     }
 
+@app.post("/reload_server_key")
+async def reload_server_key(authorization: str = Header(None)):
+    """Recarga desde Mongo la clave de handshake cacheada en este proceso."""
+    verificar_api_key(authorization)
+    await reload_server_private_key()
+    return {"status": "ok"}
+
+@app.get("/channel_cache_stats")
+async def channel_cache_stats(authorization: str = Header(None)):
+    """Contadores de la caché de claves de canal (hits, misses, expulsiones, invalidaciones)."""
+    verificar_api_key(authorization)
+    return channel_key_cache.stats()
+
+@app.post("/rewrap_data_keys")
+async def rewrap_data_keys_endpoint(authorization: str = Header(None)):
+    """Re-envuelve con la KEK actual las DEK que sigan con una anterior (también se hace al arrancar)."""
+    verificar_api_key(authorization)
+    return {"status": "ok", "rewrapped": await rewrap_data_keys()}
+
+@app.get("/crypto_pool_stats")
+async def crypto_pool_stats(authorization: str = Header(None)):
+    """Estado del pool criptográfico (pendientes, completadas, rechazadas por saturación)."""
+    verificar_api_key(authorization)
+    return crypto_pool.stats()
+
 class PluginKeyAuthRequest(BaseModel):
     user_handle: str
     plugin_id: str
@@ -278,15 +468,12 @@ class SendKeysEnvelope(BaseModel):
 async def send_keys_enveloped(req: SendKeysEnvelope):
     # allowlist de plugins permitidos
     enforce_allowed_plugin(req.plugin_id)
-    # Recuperar server ECC private (para handshake / channel)
-    server_priv = await get_or_create_server_private_key()
-    plugin_pub = await load_plugin_public_key(req.user_id, req.plugin_id)
+    # Clave de canal (caché LRU; si no está: server ECC private + clave pública del plugin)
+    channel_key = await get_channel_key(req.user_id, req.plugin_id)
 
-    if plugin_pub is None:
+    if channel_key is None:
         raise HTTPException(status_code=400, detail="Plugin key not registered")
 
-    channel_key = derive_shared_channel_key(server_priv, plugin_pub)
-
     # Descifrar
     plaintext_json = envelope_decrypt(channel_key, req.encrypted_payload)
 
@@ -321,15 +508,12 @@ class GetKeysEnvelope(BaseModel):
 async def get_keys_enveloped(req: GetKeysEnvelope):
     # allowlist de plugins permitidos
     enforce_allowed_plugin(req.plugin_id)
-    # Recuperar server ECC private (para handshake / channel)
-    server_priv = await get_or_create_server_private_key()
-    plugin_pub = await load_plugin_public_key(req.user_id, req.plugin_id)
+    # Clave de canal (caché LRU; si no está: server ECC private + clave pública del plugin)
+    channel_key = await get_channel_key(req.user_id, req.plugin_id)
 
-    if plugin_pub is None:
+    if channel_key is None:
         raise HTTPException(status_code=400, detail="Plugin key not registered")
 
-    channel_key = derive_shared_channel_key(server_priv, plugin_pub)
-
     key_bytes, key_id = await get_key_material(
         user_id=req.user_id,
         email=req.email,  
@@ -361,7 +545,7 @@ class GetPasswordEnvelope(BaseModel):
 
 
 @app.post("/get_password_enveloped")
-async def get_password_enveloped(req: GetPasswordEnvelope):
+async def get_password_enveloped(req: GetPasswordEnvelope, response: Response):
     #print("DEBUG req:", req)
     """
     Recupera la contraseña final del usuario:
@@ -379,38 +563,28 @@ async def get_password_enveloped(req: GetPasswordEnvelope):
     except Exception:
         raise HTTPException(status_code=403, detail="Invalid user handle")
 
-    # Buscar ciphertext ECC real de la contraseña
+    # Ciphertext ECC (vault_password), clave privada (vault_keys) y clave de canal KM ↔ Plugin
+    # se piden en paralelo; cada lectura una sola vez y con proyección
     platform = req.platform.lower().strip() if req.platform else None
-    password_entry = await vault_password.find_one({
-        "user_id": user_id,
-        "platform": platform,
-        "active": True
-    })
-
-    #print("user_id from handle:", user_id)
-    #print("user_id in vault_password:",
-      #password_entry["user_id"] if password_entry else None)
-
+    resultado = await retrieve_password_for_user(
+        user_id,
+        platform,
+        extra_lookup=get_channel_key(user_id, req.plugin_id)
+    )
+    timings = resultado["timings_ms"]
+    response.headers["Server-Timing"] = ", ".join(
+        f"{nombre.removesuffix('_ms')};dur={ms}" for nombre, ms in timings.items()
+    )
+    print(f"⏱️ get_password_enveloped {timings}")
 
-    if password_entry is None:
+    if not resultado["found"]:
         raise HTTPException(status_code=404, detail="Password ciphertext not found")
-    # Recuperar server ECC private (para handshake / channel)
-    server_priv = await get_or_create_server_private_key()
-
-    #  Recuperar publicKey del plugin (registrada durante handshake)
-    plugin_pub = await load_plugin_public_key(user_id, req.plugin_id)
-    if plugin_pub is None:
+    # Canal seguro KM ↔ Plugin (ECDH + HKDF con la publicKey registrada durante el handshake; caché LRU)
+    channel_key = resultado["extra"]
+    if channel_key is None:
         raise HTTPException(status_code=400, detail="Plugin key not registered")
 
-    # Derivar canal seguro KM ↔ Plugin (ECDH + HKDF)
-    channel_key = derive_shared_channel_key(server_priv, plugin_pub)
-  
-    
-    plain_password = await get_plain_password_for_user(
-        password_entry["email"],
-        platform
-    )
-
+    plain_password = resultado["password"]
     if plain_password is None:
         raise HTTPException(status_code=500, detail="Password decryption failed")
 
@@ -427,3 +601,53 @@ async def get_password_enveloped(req: GetPasswordEnvelope):
         "status": "ok",
         "encrypted_password": encrypted_payload
     }
+
+
+# GET PASSWORDS (ECC) DE TODAS LAS PLATAFORMAS EN UN SOLO ENVELOPE
+
+
+class GetPasswordsBulkEnvelope(BaseModel):
+    user_handle: str
+    plugin_id: str
+    platforms: Optional[List[str]] = None  # None -> todas las plataformas activas del usuario
+
+
+@app.post("/get_passwords_enveloped_bulk")
+async def get_passwords_enveloped_bulk(req: GetPasswordsBulkEnvelope, response: Response):
+    """
+    Igual que /get_password_enveloped pero para todas las plataformas del usuario a la vez:
+    handle, clave de canal y lecturas de vault_password / vault_keys una sola vez, descifrado
+    en paralelo y un único envelope con {platform: password}.
+    """
+    enforce_allowed_plugin(req.plugin_id)
+
+    try:
+        user_id = resolve_user_handle(req.user_handle)
+    except Exception:
+        raise HTTPException(status_code=403, detail="Invalid user handle")
+
+    platforms = sorted({p.lower().strip() for p in req.platforms if p and p.strip()}) if req.platforms else None
+    channel_key, resultado = await asyncio.gather(
+        get_channel_key(user_id, req.plugin_id),
+        retrieve_passwords_for_user(user_id, platforms)
+    )
+    timings = resultado["timings_ms"]
+    response.headers["Server-Timing"] = ", ".join(
+        f"{nombre.removesuffix('_ms')};dur={ms}" for nombre, ms in timings.items()
+    )
+    print(f"⏱️ get_passwords_enveloped_bulk {len(resultado['passwords'])} plataformas {timings}")
+
+    if channel_key is None:
+        raise HTTPException(status_code=400, detail="Plugin key not registered")
+
+    encrypted_payload = envelope_encrypt(
+        channel_key,
+        json.dumps(resultado["passwords"], ensure_ascii=False).encode("utf-8")
+    )
+
+    return {
+        "status": "ok",
+        "count": len(resultado["passwords"]),
+        "failed": resultado["failed"],
+        "encrypted_passwords": encrypted_payload
+    }
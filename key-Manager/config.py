@@ -2,7 +2,7 @@
 # Configuración -> derivar clave maestra -> con Argon2id para cifrado en reposo
 import os
 from dotenv import load_dotenv
-from km_crypto.kdf import derive_kdb
+from km_crypto.kdb_cache import obtain_kdbs
 
 load_dotenv()
 
@@ -17,12 +17,49 @@ MONGO_DB_PASS = os.getenv("MONGO_DB_PASS")
 # ====== KDF para almacenar KEYS (K_DB_KEYS) ======
 MASTER_SECRET_KEYS = os.getenv("KM_MASTER_SECRET_KEYS").encode("utf-8")
 KDB_SALT_KEYS = os.getenv("KM_KDB_SALT_KEYS").encode("utf-8")
-K_DB_KEYS = derive_kdb(MASTER_SECRET_KEYS, KDB_SALT_KEYS)
 
 # ====== KDF para almacenar PASSWORDS (K_DB_PASS) ======
 MASTER_SECRET_PASS = os.getenv("KM_MASTER_SECRET_PASS").encode("utf-8")
 KDB_SALT_PASS = os.getenv("KM_KDB_SALT_PASS").encode("utf-8")
-K_DB_PASS = derive_kdb(MASTER_SECRET_PASS, KDB_SALT_PASS)
+
+# ====== Rotación de la clave maestra ======
+# K_DB_KEYS / K_DB_PASS son las KEK que envuelven las claves de datos (DEK) de cada DB
+# (ver services/data_keys.py). Para rotar: nuevo KM_MASTER_SECRET_*, el anterior en
+# KM_MASTER_SECRET_*_PREVIOUS y KM_KEK_VERSION + 1; al arrancar se re-envuelven solo las DEK.
+KEK_VERSION = int(os.getenv("KM_KEK_VERSION", "1"))
+MASTER_SECRET_KEYS_PREVIOUS = os.getenv("KM_MASTER_SECRET_KEYS_PREVIOUS")
+MASTER_SECRET_PASS_PREVIOUS = os.getenv("KM_MASTER_SECRET_PASS_PREVIOUS")
+
+# Las derivaciones Argon2id se hacen en paralelo; con KM_KDB_CACHE_PATH se reutilizan
+# entre arranques desde una caché local sellada (ver km_crypto/kdb_cache.py)
+_kdb_inputs = {
+    "K_DB_KEYS": (MASTER_SECRET_KEYS, KDB_SALT_KEYS),
+    "K_DB_PASS": (MASTER_SECRET_PASS, KDB_SALT_PASS),
+}
+if MASTER_SECRET_KEYS_PREVIOUS:
+    _kdb_inputs["K_DB_KEYS_PREVIOUS"] = (MASTER_SECRET_KEYS_PREVIOUS.encode("utf-8"), KDB_SALT_KEYS)
+if MASTER_SECRET_PASS_PREVIOUS:
+    _kdb_inputs["K_DB_PASS_PREVIOUS"] = (MASTER_SECRET_PASS_PREVIOUS.encode("utf-8"), KDB_SALT_PASS)
+
+KDB_CACHE_PATH = os.getenv("KM_KDB_CACHE_PATH") or None
+_kdbs, KDB_STARTUP_REPORT = obtain_kdbs(_kdb_inputs, KDB_CACHE_PATH)
+K_DB_KEYS = _kdbs["K_DB_KEYS"]
+K_DB_PASS = _kdbs["K_DB_PASS"]
+
+# Versión de KEK -> clave (la actual y, durante una rotación, la anterior)
+KEK_KEYRING_KEYS = {KEK_VERSION: K_DB_KEYS}
+KEK_KEYRING_PASS = {KEK_VERSION: K_DB_PASS}
+if "K_DB_KEYS_PREVIOUS" in _kdbs:
+    KEK_KEYRING_KEYS[KEK_VERSION - 1] = _kdbs["K_DB_KEYS_PREVIOUS"]
+if "K_DB_PASS_PREVIOUS" in _kdbs:
+    KEK_KEYRING_PASS[KEK_VERSION - 1] = _kdbs["K_DB_PASS_PREVIOUS"]
+print(
+    f"⏱️ Claves KDB listas en {KDB_STARTUP_REPORT['total_ms']} ms (caché: {KDB_STARTUP_REPORT['cache']}): "
+    + ", ".join(
+        f"{nombre}={datos['source']}" + (f" {datos['ms']} ms" if "ms" in datos else "")
+        for nombre, datos in KDB_STARTUP_REPORT["keys"].items()
+    )
+)
 
 
 BACKEND_BASE_URL = os.getenv("BACKEND_BASE_URL")
@@ -0,0 +1,151 @@
+# Caché local sellada de las claves K_DB derivadas con Argon2id
+# Cada worker del KM derivaba K_DB_KEYS y K_DB_PASS al importar config (2 x 64 MB de Argon2id).
+# Con KM_KDB_CACHE_PATH definido, el primer arranque guarda las claves cifradas con AES-GCM bajo
+# una clave de envoltura ligada a la máquina (machine-id + usuario + ruta del archivo) y los
+# siguientes arranques las leen sin pasar por el KDF.
+# Cada entrada lleva una huella HMAC(secreto, sal, parámetros Argon2): si cambia el secreto, la sal
+# o los parámetros, la entrada deja de coincidir y se vuelve a derivar.
+import base64
+import hashlib
+import hmac
+import json
+import os
+import socket
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from km_crypto import kdf
+
+CACHE_VERSION = 1
+_MACHINE_ID_PATHS = ("/etc/machine-id", "/var/lib/dbus/machine-id")
+
+
+def _machine_material() -> bytes:
+    """Identificador estable de la máquina (machine-id en Linux; MAC + hostname en otro caso)."""
+    for ruta in _MACHINE_ID_PATHS:
+        try:
+            with open(ruta, "rb") as f:
+                valor = f.read().strip()
+            if valor:
+                return valor
+        except OSError:
+            continue
+    return f"{uuid.getnode():012x}:{socket.gethostname()}".encode("utf-8")
+
+
+def _wrapping_key(path: str) -> bytes:
+    usuario = str(os.getuid()) if hasattr(os, "getuid") else os.environ.get("USERNAME", "")
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=b"km-kdb-cache-v1",
+        info=f"{usuario}:{os.path.abspath(path)}".encode("utf-8"),
+    ).derive(_machine_material())
+
+
+def _fingerprint(wrapping_key: bytes, name: str, secret: bytes, salt: bytes) -> str:
+    # Longitudes como prefijo: (secreto, sal) distintos nunca producen el mismo mensaje
+    params = f"{kdf.ARGON2_TIME_COST}:{kdf.ARGON2_MEMORY_COST}:{kdf.ARGON2_PARALLELISM}:{kdf.ARGON2_HASH_LEN}"
+    mensaje = b"|".join([
+        name.encode("utf-8"), params.encode("ascii"),
+        len(secret).to_bytes(4, "big") + secret,
+        len(salt).to_bytes(4, "big") + salt,
+    ])
+    return hmac.new(wrapping_key, mensaje, hashlib.sha256).hexdigest()
+
+
+def load_cached_kdbs(path: str, inputs: Dict[str, Tuple[bytes, bytes]]) -> Dict[str, bytes]:
+    """Claves válidas de la caché (las entradas obsoletas, ajenas o corruptas se ignoran)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            contenido = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Caché KDB ilegible ({path}): {e}. Se deriva de nuevo.")
+        return {}
+    if contenido.get("version") != CACHE_VERSION:
+        return {}
+
+    clave_envoltura = _wrapping_key(path)
+    aes = AESGCM(clave_envoltura)
+    claves = {}
+    for nombre, (secreto, sal) in inputs.items():
+        entrada = contenido.get("entries", {}).get(nombre)
+        if not entrada:
+            continue
+        huella = _fingerprint(clave_envoltura, nombre, secreto, sal)
+        if not hmac.compare_digest(entrada.get("fingerprint", ""), huella):
+            continue
+        try:
+            datos = base64.b64decode(entrada["sealed"])
+            claves[nombre] = aes.decrypt(datos[:12], datos[12:], f"{nombre}:{huella}".encode("utf-8"))
+        except Exception:
+            # Otra máquina/usuario (clave de envoltura distinta) o archivo alterado
+            print(f"⚠️ Entrada {nombre} de la caché KDB no se pudo abrir. Se deriva de nuevo.")
+    return claves
+
+
+def store_cached_kdbs(path: str, inputs: Dict[str, Tuple[bytes, bytes]], keys: Dict[str, bytes]) -> None:
+    """Escribe la caché completa de forma atómica y solo legible por el usuario del proceso."""
+    clave_envoltura = _wrapping_key(path)
+    aes = AESGCM(clave_envoltura)
+    entradas = {}
+    for nombre, clave in keys.items():
+        secreto, sal = inputs[nombre]
+        huella = _fingerprint(clave_envoltura, nombre, secreto, sal)
+        nonce = os.urandom(12)
+        sellado = nonce + aes.encrypt(nonce, clave, f"{nombre}:{huella}".encode("utf-8"))
+        entradas[nombre] = {"fingerprint": huella, "sealed": base64.b64encode(sellado).decode("ascii")}
+
+    directorio = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directorio, exist_ok=True)
+    temporal = f"{path}.{os.getpid()}.tmp"
+    descriptor = os.open(temporal, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "entries": entradas}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, path)
+    except OSError:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def obtain_kdbs(inputs: Dict[str, Tuple[bytes, bytes]], cache_path: Optional[str] = None) -> Tuple[Dict[str, bytes], Dict]:
+    """
+    Devuelve (claves, informe). Las claves que no están en la caché se derivan en paralelo y,
+    si hay caché configurada, se guardan para el siguiente arranque.
+    """
+    inicio = time.perf_counter()
+    informe = {"cache": cache_path or "deshabilitada", "keys": {}}
+
+    claves = {}
+    if cache_path:
+        t = time.perf_counter()
+        claves = load_cached_kdbs(cache_path, inputs)
+        informe["cache_read_ms"] = round((time.perf_counter() - t) * 1000, 2)
+    for nombre in claves:
+        informe["keys"][nombre] = {"source": "cache"}
+
+    pendientes = {nombre: valor for nombre, valor in inputs.items() if nombre not in claves}
+    if pendientes:
+        derivadas, tiempos = kdf.derive_kdbs_parallel(pendientes)
+        claves.update(derivadas)
+        for nombre, segundos in tiempos.items():
+            informe["keys"][nombre] = {"source": "argon2id", "ms": round(segundos * 1000, 2)}
+        if cache_path:
+            try:
+                store_cached_kdbs(cache_path, inputs, claves)
+            except OSError as e:
+                print(f"⚠️ No se pudo escribir la caché KDB ({cache_path}): {e}")
+
+    informe["total_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+    return claves, informe
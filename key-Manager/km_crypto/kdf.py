@@ -1,12 +1,41 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Tuple
+
 from argon2.low_level import hash_secret_raw, Type
 
+# Parámetros Argon2id de las claves de cifrado en reposo (forman parte de la huella de la caché)
+ARGON2_TIME_COST = 3
+ARGON2_MEMORY_COST = 64 * 1024  # 64MB
+ARGON2_PARALLELISM = 2
+ARGON2_HASH_LEN = 32
+
+
 def derive_kdb(master_secret: bytes, salt: bytes) -> bytes:
     return hash_secret_raw(
         secret=master_secret,
         salt=salt,
-        time_cost=3,
-        memory_cost=64 * 1024,  # 64MB
-        parallelism=2,
-        hash_len=32,
+        time_cost=ARGON2_TIME_COST,
+        memory_cost=ARGON2_MEMORY_COST,
+        parallelism=ARGON2_PARALLELISM,
+        hash_len=ARGON2_HASH_LEN,
         type=Type.ID
     )
+
+
+def derive_kdbs_parallel(inputs: Dict[str, Tuple[bytes, bytes]]) -> Tuple[Dict[str, bytes], Dict[str, float]]:
+    """
+    Deriva varias claves a la vez, una por hilo (argon2-cffi libera el GIL durante el hash).
+    inputs: nombre -> (master_secret, salt). Devuelve (claves, segundos por clave).
+    """
+    def derivar(nombre):
+        inicio = time.perf_counter()
+        secreto, sal = inputs[nombre]
+        return derive_kdb(secreto, sal), time.perf_counter() - inicio
+
+    if not inputs:
+        return {}, {}
+    with ThreadPoolExecutor(max_workers=len(inputs), thread_name_prefix="kdf") as pool:
+        resultados = dict(zip(inputs, pool.map(derivar, inputs)))
+    return ({nombre: clave for nombre, (clave, _) in resultados.items()},
+            {nombre: segundos for nombre, (_, segundos) in resultados.items()})
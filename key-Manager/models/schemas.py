@@ -28,4 +28,21 @@ class GenerationServerRequest(BaseModel):
     password: str
     numeric_code: int
     psy_values: list
-    request_id: str
\ No newline at end of file
+    request_id: str
+
+class GenerationBatchItem(BaseModel):
+    platform: str
+    password: str
+    numeric_code: int
+
+class GenerationServerBatchRequest(BaseModel):
+    user_id: str
+    session_token: str
+    email: str
+    purpose: str
+    psy_values: list
+    request_id: str
+    items: List[GenerationBatchItem]
+
+class GenerationServerBulkRequest(BaseModel):
+    items: List[GenerationServerRequest]
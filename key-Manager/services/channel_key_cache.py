@@ -0,0 +1,93 @@
+# services/channel_key_cache.py
+# Caché LRU con TTL de las claves de canal KM ↔ Plugin (ECDH + HKDF).
+# Clave: (user_id, plugin_id, huella de la clave pública del plugin). Un índice
+# (user_id, plugin_id) -> huella permite servir la clave sin leer plugin_keys en Mongo.
+# store_plugin_public_key invalida las entradas del par; el TTL acota cuánto puede tardar
+# una réplica en ver la re-registración hecha en otra.
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+CHANNEL_CACHE_MAX_ENTRIES = int(os.getenv("KM_CHANNEL_CACHE_MAX", "10000"))
+CHANNEL_CACHE_TTL_SECONDS = float(os.getenv("KM_CHANNEL_CACHE_TTL", "300"))
+
+
+def public_key_fingerprint(public_key: bytes) -> str:
+    return hashlib.sha256(public_key).hexdigest()
+
+
+class ChannelKeyCache:
+    def __init__(self, max_entries: int = CHANNEL_CACHE_MAX_ENTRIES, ttl: float = CHANNEL_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # (user_id, plugin_id, huella) -> (channel_key, expira)
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[bytes, float]]" = OrderedDict()
+        self._fingerprints: Dict[Tuple[str, str], str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, user_id: str, plugin_id: str) -> Optional[bytes]:
+        huella = self._fingerprints.get((user_id, plugin_id))
+        entrada = self._entries.get((user_id, plugin_id, huella)) if huella else None
+        if entrada is None:
+            self.misses += 1
+            return None
+        channel_key, expira = entrada
+        if expira <= time.monotonic():
+            self._remove((user_id, plugin_id, huella))
+            self.misses += 1
+            return None
+        self._entries.move_to_end((user_id, plugin_id, huella))
+        self.hits += 1
+        return channel_key
+
+    def put(self, user_id: str, plugin_id: str, public_key: bytes, channel_key: bytes) -> None:
+        huella = public_key_fingerprint(public_key)
+        anterior = self._fingerprints.get((user_id, plugin_id))
+        if anterior and anterior != huella:
+            self._remove((user_id, plugin_id, anterior))
+        clave = (user_id, plugin_id, huella)
+        self._entries[clave] = (channel_key, time.monotonic() + self.ttl)
+        self._entries.move_to_end(clave)
+        self._fingerprints[(user_id, plugin_id)] = huella
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, user_id: str, plugin_id: str) -> None:
+        huella = self._fingerprints.get((user_id, plugin_id))
+        if huella:
+            self._remove((user_id, plugin_id, huella))
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        """Todas las claves de canal dependen de la clave del servidor: se vacía al recargarla."""
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._fingerprints.clear()
+
+    def _remove(self, clave: Tuple[str, str, str]) -> None:
+        self._entries.pop(clave, None)
+        user_id, plugin_id, huella = clave
+        if self._fingerprints.get((user_id, plugin_id)) == huella:
+            del self._fingerprints[(user_id, plugin_id)]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+channel_key_cache = ChannelKeyCache()
@@ -0,0 +1,199 @@
+# services/crypto_workers.py
+# Pool de procesos para las operaciones criptográficas caras del KM (fuera del event loop):
+#   - generación: exponente (pow de 256 bits + SHA-256) -> ec.derive_private_key -> ECDH efímero
+#     + HKDF + AES-GCM -> serialización DER
+#   - descifrado de contraseñas: AES-GCM(DEK) -> carga DER -> ECDH + HKDF + AES-GCM
+# Las tareas son funciones de módulo sin estado: reciben las claves (DEK) como argumento y este
+# módulo no importa config ni storage, así que los workers (spawn) arrancan sin Argon2 ni Mongo.
+# Control de admisión: con KM_CRYPTO_MAX_PENDING tareas en curso o en cola, run() rechaza con
+# CryptoPoolSaturated (los endpoints responden 503 + Retry-After) en lugar de acumular latencia.
+# KM_CRYPTO_WORKERS=0 -> las tareas van al pool de hilos por defecto (desarrollo / scripts).
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import List, Optional, Tuple
+
+from cryptography.hazmat.primitives import serialization
+
+from km_crypto.aes_gcm import decrypt_with_kdb
+from km_crypto.ecc_wrapper import ecc_desencriptar_password, cargar_llave_privada_desde_bytes
+from . import password_generation
+
+CRYPTO_WORKERS = int(os.getenv("KM_CRYPTO_WORKERS", str(min(4, os.cpu_count() or 1))))
+CRYPTO_MAX_PENDING = int(os.getenv("KM_CRYPTO_MAX_PENDING", str(max(1, CRYPTO_WORKERS) * 32)))
+CRYPTO_RETRY_AFTER_SECONDS = 1
+
+
+class CryptoPoolSaturated(RuntimeError):
+    """Cola del pool llena: la petición se rechaza y el cliente debe reintentar."""
+
+
+# ================= Tareas (se ejecutan en los workers) ==================
+
+def generar_material_password(psy_values: list, numeric_code: int, password: str) -> Tuple[bytes, dict]:
+    """Exponente -> clave privada ECC -> cifrado de la contraseña. Devuelve (clave privada DER, cipher_struct)."""
+    exponente = password_generation.calcular_exponente(psy_values, numeric_code)
+    llave_privada = password_generation.construir_clave_privada(exponente)
+    if llave_privada is None:
+        raise ValueError("No se pudo construir la clave privada ECC")
+
+    cipher_struct = password_generation.ecc_encriptar_password(llave_privada.public_key(), password.encode())
+    if cipher_struct is None:
+        raise ValueError("No se pudo cifrar la contraseña con ECC")
+
+    priv_bytes = llave_privada.private_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+    return priv_bytes, cipher_struct
+
+
+def descifrar_cipher_struct(clave_password: bytes, ciphertext_encrypted: str, aad: bytes) -> Optional[dict]:
+    """AES-GCM(DEK de vault_password) -> JSON ECC -> cipher_struct en bytes."""
+    try:
+        plaintext_json_bytes = decrypt_with_kdb(clave_password, ciphertext_encrypted, aad=aad)
+        cipher_json = json.loads(plaintext_json_bytes.decode("utf-8"))
+    except Exception as e:
+        print("❌ Error descifrando JSON ECC:", e)
+        return None
+
+    # Reconstruir cipher_struct en bytes
+    try:
+        return {
+            "ephemeral_public": bytes.fromhex(cipher_json["ephemeral_public"]),
+            "iv": bytes.fromhex(cipher_json["iv"]),
+            "ciphertext": bytes.fromhex(cipher_json["ciphertext"]),
+            "tag": bytes.fromhex(cipher_json["tag"])
+        }
+    except Exception as e:
+        print("❌ Error reconstruyendo cipher_struct:", e)
+        return None
+
+
+def descifrar_con_clave_privada(private_key_bytes: bytes, cipher_struct: dict) -> Optional[str]:
+    try:
+        private_key = cargar_llave_privada_desde_bytes(private_key_bytes)
+    except Exception as e:
+        print("❌ Error cargando clave privada DER:", e)
+        return None
+
+    # Descifrar ECC → obtener contraseña
+    try:
+        return ecc_desencriptar_password(private_key, cipher_struct)
+    except Exception as e:
+        print("❌ Error descifrando ECC:", e)
+        return None
+
+
+def descifrar_password(clave_password: bytes, ciphertext_encrypted: str, aad_password: bytes,
+                       clave_clave: bytes, key_material_encrypted: str, aad_clave: bytes) -> Optional[str]:
+    """Ciphertext de vault_password + clave privada cifrada de vault_keys -> contraseña (None si falla)."""
+    cipher_struct = descifrar_cipher_struct(clave_password, ciphertext_encrypted, aad_password)
+    if cipher_struct is None:
+        return None
+    try:
+        private_key_bytes = decrypt_with_kdb(clave_clave, key_material_encrypted, aad=aad_clave)
+    except Exception as e:
+        print("❌ Error descifrando la clave privada ECC:", e)
+        return None
+    return descifrar_con_clave_privada(private_key_bytes, cipher_struct)
+
+
+def _precalentar() -> None:
+    """Fuerza el arranque de los workers (e importación de este módulo) antes del primer request."""
+
+
+# ================= Pool ==================
+
+class CryptoWorkerPool:
+    def __init__(self, workers: int = CRYPTO_WORKERS, max_pending: int = CRYPTO_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.restarts = 0
+        self._busy_seconds = 0.0
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # spawn: el proceso del KM ya tiene hilos (motor, asyncio) y fork los copiaría a medias
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def start(self) -> None:
+        if self.workers <= 0 or self._executor is not None:
+            return
+        self._executor = self._create_executor()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._executor, _precalentar) for _ in range(self.workers)))
+        print(f"⚙️ Pool criptográfico: {self.workers} procesos, máximo {self.max_pending} tareas pendientes")
+
+    async def shutdown(self) -> None:
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+    def _admit(self, n: int) -> None:
+        # Un lote se admite entero o no se admite; con el pool vacío se admite aunque supere el
+        # límite (si no, un lote mayor que max_pending no se ejecutaría nunca)
+        if self.pending and self.pending + n > self.max_pending:
+            self.rejected += n
+            raise CryptoPoolSaturated(f"Pool criptográfico saturado ({self.pending} tareas pendientes)")
+        self.pending += n
+
+    async def _execute(self, fn, args: tuple):
+        inicio = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        executor = self._executor
+        try:
+            try:
+                return await loop.run_in_executor(executor, partial(fn, *args))
+            except BrokenProcessPool:
+                # Un worker murió (OOM, señal): se recrea el pool (una vez aunque fallen varias
+                # tareas a la vez) y se reintenta; las tareas no tienen efectos fuera del worker
+                if self._executor is executor:
+                    self._restart()
+                return await loop.run_in_executor(self._executor, partial(fn, *args))
+        finally:
+            self.pending -= 1
+            self.completed += 1
+            self._busy_seconds += time.perf_counter() - inicio
+
+    async def run(self, fn, *args):
+        """Ejecuta fn(*args) en un worker. Lanza CryptoPoolSaturated si la cola está llena."""
+        self._admit(1)
+        return await self._execute(fn, args)
+
+    async def run_many(self, fn, calls: List[tuple]) -> list:
+        """fn(*args) para cada args de `calls`, en paralelo; el lote se admite o se rechaza entero."""
+        self._admit(len(calls))
+        return await asyncio.gather(*(self._execute(fn, args) for args in calls))
+
+    def _restart(self) -> None:
+        if self._executor is None:
+            return
+        print("⚠️ Pool criptográfico roto, se recrea")
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._create_executor()
+        self.restarts += 1
+
+    def stats(self) -> dict:
+        return {
+            "mode": "processes" if self._executor is not None else "threads",
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+            "avg_task_ms": round(self._busy_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+        }
+
+
+crypto_pool = CryptoWorkerPool()
@@ -0,0 +1,134 @@
+# services/data_keys.py
+# Jerarquía KEK/DEK del cifrado en reposo.
+# Cada registro de vault_keys / vault_password se cifra con una clave de datos (DEK) de 256 bits
+# de su shard (hash del user_id % KM_DEK_SHARDS). Las DEK se guardan en la colección data_keys
+# de la misma DB, envueltas con AES-GCM bajo la KEK (K_DB_KEYS / K_DB_PASS) y con la versión de
+# KEK que las envuelve. Rotar la clave maestra solo re-envuelve las DEK (rewrap): el coste es el
+# número de DEK, no el tamaño del vault, y el texto plano de las DEK no cambia.
+# Los registros anteriores a la jerarquía (sin dek_id) están cifrados directamente con la KEK de
+# la versión 1; se siguen leyendo y services/reencryption.py los migra a su DEK en segundo plano.
+import hashlib
+import os
+from datetime import datetime
+from typing import Dict, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+from km_crypto.aes_gcm import encrypt_with_kdb, decrypt_with_kdb
+from config import KEK_VERSION, KEK_KEYRING_KEYS, KEK_KEYRING_PASS
+from .storage import vault_keys_deks, vault_password_deks
+
+DEK_SHARDS = int(os.getenv("KM_DEK_SHARDS", "64"))
+LEGACY_KEK_VERSION = 1  # KEK con la que se cifraron los registros sin dek_id
+
+
+class DataKeyRing:
+    def __init__(self, domain: str, collection, keks: Dict[int, bytes], kek_version: int = KEK_VERSION,
+                 shards: int = DEK_SHARDS):
+        self.domain = domain
+        self.collection = collection
+        self.keks = keks
+        self.kek_version = kek_version
+        self.shards = shards
+        # dek_id -> DEK en claro (no cambia al re-envolver, así que no caduca)
+        self._deks: Dict[str, bytes] = {}
+
+    def dek_id_for(self, user_id: str) -> str:
+        shard = int.from_bytes(hashlib.sha256(user_id.encode("utf-8")).digest()[:4], "big") % self.shards
+        return f"{self.domain}:{shard:04d}"
+
+    def _wrap_aad(self, dek_id: str) -> bytes:
+        return f"DEK|{dek_id}".encode("utf-8")
+
+    def _unwrap(self, doc: dict) -> bytes:
+        kek = self.keks.get(doc["kek_version"])
+        if kek is None:
+            raise RuntimeError(f"DEK {doc['dek_id']} envuelta con la KEK v{doc['kek_version']}, que no está configurada")
+        return decrypt_with_kdb(kek, doc["wrapped_dek"], aad=self._wrap_aad(doc["dek_id"]))
+
+    async def _load(self, dek_id: str, create: bool) -> bytes:
+        doc = await self.collection.find_one({"dek_id": dek_id})
+        if doc is None and create:
+            # Misma idea que la clave del servidor: todas las réplicas compiten por el mismo
+            # upsert (índice unique en dek_id) y se quedan con la DEK que gane
+            try:
+                await self.collection.update_one(
+                    {"dek_id": dek_id},
+                    {"$setOnInsert": {
+                        "dek_id": dek_id,
+                        "domain": self.domain,
+                        "wrapped_dek": encrypt_with_kdb(self.keks[self.kek_version], os.urandom(32),
+                                                        aad=self._wrap_aad(dek_id)),
+                        "kek_version": self.kek_version,
+                        "created_at": datetime.utcnow()
+                    }},
+                    upsert=True
+                )
+            except DuplicateKeyError:
+                pass
+            doc = await self.collection.find_one({"dek_id": dek_id})
+        if doc is None:
+            raise KeyError(f"DEK {dek_id} no encontrada")
+        dek = self._unwrap(doc)
+        self._deks[dek_id] = dek
+        return dek
+
+    async def dek(self, dek_id: str, create: bool = False) -> bytes:
+        dek = self._deks.get(dek_id)
+        if dek is None:
+            dek = await self._load(dek_id, create)
+        return dek
+
+    async def encrypt(self, user_id: str, plaintext: bytes, aad: bytes) -> Tuple[str, str]:
+        """Cifra con la DEK del shard del usuario. Devuelve (dek_id, token)."""
+        dek_id = self.dek_id_for(user_id)
+        dek = await self.dek(dek_id, create=True)
+        return dek_id, encrypt_with_kdb(dek, plaintext, aad=aad)
+
+    async def key_for(self, doc: dict) -> bytes:
+        """Clave con la que está cifrado `doc`: su DEK o, si es anterior a la jerarquía, la KEK legacy."""
+        dek_id = doc.get("dek_id")
+        if dek_id:
+            return await self.dek(dek_id)
+        kek = self.keks.get(LEGACY_KEK_VERSION)
+        if kek is None:
+            raise RuntimeError(f"Registro sin DEK y la KEK v{LEGACY_KEK_VERSION} no está configurada")
+        return kek
+
+    async def decrypt(self, doc: dict, field: str, aad: bytes) -> bytes:
+        return decrypt_with_kdb(await self.key_for(doc), doc[field], aad=aad)
+
+    async def rewrap(self) -> int:
+        """Re-envuelve con la KEK actual las DEK envueltas con una anterior. Devuelve cuántas."""
+        # $lt: una réplica con la configuración vieja no deshace la rotación de otra más nueva
+        antiguas = await self.collection.find({"kek_version": {"$lt": self.kek_version}}).to_list(length=None)
+        total = 0
+        for doc in antiguas:
+            try:
+                dek = self._unwrap(doc)
+            except Exception as e:
+                print(f"⚠️ No se pudo desenvolver la DEK {doc['dek_id']}: {e}")
+                continue
+            resultado = await self.collection.update_one(
+                {"dek_id": doc["dek_id"], "kek_version": doc["kek_version"]},
+                {"$set": {
+                    "wrapped_dek": encrypt_with_kdb(self.keks[self.kek_version], dek, aad=self._wrap_aad(doc["dek_id"])),
+                    "kek_version": self.kek_version,
+                    "rewrapped_at": datetime.utcnow()
+                }}
+            )
+            total += resultado.modified_count
+            self._deks[doc["dek_id"]] = dek
+        return total
+
+
+key_deks = DataKeyRing("KEYS", vault_keys_deks, KEK_KEYRING_KEYS)
+password_deks = DataKeyRing("PASS", vault_password_deks, KEK_KEYRING_PASS)
+
+
+async def rewrap_data_keys() -> Dict[str, int]:
+    """Rotación de la KEK: re-envuelve las DEK de las dos DB."""
+    informe = {"vault_keys": await key_deks.rewrap(), "vault_password": await password_deks.rewrap()}
+    if any(informe.values()):
+        print(f"🔁 DEK re-envueltas con la KEK v{key_deks.kek_version}: {informe}")
+    return informe
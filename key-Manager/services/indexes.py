@@ -0,0 +1,185 @@
+# services/indexes.py
+# Índices de las colecciones del KM y verificación de los planes de las consultas calientes.
+# ensure_indexes() crea los índices declarados (create_index es idempotente: si ya existe con la
+# misma especificación no hace nada) y verify_query_plans() ejecuta explain() sobre cada consulta
+# caliente y falla si alguna acaba en COLLSCAN (o en SORT en memoria para las de última versión).
+# Uso manual: python -m services.indexes
+import asyncio
+import os
+from typing import Dict, List
+
+from .storage import vault_keys, vault_password, plugin_keys, vault_keys_deks, vault_password_deks
+
+# KM_INDEX_CHECK: strict -> el arranque falla si hay COLLSCAN; warn -> solo se avisa; off -> no se verifica
+INDEX_CHECK_MODE = os.getenv("KM_INDEX_CHECK", "strict").lower()
+
+# Los campos con igualdad pueden ir en cualquier orden; se ordenan para que un mismo índice
+# sirva a varias consultas por prefijo. `version` va al final (descendente) para que la
+# última versión (find_latest) salga del índice sin ordenar en memoria.
+_SOLO_VERSIONADOS = {"version": {"$exists": True}}
+_SOLO_REEMPLAZADOS = {"active": False}
+
+INDEXES = {
+    "vault_keys": [
+        # get_key_material (con email) y retrieve_password_for_user (sin email): última versión activa
+        {"keys": [("user_id", 1), ("module_type", 1), ("purpose", 1), ("platform", 1), ("active", 1), ("version", -1)],
+         "name": "latest_user_module_purpose_platform"},
+        # Número de versión único por identidad (ver services/versioning.py)
+        {"keys": [("user_id", 1), ("email", 1), ("module_type", 1), ("purpose", 1), ("platform", 1), ("version", -1)],
+         "name": "uniq_key_identity_version", "unique": True, "partialFilterExpression": _SOLO_VERSIONADOS},
+        {"keys": [("key_id", 1)], "name": "uniq_key_id", "unique": True},
+        # Clave de handshake del servidor (ver plugin_handshake_service)
+        {"keys": [("singleton_key", 1)], "name": "uniq_singleton_key", "unique": True,
+         "partialFilterExpression": {"singleton_key": {"$exists": True}}},
+        # Compactador: versiones reemplazadas por antigüedad
+        {"keys": [("superseded_at", 1)], "name": "superseded_at", "partialFilterExpression": _SOLO_REEMPLAZADOS},
+        # Re-cifrado de registros legacy (sin dek_id) en orden de _id, ver services/reencryption.py
+        {"keys": [("dek_id", 1), ("_id", 1)], "name": "dek_id_id"},
+    ],
+    "vault_password": [
+        # get_password_enveloped / retrieve_password_for_user e idempotencia de procesar_generacion;
+        # por prefijo (user_id), también la lectura de todas las plataformas de get_passwords_enveloped_bulk
+        {"keys": [("user_id", 1), ("platform", 1), ("active", 1), ("version", -1)], "name": "latest_user_platform"},
+        {"keys": [("user_id", 1), ("platform", 1), ("version", -1)],
+         "name": "uniq_password_identity_version", "unique": True, "partialFilterExpression": _SOLO_VERSIONADOS},
+        # get_plain_password_for_user
+        {"keys": [("email", 1), ("platform", 1), ("active", 1), ("version", -1)], "name": "latest_email_platform"},
+        {"keys": [("superseded_at", 1)], "name": "superseded_at", "partialFilterExpression": _SOLO_REEMPLAZADOS},
+        {"keys": [("dek_id", 1), ("_id", 1)], "name": "dek_id_id"},
+    ],
+    "plugin_keys": [
+        # load_plugin_public_key / upsert de store_plugin_public_key
+        {"keys": [("user_id", 1), ("plugin_id", 1)], "name": "uniq_user_plugin", "unique": True},
+    ],
+    # DEK envueltas con la KEK de cada DB (ver services/data_keys.py)
+    "vault_keys_deks": [
+        {"keys": [("dek_id", 1)], "name": "uniq_dek_id", "unique": True},
+        {"keys": [("kek_version", 1)], "name": "kek_version"},
+    ],
+    "vault_password_deks": [
+        {"keys": [("dek_id", 1)], "name": "uniq_dek_id", "unique": True},
+        {"keys": [("kek_version", 1)], "name": "kek_version"},
+    ],
+}
+
+# Índices de versiones anteriores de este archivo, reemplazados por los de arriba
+OBSOLETE_INDEXES = {
+    "vault_keys": ["user_module_purpose_platform_active_email"],
+    "vault_password": ["user_platform_active", "email_platform_active"],
+}
+
+_COLLECTIONS = {"vault_keys": vault_keys, "vault_password": vault_password, "plugin_keys": plugin_keys,
+                "vault_keys_deks": vault_keys_deks, "vault_password_deks": vault_password_deks}
+
+_LATEST = [("version", -1)]
+
+# Consultas calientes (mismos filtros y orden que los servicios) que deben usar un índice
+HOT_QUERIES = [
+    ("vault_keys", "get_key_material", {
+        "user_id": "u", "email": "e", "module_type": "m", "purpose": "p", "platform": "x", "active": True}, _LATEST),
+    ("vault_keys", "retrieve_password_for_user", {
+        "user_id": "u", "module_type": "PASSWORD_GENERATOR", "purpose": "ECC_PRIVATE_KEY",
+        "platform": "x", "active": True}, _LATEST),
+    ("vault_keys", "retrieve_password_for_user (key_id)", {
+        "key_id": "k", "user_id": "u", "email": "e", "module_type": "PASSWORD_GENERATOR",
+        "purpose": "ECC_PRIVATE_KEY"}, None),
+    ("vault_keys", "retrieve_passwords_for_user", {
+        "user_id": "u", "module_type": "PASSWORD_GENERATOR", "purpose": "ECC_PRIVATE_KEY", "active": True}, None),
+    ("vault_keys", "retrieve_passwords_for_user (key_id)", {
+        "key_id": {"$in": ["k"]}, "user_id": "u", "module_type": "PASSWORD_GENERATOR",
+        "purpose": "ECC_PRIVATE_KEY"}, None),
+    ("vault_keys", "insert_new_version", {
+        "user_id": "u", "email": "e", "module_type": "m", "purpose": "p", "platform": "x",
+        "version": {"$exists": True}}, _LATEST),
+    ("vault_keys", "server_key_singleton", {"singleton_key": "s"}, None),
+    ("vault_password", "get_password_enveloped", {"user_id": "u", "platform": "x", "active": True}, _LATEST),
+    ("vault_password", "get_passwords_enveloped_bulk", {"user_id": "u", "active": True}, None),
+    ("vault_password", "insert_new_version", {"user_id": "u", "platform": "x", "version": {"$exists": True}}, _LATEST),
+    ("vault_password", "procesar_generacion (request_id)", {
+        "user_id": "u", "platform": "x", "metadata.request_id": "r"}, None),
+    ("vault_password", "get_plain_password_for_user", {"email": "e", "platform": "x", "active": True}, _LATEST),
+    ("plugin_keys", "load_plugin_public_key", {"user_id": "u", "plugin_id": "p"}, None),
+    ("vault_keys", "reencrypt_collection", {"dek_id": {"$exists": False}}, [("_id", 1)]),
+    ("vault_password", "reencrypt_collection", {"dek_id": {"$exists": False}}, [("_id", 1)]),
+    ("vault_keys_deks", "DataKeyRing.dek", {"dek_id": "d"}, None),
+    ("vault_keys_deks", "DataKeyRing.rewrap", {"kek_version": {"$lt": 2}}, None),
+    ("vault_password_deks", "DataKeyRing.dek", {"dek_id": "d"}, None),
+    ("vault_password_deks", "DataKeyRing.rewrap", {"kek_version": {"$lt": 2}}, None),
+]
+
+
+async def ensure_indexes() -> Dict[str, List[str]]:
+    """Crea los índices declarados. Un conflicto (p. ej. duplicados en un índice unique) se propaga."""
+    creados = {}
+    for nombre, especificaciones in INDEXES.items():
+        coleccion = _COLLECTIONS[nombre]
+        creados[nombre] = []
+        for especificacion in especificaciones:
+            opciones = {k: v for k, v in especificacion.items() if k != "keys"}
+            creados[nombre].append(await coleccion.create_index(especificacion["keys"], **opciones))
+        existentes = set(await coleccion.index_information())
+        for obsoleto in OBSOLETE_INDEXES.get(nombre, []):
+            if obsoleto in existentes:
+                await coleccion.drop_index(obsoleto)
+                print(f"🗂️ Índice obsoleto {nombre}.{obsoleto} eliminado")
+    return creados
+
+
+def _stages(plan: dict) -> List[str]:
+    """Etapas de un plan de explain() (recorre inputStage / inputStages / queryPlan)."""
+    etapas = []
+    pendientes = [plan]
+    while pendientes:
+        nodo = pendientes.pop()
+        if not isinstance(nodo, dict):
+            continue
+        if "stage" in nodo:
+            etapas.append(nodo["stage"])
+        for clave in ("inputStage", "queryPlan", "outerStage", "innerStage"):
+            if clave in nodo:
+                pendientes.append(nodo[clave])
+        pendientes.extend(nodo.get("inputStages", []))
+    return etapas
+
+
+async def verify_query_plans() -> List[dict]:
+    """explain() de cada consulta caliente. Devuelve [{collection, query, stages, collscan}]."""
+    informe = []
+    for nombre, consulta, filtro, orden in HOT_QUERIES:
+        cursor = _COLLECTIONS[nombre].find(filtro)
+        if orden:
+            cursor = cursor.sort(orden)
+        explicacion = await cursor.limit(1).explain()
+        etapas = _stages(explicacion.get("queryPlanner", {}).get("winningPlan", {}))
+        informe.append({
+            "collection": nombre,
+            "query": consulta,
+            "stages": etapas,
+            # COLLSCAN: sin índice; SORT: el índice no da el orden pedido
+            "collscan": "COLLSCAN" in etapas or "SORT" in etapas,
+        })
+    return informe
+
+
+async def bootstrap_indexes(mode: str = INDEX_CHECK_MODE) -> List[dict]:
+    """Arranque: crear índices y verificar planes según KM_INDEX_CHECK."""
+    creados = await ensure_indexes()
+    print("🗂️ Índices del KM: " + "; ".join(f"{c}: {', '.join(n)}" for c, n in creados.items()))
+    if mode == "off":
+        return []
+    informe = await verify_query_plans()
+    con_collscan = [r for r in informe if r["collscan"]]
+    for r in con_collscan:
+        print(f"❌ COLLSCAN/SORT en {r['collection']} para {r['query']}: {' <- '.join(r['stages'])}")
+    if con_collscan and mode == "strict":
+        raise RuntimeError(
+            "Consultas sin índice: " + ", ".join(f"{r['collection']}.{r['query']}" for r in con_collscan)
+        )
+    if not con_collscan:
+        print(f"✔ {len(informe)} consultas calientes usan índice")
+    return informe
+
+
+if __name__ == "__main__":
+    for fila in asyncio.run(bootstrap_indexes("warn")):
+        print(f"{fila['collection']:>15} {fila['query']:<40} {' <- '.join(fila['stages'])}")
@@ -5,11 +5,11 @@
 # services/key_service.py
 import uuid
 from datetime import datetime
-from km_crypto.aes_gcm import encrypt_with_kdb, decrypt_with_kdb
-from config import K_DB_KEYS
 from .storage import vault_keys
+from .data_keys import key_deks
+from .versioning import find_latest, insert_new_version
 
-async def store_key(
+async def build_key_document(
     user_id: str,
     email: str,
     module_type: str,
@@ -19,12 +19,12 @@ async def store_key(
     key_algo: str,
     sensitivity: str = "HIGH",
     metadata: dict | None = None
-) -> str:
+) -> dict:
+    """Documento de vault_keys con el material cifrado con la DEK del usuario (sin insertar)."""
     key_id = str(uuid.uuid4())
-    aad = f"{user_id}|{module_type}|{purpose}".encode("utf-8")
-    enc = encrypt_with_kdb(K_DB_KEYS, key_material_raw, aad=aad)
+    dek_id, enc = await key_deks.encrypt(user_id, key_material_raw, key_material_aad(user_id, module_type, purpose))
 
-    doc = {
+    return {
         "key_id": key_id,
         "user_id": user_id,
         "email": email,
@@ -32,14 +32,42 @@ async def store_key(
         "purpose": purpose,
         "platform": platform,
         "key_material_encrypted": enc,
+        "dek_id": dek_id,
         "key_algo": key_algo,
         "sensitivity": sensitivity,
         "metadata": metadata or {},
         "created_at": datetime.utcnow(),
         "active": True
     }
-    await vault_keys.insert_one(doc)
-    return key_id
+
+def key_identity(user_id: str, email: str, module_type: str, purpose: str, platform: str | None) -> dict:
+    return {"user_id": user_id, "email": email, "module_type": module_type, "purpose": purpose, "platform": platform}
+
+def key_material_aad(user_id: str, module_type: str, purpose: str) -> bytes:
+    return f"{user_id}|{module_type}|{purpose}".encode("utf-8")
+
+async def decrypt_key_document(doc: dict) -> bytes:
+    aad = key_material_aad(doc["user_id"], doc["module_type"], doc["purpose"])
+    return await key_deks.decrypt(doc, "key_material_encrypted", aad)
+
+async def store_key(
+    user_id: str,
+    email: str,
+    module_type: str,
+    purpose: str,
+    platform: str | None,
+    key_material_raw: bytes,
+    key_algo: str,
+    sensitivity: str = "HIGH",
+    metadata: dict | None = None
+) -> str:
+    doc = await build_key_document(
+        user_id, email, module_type, purpose, platform,
+        key_material_raw, key_algo, sensitivity, metadata
+    )
+    # Nueva versión de (user_id, email, module_type, purpose, platform); las anteriores quedan inactivas
+    doc["version"] = await insert_new_version(vault_keys, key_identity(user_id, email, module_type, purpose, platform), doc)
+    return doc["key_id"]
 
 async def get_key_material(
     user_id: str,
@@ -48,17 +76,9 @@ async def get_key_material(
     purpose: str,
     platform: str | None
 ):
-    doc = await vault_keys.find_one({
-        "user_id": user_id,
-        "email": email,
-        "module_type": module_type,
-        "purpose": purpose,
-        "platform": platform,
-        "active": True
-    })
+    doc = await find_latest(vault_keys, key_identity(user_id, email, module_type, purpose, platform))
     if not doc:
         return None, None
 
-    aad = f"{doc['user_id']}|{doc['module_type']}|{doc['purpose']}".encode("utf-8")
-    key_bytes = decrypt_with_kdb(K_DB_KEYS, doc["key_material_encrypted"], aad=aad)
+    key_bytes = await decrypt_key_document(doc)
     return key_bytes, doc["key_id"]
@@ -1,13 +1,41 @@
 # Servicio de contraseñas -> Autollenado
 # Obtiene y descifra la contraseña final usando ECC + AES-GCM + clave privada del KM
 
-import json
+import asyncio
+import time
 from typing import Optional
-from km_crypto.aes_gcm import decrypt_with_kdb
-from km_crypto.ecc_wrapper import ecc_desencriptar_password, cargar_llave_privada_desde_bytes
-from config import K_DB_PASS
-from .storage import vault_password
-from .key_service import get_key_material
+from .storage import vault_password, vault_keys
+from .key_service import key_material_aad
+from .password_storage import password_ciphertext_aad
+from .data_keys import key_deks, password_deks
+from .versioning import find_latest
+from .crypto_workers import crypto_pool, descifrar_password
+
+PASSWORD_KEY_MODULE = "PASSWORD_GENERATOR"
+PASSWORD_KEY_PURPOSE = "ECC_PRIVATE_KEY"
+
+# Proyecciones: solo los campos necesarios para descifrar
+_PASSWORD_PROJECTION = {"_id": 0, "pass_id": 1, "user_id": 1, "email": 1, "ciphertext_encrypted": 1, "dek_id": 1}
+_KEY_PROJECTION = {"_id": 0, "key_id": 1, "user_id": 1, "email": 1, "module_type": 1, "purpose": 1,
+                   "key_material_encrypted": 1, "dek_id": 1}
+
+
+async def _decrypt_args(entry: dict, key_doc: dict, platform: str) -> tuple:
+    """Argumentos de crypto_workers.descifrar_password: cada registro con su DEK (o la KEK si es legacy)."""
+    clave_password, clave_clave = await asyncio.gather(password_deks.key_for(entry), key_deks.key_for(key_doc))
+    return (
+        clave_password, entry["ciphertext_encrypted"], password_ciphertext_aad(entry["user_id"], platform),
+        clave_clave, key_doc["key_material_encrypted"],
+        key_material_aad(key_doc["user_id"], key_doc["module_type"], key_doc["purpose"]),
+    )
+
+
+async def _decrypt_entry(entry: dict, key_doc: dict, platform: str) -> Optional[str]:
+    """
+    Ciphertext ECC (vault_password) + clave privada (vault_keys) -> contraseña, en el pool
+    criptográfico. Devuelve None si falla el descifrado; CryptoPoolSaturated si el pool está lleno.
+    """
+    return await crypto_pool.run(descifrar_password, *(await _decrypt_args(entry, key_doc, platform)))
 
 
 async def get_plain_password_for_user(email: str, platform: str) -> Optional[str]:
@@ -18,61 +46,158 @@ async def get_plain_password_for_user(email: str, platform: str) -> Optional[str
     """
 
     # 1. Buscar ciphertext en vault_pass
-    entry = await vault_password.find_one({
-        "email": email,
-        "platform": platform,
-        "active": True
-    })
+    entry = await find_latest(vault_password, {"email": email, "platform": platform}, _PASSWORD_PROJECTION)
     if not entry:
         print("❌ No se encontró ciphertext para el usuario/plataforma.")
         return None
 
-    encrypted_blob = entry["ciphertext_encrypted"]   # AES-GCM ciphertext
-    user_id = entry["user_id"]
-
-    # 2. Desencriptar JSON ECC usando AES-GCM(K_DB_PASS)
-    try:
-        aad = f"{user_id}|{platform}|PASSWORD_CIPHERTEXT".encode()
-        plaintext_json_bytes = decrypt_with_kdb(K_DB_PASS, encrypted_blob, aad=aad)
-        cipher_json = json.loads(plaintext_json_bytes.decode("utf-8"))
-    except Exception as e:
-        print("❌ Error descifrando JSON ECC:", e)
+    # 2. Recuperar private key ECC desde vault_keys
+    key_doc = await find_latest(vault_keys, {
+        "user_id": entry["user_id"], "email": email, "module_type": PASSWORD_KEY_MODULE,
+        "purpose": PASSWORD_KEY_PURPOSE, "platform": platform
+    }, _KEY_PROJECTION)
+    if not key_doc:
+        print("❌ No se recuperó la clave privada ECC.")
         return None
 
-    # 3. Reconstruir cipher_struct en bytes
+    # 3. Descifrar AES-GCM(DEK) + ECC
+    return await _decrypt_entry(entry, key_doc, platform)
+
+
+async def _timed(timings: dict, name: str, coro):
+    inicio = time.perf_counter()
     try:
-        cipher_struct = {
-            "ephemeral_public": bytes.fromhex(cipher_json["ephemeral_public"]),
-            "iv": bytes.fromhex(cipher_json["iv"]),
-            "ciphertext": bytes.fromhex(cipher_json["ciphertext"]),
-            "tag": bytes.fromhex(cipher_json["tag"])
-        }
-    except Exception as e:
-        print("❌ Error reconstruyendo cipher_struct:", e)
-        return None
+        return await coro
+    finally:
+        timings[name] = round((time.perf_counter() - inicio) * 1000, 2)
 
-    # 4. Recuperar private key ECC desde vault_keys
-    private_key_bytes, _ = await get_key_material(
-        user_id=user_id,
-        email=email,
-        module_type="PASSWORD_GENERATOR",
-        purpose="ECC_PRIVATE_KEY",
-        platform=platform
+
+async def retrieve_password_for_user(user_id: str, platform: str, extra_lookup=None) -> dict:
+    """
+    Ruta de autofill en un solo viaje de ida y vuelta por cluster: el ciphertext (vault_password)
+    y la clave privada (vault_keys) se piden a la vez, por user_id + plataforma (última versión) y con proyección.
+    extra_lookup: corrutina opcional que se ejecuta en paralelo con las lecturas (p. ej. la clave de canal).
+
+    Devuelve {"found", "password", "extra", "timings_ms"}:
+      found=False -> no hay ciphertext activo; password=None con found=True -> fallo al descifrar.
+    """
+    timings = {}
+    inicio = time.perf_counter()
+    lecturas = [
+        _timed(timings, "vault_password_ms", find_latest(
+            vault_password, {"user_id": user_id, "platform": platform}, _PASSWORD_PROJECTION)),
+        _timed(timings, "vault_keys_ms", find_latest(
+            vault_keys, {"user_id": user_id, "module_type": PASSWORD_KEY_MODULE, "purpose": PASSWORD_KEY_PURPOSE,
+                         "platform": platform}, _KEY_PROJECTION)),
+    ]
+    if extra_lookup is not None:
+        lecturas.append(_timed(timings, "extra_ms", extra_lookup))
+    resultados = await asyncio.gather(*lecturas)
+    entry, key_doc = resultados[0], resultados[1]
+    resultado = {"found": entry is not None, "password": None,
+                 "extra": resultados[2] if extra_lookup is not None else None, "timings_ms": timings}
+
+    if entry is None:
+        print("❌ No se encontró ciphertext para el usuario/plataforma.")
+    else:
+        # La clave del ciphertext es la de key_id == pass_id y del mismo email; si la leída en paralelo
+        # no lo es (p. ej. la clave nueva ya se guardó y el ciphertext todavía no), se pide por key_id
+        # aunque esa versión ya esté reemplazada
+        mismo_email = key_doc is not None and key_doc.get("email") == entry.get("email")
+        if not mismo_email or key_doc["key_id"] != entry.get("pass_id"):
+            por_id = await _timed(timings, "vault_keys_retry_ms", vault_keys.find_one(
+                {"key_id": entry.get("pass_id"), "user_id": user_id, "email": entry.get("email"),
+                 "module_type": PASSWORD_KEY_MODULE, "purpose": PASSWORD_KEY_PURPOSE},
+                _KEY_PROJECTION))
+            # Sin clave con ese key_id: criterio anterior (misma cuenta de email y plataforma)
+            key_doc = por_id or (key_doc if mismo_email else None)
+        if key_doc is None:
+            print("❌ No se recuperó la clave privada ECC.")
+        else:
+            t = time.perf_counter()
+            resultado["password"] = await _decrypt_entry(entry, key_doc, platform)
+            timings["decrypt_ms"] = round((time.perf_counter() - t) * 1000, 2)
+
+    timings["total_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+    return resultado
+
+
+async def retrieve_passwords_for_user(user_id: str, platforms: Optional[list] = None) -> dict:
+    """
+    Todas las contraseñas activas de un usuario (o las de `platforms`) con una consulta por colección:
+    última versión de cada plataforma en vault_password, sus claves en vault_keys (en paralelo) y
+    descifrado de todas las entradas en paralelo en el pool criptográfico. Mismo emparejamiento que retrieve_password_for_user.
+
+    Devuelve {"passwords": {platform: password}, "failed": [platform, ...], "timings_ms"}.
+    """
+    timings = {}
+    inicio = time.perf_counter()
+    filtro_plataformas = {"platform": {"$in": platforms}} if platforms else {}
+    entradas, claves = await asyncio.gather(
+        _timed(timings, "vault_password_ms", vault_password.find(
+            {"user_id": user_id, "active": True, **filtro_plataformas},
+            {**_PASSWORD_PROJECTION, "platform": 1, "version": 1}
+        ).to_list(length=None)),
+        _timed(timings, "vault_keys_ms", vault_keys.find(
+            {"user_id": user_id, "module_type": PASSWORD_KEY_MODULE, "purpose": PASSWORD_KEY_PURPOSE,
+             "active": True, **filtro_plataformas},
+            {**_KEY_PROJECTION, "platform": 1, "version": 1}
+        ).to_list(length=None)),
     )
-    if not private_key_bytes:
-        print("❌ No se recuperó la clave privada ECC.")
-        return None
 
-    try:
-        private_key = cargar_llave_privada_desde_bytes(private_key_bytes)
-    except Exception as e:
-        print("❌ Error cargando clave privada DER:", e)
-        return None
+    # Última versión por plataforma (como find_latest: los documentos sin version van al final)
+    def ultima(docs):
+        por_plataforma = {}
+        for doc in docs:
+            actual = por_plataforma.get(doc.get("platform"))
+            if actual is None or (doc.get("version") or 0) > (actual.get("version") or 0):
+                por_plataforma[doc.get("platform")] = doc
+        return por_plataforma
 
-    # 5. Descifrar ECC → obtener contraseña
-    try:
-        password_str = ecc_desencriptar_password(private_key, cipher_struct)
-        return password_str
-    except Exception as e:
-        print("❌ Error descifrando ECC:", e)
-        return None
+    ultimas = ultima(entradas)
+    clave_plataforma = ultima(claves)
+
+    # Clave de cada entrada: la de key_id == pass_id. Las que no llegaron en la lectura paralela
+    # (clave ya reemplazada) se piden en una sola consulta por key_id
+    por_key_id = {doc["key_id"]: doc for doc in claves}
+    faltan = [e["pass_id"] for e in ultimas.values() if e.get("pass_id") and e["pass_id"] not in por_key_id]
+    if faltan:
+        extra = await _timed(timings, "vault_keys_retry_ms", vault_keys.find(
+            {"key_id": {"$in": faltan}, "user_id": user_id,
+             "module_type": PASSWORD_KEY_MODULE, "purpose": PASSWORD_KEY_PURPOSE},
+            _KEY_PROJECTION
+        ).to_list(length=None))
+        por_key_id.update({doc["key_id"]: doc for doc in extra})
+
+    def clave_de(platform, entry):
+        key_doc = por_key_id.get(entry.get("pass_id"))
+        if key_doc is not None and key_doc.get("email") == entry.get("email"):
+            return key_doc
+        # Sin clave con ese key_id: criterio anterior (misma cuenta de email y plataforma)
+        key_doc = clave_plataforma.get(platform)
+        return key_doc if key_doc is not None and key_doc.get("email") == entry.get("email") else None
+
+    t = time.perf_counter()
+    plataformas = []
+    tareas = []
+    fallidas = []
+    for platform, entry in ultimas.items():
+        key_doc = clave_de(platform, entry)
+        if key_doc is None:
+            print(f"❌ No se recuperó la clave privada ECC de {platform}.")
+            fallidas.append(platform)
+            continue
+        plataformas.append(platform)
+        tareas.append(_decrypt_args(entry, key_doc, platform))
+    llamadas = await asyncio.gather(*tareas)
+    descifradas = await crypto_pool.run_many(descifrar_password, llamadas)
+    timings["decrypt_ms"] = round((time.perf_counter() - t) * 1000, 2)
+
+    passwords = {}
+    for platform, password in zip(plataformas, descifradas):
+        if password is None:
+            fallidas.append(platform)
+        else:
+            passwords[platform] = password
+    timings["total_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+    return {"passwords": passwords, "failed": sorted(fallidas), "timings_ms": timings}
@@ -1,9 +1,14 @@
 import uuid
 from datetime import datetime
 import json
-from km_crypto.aes_gcm import encrypt_with_kdb
-from config import K_DB_PASS
 from .storage import vault_password
+from .versioning import insert_new_version
+from .data_keys import password_deks
+
+
+def password_ciphertext_aad(user_id: str, platform: str) -> bytes:
+    return f"{user_id}|{platform}|PASSWORD_CIPHERTEXT".encode("utf-8")
+
 
 async def store_password_ciphertext(
     pass_id: str,
@@ -23,14 +28,12 @@ async def store_password_ciphertext(
 
     """
     Guarda el ciphertext ECC de la contraseña en la DB de passwords,
-    protegido en reposo con AES-GCM(K_DB_PASS).
+    protegido en reposo con AES-GCM(DEK del usuario, envuelta con K_DB_PASS).
     """
-    aad = f"{user_id}|{platform}|PASSWORD_CIPHERTEXT".encode("utf-8")
-
-    encrypted = encrypt_with_kdb(
-        K_DB_PASS,
+    dek_id, encrypted = await password_deks.encrypt(
+        user_id,
         cipher_json.encode(),
-        aad=aad
+        password_ciphertext_aad(user_id, platform)
     )
 
     doc = {
@@ -39,10 +42,12 @@ async def store_password_ciphertext(
         "email": email,
         "platform": platform,
         "ciphertext_encrypted": encrypted,
+        "dek_id": dek_id,
         "key_algo": key_algo,
         "metadata": metadata or {},
         "created_at": datetime.utcnow(),
         "active": True
     }
-    await vault_password.insert_one(doc)
+    # Nueva versión de (user_id, platform); las anteriores quedan inactivas
+    await insert_new_version(vault_password, {"user_id": user_id, "platform": platform}, doc)
     return pass_id
@@ -1,11 +1,14 @@
 # services/plugin_handshake_service.py
+import asyncio
 import base64
 from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives import serialization
+from pymongo.errors import DuplicateKeyError
 
-from services.key_service import get_key_material, store_key
+from services.key_service import build_key_document, decrypt_key_document
 from services.storage import vault_keys, plugin_keys  # plugin_keys → agregar en storage.py
 from km_crypto.plugin_channel_crypto import derive_shared_channel_key
+from services.channel_key_cache import channel_key_cache
 
 
 SERVER_USER = "KM_SERVER"
@@ -13,31 +16,44 @@ SERVER_EMAIL = "km@internal"
 MODULE = "PLUGIN_HANDSHAKE"
 PURPOSE = "SERVER_PRIVATE_KEY"
 
+# Clave única del documento de la clave del servidor (índice uniq_singleton_key, ver services/indexes.py):
+# todas las réplicas compiten por el mismo upsert y convergen en una sola clave
+SERVER_KEY_SINGLETON = f"{SERVER_USER}|{MODULE}|{PURPOSE}"
+
+# Clave privada ya parseada, compartida por todas las peticiones del proceso
+_server_private_key = None
+_server_key_lock = None
 
-async def get_or_create_server_private_key():
-    """
-    Recupera o crea la clave privada ECC del servidor para handshake.
-    """
-    priv_bytes, _ = await get_key_material(
-        user_id=SERVER_USER,
-        email=SERVER_EMAIL,
-        module_type=MODULE,
-        purpose=PURPOSE,
-        platform=None
-    )
 
-    if priv_bytes:
-        return serialization.load_der_private_key(priv_bytes, password=None)
+async def _load_or_create_server_key_document() -> dict:
+    doc = await vault_keys.find_one({"singleton_key": SERVER_KEY_SINGLETON})
+    if doc:
+        return doc
 
-    # Si no existe, generar
+    # Despliegues anteriores: adoptar la clave existente marcándola como singleton
+    legacy = await vault_keys.find_one({
+        "user_id": SERVER_USER,
+        "email": SERVER_EMAIL,
+        "module_type": MODULE,
+        "purpose": PURPOSE,
+        "platform": None,
+        "active": True
+    })
+    if legacy:
+        try:
+            await vault_keys.update_one({"_id": legacy["_id"]}, {"$set": {"singleton_key": SERVER_KEY_SINGLETON}})
+        except DuplicateKeyError:
+            pass  # Otra réplica ya fijó la clave singleton
+        return await vault_keys.find_one({"singleton_key": SERVER_KEY_SINGLETON})
+
+    # Si no existe, generar una candidata; solo se inserta si nadie lo ha hecho antes ($setOnInsert)
     priv = ec.generate_private_key(ec.SECP256R1())
     priv_bytes = priv.private_bytes(
         encoding=serialization.Encoding.DER,
         format=serialization.PrivateFormat.PKCS8,
         encryption_algorithm=serialization.NoEncryption(),
     )
-
-    await store_key(
+    candidate = await build_key_document(
         user_id=SERVER_USER,
         email=SERVER_EMAIL,
         module_type=MODULE,
@@ -46,8 +62,54 @@ async def get_or_create_server_private_key():
         key_material_raw=priv_bytes,
         key_algo="ECC"
     )
+    candidate["singleton_key"] = SERVER_KEY_SINGLETON
+    try:
+        await vault_keys.update_one(
+            {"singleton_key": SERVER_KEY_SINGLETON},
+            {"$setOnInsert": candidate},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        pass  # Dos upserts simultáneos: el índice unique deja pasar solo uno
+    return await vault_keys.find_one({"singleton_key": SERVER_KEY_SINGLETON})
+
+
+def _get_lock() -> asyncio.Lock:
+    global _server_key_lock
+    if _server_key_lock is None:
+        _server_key_lock = asyncio.Lock()
+    return _server_key_lock
+
 
-    return priv
+async def _load_server_private_key():
+    global _server_private_key
+    doc = await _load_or_create_server_key_document()
+    _server_private_key = serialization.load_der_private_key(await decrypt_key_document(doc), password=None)
+    print(f"🔑 Clave de handshake del servidor cargada (key_id={doc['key_id']})")
+    return _server_private_key
+
+
+async def reload_server_private_key():
+    """
+    Vuelve a leer la clave del servidor desde Mongo (p. ej. tras una rotación) y reemplaza la de memoria.
+    """
+    async with _get_lock():
+        priv = await _load_server_private_key()
+        channel_key_cache.clear()
+        return priv
+
+
+async def get_or_create_server_private_key():
+    """
+    Recupera o crea la clave privada ECC del servidor para handshake.
+    Tras la primera carga se sirve desde memoria (sin Mongo, AES-GCM ni parseo DER).
+    """
+    if _server_private_key is not None:
+        return _server_private_key
+    async with _get_lock():
+        if _server_private_key is not None:
+            return _server_private_key
+        return await _load_server_private_key()
 
 
 async def store_plugin_public_key(user_id: str, plugin_id: str, public_key_b64: str):
@@ -61,6 +123,7 @@ async def store_plugin_public_key(user_id: str, plugin_id: str, public_key_b64:
         {"$set": {"public_key": raw}},
         upsert=True
     )
+    channel_key_cache.invalidate(user_id, plugin_id)
 
 
 async def load_plugin_public_key(user_id: str, plugin_id: str):
@@ -68,3 +131,20 @@ async def load_plugin_public_key(user_id: str, plugin_id: str):
     if not doc:
         return None
     return doc["public_key"]
+
+
+async def get_channel_key(user_id: str, plugin_id: str):
+    """
+    Clave de canal KM ↔ Plugin (ECDH + HKDF), servida desde channel_key_cache si está.
+    Devuelve None si el plugin no tiene clave pública registrada.
+    """
+    channel_key = channel_key_cache.get(user_id, plugin_id)
+    if channel_key is not None:
+        return channel_key
+    server_priv = await get_or_create_server_private_key()
+    plugin_pub = await load_plugin_public_key(user_id, plugin_id)
+    if plugin_pub is None:
+        return None
+    channel_key = derive_shared_channel_key(server_priv, plugin_pub)
+    channel_key_cache.put(user_id, plugin_id, plugin_pub, channel_key)
+    return channel_key
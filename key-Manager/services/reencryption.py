@@ -0,0 +1,90 @@
+# services/reencryption.py
+# Migración perezosa de los registros anteriores a la jerarquía KEK/DEK (sin dek_id, cifrados
+# directamente con la KEK) a la DEK de su usuario. Corre en segundo plano con un ritmo máximo
+# (KM_REENCRYPT_RATE registros/s por colección) para no competir con el tráfico; las lecturas
+# siguen funcionando mientras tanto porque DataKeyRing.key_for entiende los dos formatos.
+# La escritura es condicional (dek_id inexistente): si el registro se reescribe entretanto no se pisa.
+import asyncio
+import os
+import time
+from typing import Dict, Tuple
+
+from .storage import vault_keys, vault_password
+from .data_keys import key_deks, password_deks
+from .key_service import key_material_aad
+from .password_storage import password_ciphertext_aad
+
+REENCRYPT_RATE = float(os.getenv("KM_REENCRYPT_RATE", "50"))        # 0 desactiva la migración
+REENCRYPT_BATCH = int(os.getenv("KM_REENCRYPT_BATCH", "100"))
+REENCRYPT_IDLE_SECONDS = float(os.getenv("KM_REENCRYPT_IDLE", "600"))  # Espera entre pasadas
+
+_LEGACY = {"dek_id": {"$exists": False}}
+
+
+def _aad_vault_keys(doc: dict) -> bytes:
+    return key_material_aad(doc["user_id"], doc["module_type"], doc["purpose"])
+
+
+def _aad_vault_password(doc: dict) -> bytes:
+    # /store_encrypted_item guarda en vault_password con el AAD de vault_keys (lleva vault_id)
+    if "vault_id" in doc:
+        return key_material_aad(doc["user_id"], doc["module_type"], doc["purpose"])
+    return password_ciphertext_aad(doc["user_id"], doc["platform"])
+
+
+# (colección, DEKs, campo cifrado, AAD del registro)
+MIGRATIONS = [
+    (vault_keys, key_deks, "key_material_encrypted", _aad_vault_keys),
+    (vault_password, password_deks, "ciphertext_encrypted", _aad_vault_password),
+]
+
+_PROJECTION = {"user_id": 1, "module_type": 1, "purpose": 1, "platform": 1, "vault_id": 1}
+
+
+async def reencrypt_collection(collection, ring, field: str, aad_for, rate: float = REENCRYPT_RATE,
+                               batch: int = REENCRYPT_BATCH) -> Tuple[int, int]:
+    """Una pasada completa por los registros legacy de `collection`. Devuelve (migrados, fallidos)."""
+    migrados = fallidos = 0
+    ultimo = None
+    while True:
+        filtro = dict(_LEGACY)
+        if ultimo is not None:
+            filtro["_id"] = {"$gt": ultimo}  # Los fallidos no se vuelven a leer en esta pasada
+        lote = await collection.find(filtro, {**_PROJECTION, field: 1}).sort("_id", 1).limit(batch).to_list(length=batch)
+        if not lote:
+            return migrados, fallidos
+        inicio = time.perf_counter()
+        for doc in lote:
+            ultimo = doc["_id"]
+            aad = aad_for(doc)
+            try:
+                plano = await ring.decrypt(doc, field, aad)
+            except Exception as e:
+                print(f"⚠️ {collection.name} {doc['_id']}: no se pudo descifrar con la KEK legacy: {e}")
+                fallidos += 1
+                continue
+            dek_id, token = await ring.encrypt(doc["user_id"], plano, aad)
+            resultado = await collection.update_one(
+                {"_id": doc["_id"], **_LEGACY},
+                {"$set": {field: token, "dek_id": dek_id}}
+            )
+            migrados += resultado.modified_count
+        # Ritmo máximo: `rate` registros por segundo
+        if rate > 0:
+            await asyncio.sleep(max(0.0, len(lote) / rate - (time.perf_counter() - inicio)))
+
+
+async def run_reencryption(interval: float = REENCRYPT_IDLE_SECONDS) -> None:
+    """Tarea de fondo: migra los registros legacy de cada colección y repite cada `interval` segundos."""
+    while True:
+        informe: Dict[str, Tuple[int, int]] = {}
+        for collection, ring, field, aad_for in MIGRATIONS:
+            try:
+                informe[collection.name] = await reencrypt_collection(collection, ring, field, aad_for)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Error re-cifrando {collection.name}: {e}")
+        if any(migrados or fallidos for migrados, fallidos in informe.values()):
+            print("🔐 Re-cifrado con DEK (migrados, fallidos): " + ", ".join(f"{c}={v}" for c, v in informe.items()))
+        await asyncio.sleep(interval)
@@ -9,6 +9,8 @@ vault_keys = db_key["vault_keys"]
 vault_key_items = db_key["vault_items"]
 # STORAGE PLUGIN KEYS
 plugin_keys = db_key["plugin_keys"]
+# DEK de vault_keys envueltas con K_DB_KEYS (ver services/data_keys.py)
+vault_keys_deks = db_key["data_keys"]
 
 #STORAGE PASSWORD VAULT
 
@@ -17,4 +19,6 @@ db_pass = client_pass[MONGO_DB_PASS]
 
 vault_password = db_pass["vault_password"]
 vault_password_items = db_pass["vault_items"]
+# DEK de vault_password envueltas con K_DB_PASS
+vault_password_deks = db_pass["data_keys"]
 
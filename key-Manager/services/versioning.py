@@ -0,0 +1,92 @@
+# services/versioning.py
+# Versionado de documentos de vault_keys / vault_password.
+# Cada documento lleva `version` (1, 2, ...) dentro de su identidad (p. ej. user_id + platform).
+# insert_new_version inserta la versión nueva y después desactiva las anteriores:
+#   - el índice unique (identidad, version) hace que dos escrituras simultáneas no puedan
+#     quedarse con el mismo número (la perdedora reintenta con el siguiente)
+#   - las lecturas usan find_latest (active + orden por version desc), así que durante el
+#     instante en que conviven dos activas siempre se sirve la nueva
+# La compactación en segundo plano archiva o borra las versiones reemplazadas pasada la retención.
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+LATEST_SORT = [("version", -1)]
+MAX_VERSION_RETRIES = 5
+
+# Compactación: KM_COMPACT_MODE archive -> copia a <colección>_archive y borra; delete -> solo borra
+VERSION_RETENTION_DAYS = float(os.getenv("KM_VERSION_RETENTION_DAYS", "30"))
+COMPACT_INTERVAL_SECONDS = float(os.getenv("KM_COMPACT_INTERVAL", "3600"))
+COMPACT_MODE = os.getenv("KM_COMPACT_MODE", "archive").lower()
+COMPACT_BATCH = int(os.getenv("KM_COMPACT_BATCH", "500"))
+COMPACT_PAUSE_SECONDS = 0.2   # Pausa entre lotes para no competir con el tráfico
+
+
+async def find_latest(collection, query: dict, projection: Optional[dict] = None):
+    """Versión activa más reciente (los documentos sin version, anteriores al versionado, van al final)."""
+    return await collection.find_one({**query, "active": True}, projection, sort=LATEST_SORT)
+
+
+async def insert_new_version(collection, identity: dict, doc: dict) -> int:
+    """
+    Inserta `doc` como nueva versión de `identity` y desactiva las versiones anteriores.
+    Devuelve el número de versión asignado.
+    """
+    for _ in range(MAX_VERSION_RETRIES):
+        # version $exists -> lo resuelve el índice unique parcial (identidad, version)
+        latest = await collection.find_one({**identity, "version": {"$exists": True}}, {"version": 1}, sort=LATEST_SORT)
+        version = ((latest or {}).get("version") or 0) + 1
+        nuevo = {**doc, **identity, "version": version, "active": True}
+        nuevo.pop("_id", None)
+        try:
+            await collection.insert_one(nuevo)
+        except DuplicateKeyError:
+            continue  # Otra escritura se llevó este número de versión
+        await collection.update_many(
+            {**identity, "active": True, "version": {"$not": {"$gte": version}}},
+            {"$set": {"active": False, "superseded_at": datetime.utcnow(), "superseded_by": version}},
+        )
+        return version
+    raise RuntimeError(f"No se pudo asignar versión tras {MAX_VERSION_RETRIES} intentos")
+
+
+async def compact_superseded(collection, retention_days: float = VERSION_RETENTION_DAYS,
+                             mode: str = COMPACT_MODE, batch: int = COMPACT_BATCH) -> int:
+    """Archiva/borra las versiones desactivadas hace más de `retention_days`. Devuelve cuántas."""
+    limite = datetime.utcnow() - timedelta(days=retention_days)
+    archivo = collection.database[f"{collection.name}_archive"] if mode == "archive" else None
+    total = 0
+    while True:
+        lote = await collection.find(
+            {"active": False, "superseded_at": {"$lt": limite}}
+        ).sort("superseded_at", 1).limit(batch).to_list(length=batch)
+        if not lote:
+            return total
+        if archivo is not None:
+            try:
+                await archivo.insert_many(lote, ordered=False)
+            except BulkWriteError as e:
+                # Reintento de un lote ya archivado a medias: los _id repetidos se ignoran
+                if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                    raise
+        await collection.delete_many({"_id": {"$in": [d["_id"] for d in lote]}})
+        total += len(lote)
+        await asyncio.sleep(COMPACT_PAUSE_SECONDS)
+
+
+async def run_compactor(collections, interval: float = COMPACT_INTERVAL_SECONDS):
+    """Tarea de fondo: compacta las colecciones cada `interval` segundos hasta que se cancele."""
+    while True:
+        for collection in collections:
+            try:
+                n = await compact_superseded(collection)
+                if n:
+                    print(f"🧹 {collection.name}: {n} versiones reemplazadas compactadas ({COMPACT_MODE})")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Error compactando {collection.name}: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,319 @@
+# Almacén local de registros cifrados (contraseñas ECC por usuario y plataforma)
+# - Datos: log de solo-anexado (<base>.log); cada registro = cabecera (longitud, crc32, tipo) + JSON
+# - Índice en disco (<base>.idx): (id_usuario, plataforma) -> (offset, longitud) + hasta qué offset
+#   del log cubre; al abrir se carga el índice y solo se relee la cola del log
+# - Upsert y búsqueda O(1): un append + actualización del diccionario / un seek + read
+# - Compactación: cuando los bytes muertos superan una fracción del log se reescriben solo los vivos
+# - Migración: si no existe el log pero sí el JSON antiguo (lista), se importa al abrir
+import atexit
+import json
+import os
+import struct
+import tempfile
+import threading
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+_CABECERA = struct.Struct(">IIB")          # longitud del payload, crc32, tipo
+_CABECERA_INDICE = struct.Struct(">4sQQ")  # magia, offset cubierto del log, número de entradas
+_ENTRADA_INDICE = struct.Struct(">HQI")    # longitud de la clave, offset, longitud del registro
+_MAGIA_INDICE = b"IDX1"
+
+TIPO_REGISTRO = 0
+TIPO_BORRADO = 1
+
+# Compactar cuando los bytes muertos superan esta fracción del log (y el log supera el mínimo)
+FRACCION_COMPACTACION = 0.5
+MINIMO_COMPACTACION = 1 << 20
+# Cada cuántas escrituras se vuelca el índice a disco
+ESCRITURAS_POR_INDICE = 10000
+
+
+def _clave(id_usuario: str, plataforma_hex: str) -> str:
+    return f"{id_usuario}\x1f{plataforma_hex}"
+
+
+def _escribir_atomico(ruta: str, contenido_por_partes: Iterator[bytes]) -> None:
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    descriptor, ruta_temporal = tempfile.mkstemp(prefix=".tmp_", dir=directorio)
+    try:
+        with os.fdopen(descriptor, "wb") as f:
+            for parte in contenido_por_partes:
+                f.write(parte)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(ruta_temporal, ruta)
+    except BaseException:
+        if os.path.exists(ruta_temporal):
+            os.remove(ruta_temporal)
+        raise
+
+
+class AlmacenRegistros:
+    def __init__(self, base: str, archivo_legado: Optional[str] = None, fsync_cada_escritura: bool = False):
+        self.ruta_log = base + ".log"
+        self.ruta_indice = base + ".idx"
+        self.fsync_cada_escritura = fsync_cada_escritura
+        self._lock = threading.RLock()
+        # clave -> (offset, longitud total del registro en el log)
+        self._indice: Dict[str, Tuple[int, int]] = {}
+        # id_usuario -> plataformas en orden de última escritura (para leer por id en O(1))
+        self._por_usuario: Dict[str, Dict[str, None]] = {}
+        self._bytes_vivos = 0
+        self._escrituras_sin_indice = 0
+
+        nuevo = not os.path.exists(self.ruta_log)
+        self._log = open(self.ruta_log, "a+b")
+        if nuevo:
+            if archivo_legado and os.path.exists(archivo_legado):
+                self._importar_legado(archivo_legado)
+        else:
+            self._cargar()
+
+    # ---------------- Carga ----------------
+
+    def _cargar(self) -> None:
+        cubierto = self._cargar_indice()
+        tamano = os.path.getsize(self.ruta_log)
+        if cubierto > tamano:
+            # El índice no corresponde al log (p. ej. log restaurado): se reconstruye entero
+            self._indice.clear()
+            self._por_usuario.clear()
+            self._bytes_vivos = 0
+            cubierto = 0
+        self._reproducir_log(cubierto, tamano)
+
+    def _cargar_indice(self) -> int:
+        if not os.path.exists(self.ruta_indice):
+            return 0
+        with open(self.ruta_indice, "rb") as f:
+            datos = f.read()
+        if len(datos) < _CABECERA_INDICE.size:
+            return 0
+        magia, cubierto, n = _CABECERA_INDICE.unpack_from(datos, 0)
+        if magia != _MAGIA_INDICE:
+            return 0
+        pos = _CABECERA_INDICE.size
+        try:
+            for _ in range(n):
+                longitud_clave, offset, longitud = _ENTRADA_INDICE.unpack_from(datos, pos)
+                pos += _ENTRADA_INDICE.size
+                clave = datos[pos:pos + longitud_clave].decode("utf-8")
+                pos += longitud_clave
+                self._registrar(clave, offset, longitud)
+        except (struct.error, UnicodeDecodeError):
+            # Índice truncado o dañado: se reconstruye desde el log
+            self._indice.clear()
+            self._por_usuario.clear()
+            self._bytes_vivos = 0
+            return 0
+        return cubierto
+
+    def _reproducir_log(self, desde: int, hasta: int) -> None:
+        """Aplica al índice los registros del log entre desde y hasta. Trunca una cola incompleta."""
+        self._log.seek(desde)
+        offset = desde
+        while offset < hasta:
+            cabecera = self._log.read(_CABECERA.size)
+            if len(cabecera) < _CABECERA.size:
+                break
+            longitud, crc, tipo = _CABECERA.unpack(cabecera)
+            payload = self._log.read(longitud)
+            if len(payload) < longitud or zlib.crc32(payload) != crc:
+                break
+            registro = json.loads(payload)
+            clave = _clave(registro["id_usuario"], registro["plataforma"])
+            total = _CABECERA.size + longitud
+            if tipo == TIPO_BORRADO:
+                self._olvidar(clave)
+            else:
+                self._registrar(clave, offset, total)
+            offset += total
+        if offset < hasta:
+            print(f"Aviso: cola incompleta en {self.ruta_log}, se descartan {hasta - offset} bytes")
+            self._log.truncate(offset)
+
+    def _importar_legado(self, archivo_legado: str) -> None:
+        try:
+            with open(archivo_legado, "r", encoding="utf-8") as f:
+                lista = json.load(f)
+        except json.JSONDecodeError:
+            lista = []
+        for registro in lista:
+            self._anexar(registro, TIPO_REGISTRO)
+        self._guardar_indice()
+        print(f"Importados {len(lista)} registros de {archivo_legado}")
+
+    # ---------------- Índice en memoria ----------------
+
+    def _registrar(self, clave: str, offset: int, longitud: int) -> None:
+        anterior = self._indice.pop(clave, None)
+        if anterior is not None:
+            self._bytes_vivos -= anterior[1]
+        self._indice[clave] = (offset, longitud)
+        self._bytes_vivos += longitud
+        id_usuario, plataforma = clave.split("\x1f", 1)
+        plataformas = self._por_usuario.setdefault(id_usuario, {})
+        plataformas.pop(plataforma, None)
+        plataformas[plataforma] = None
+
+    def _olvidar(self, clave: str) -> None:
+        anterior = self._indice.pop(clave, None)
+        if anterior is None:
+            return
+        self._bytes_vivos -= anterior[1]
+        id_usuario, plataforma = clave.split("\x1f", 1)
+        plataformas = self._por_usuario.get(id_usuario, {})
+        plataformas.pop(plataforma, None)
+        if not plataformas:
+            self._por_usuario.pop(id_usuario, None)
+
+    def _guardar_indice(self) -> None:
+        self._log.flush()
+        cubierto = self._log.seek(0, os.SEEK_END)
+
+        def partes():
+            yield _CABECERA_INDICE.pack(_MAGIA_INDICE, cubierto, len(self._indice))
+            for clave, (offset, longitud) in self._indice.items():
+                clave_bytes = clave.encode("utf-8")
+                yield _ENTRADA_INDICE.pack(len(clave_bytes), offset, longitud) + clave_bytes
+
+        _escribir_atomico(self.ruta_indice, partes())
+        self._escrituras_sin_indice = 0
+
+    # ---------------- Escritura ----------------
+
+    def _anexar(self, registro: dict, tipo: int) -> None:
+        payload = json.dumps(registro, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self._log.seek(0, os.SEEK_END)
+        offset = self._log.tell()
+        self._log.write(_CABECERA.pack(len(payload), zlib.crc32(payload), tipo) + payload)
+        clave = _clave(registro["id_usuario"], registro["plataforma"])
+        if tipo == TIPO_BORRADO:
+            self._olvidar(clave)
+        else:
+            self._registrar(clave, offset, _CABECERA.size + len(payload))
+
+    def _tras_escritura(self) -> None:
+        self._log.flush()
+        if self.fsync_cada_escritura:
+            os.fsync(self._log.fileno())
+        self._escrituras_sin_indice += 1
+        if self._necesita_compactar():
+            self.compactar()
+        elif self._escrituras_sin_indice >= ESCRITURAS_POR_INDICE:
+            self._guardar_indice()
+
+    def _necesita_compactar(self) -> bool:
+        tamano = self._log.seek(0, os.SEEK_END)
+        return tamano >= MINIMO_COMPACTACION and tamano - self._bytes_vivos > tamano * FRACCION_COMPACTACION
+
+    def guardar(self, registro: dict) -> None:
+        """Inserta o reemplaza el registro de (id_usuario, plataforma)."""
+        with self._lock:
+            self._anexar(registro, TIPO_REGISTRO)
+            self._tras_escritura()
+
+    def eliminar(self, id_usuario: str, plataforma_hex: str) -> bool:
+        with self._lock:
+            if _clave(id_usuario, plataforma_hex) not in self._indice:
+                return False
+            self._anexar({"id_usuario": id_usuario, "plataforma": plataforma_hex}, TIPO_BORRADO)
+            self._tras_escritura()
+            return True
+
+    # ---------------- Lectura ----------------
+
+    def _leer(self, offset: int, longitud: int) -> dict:
+        self._log.seek(offset)
+        datos = self._log.read(longitud)
+        return json.loads(datos[_CABECERA.size:])
+
+    def obtener(self, id_usuario: str, plataforma_hex: str) -> Optional[dict]:
+        with self._lock:
+            posicion = self._indice.get(_clave(id_usuario, plataforma_hex))
+            return None if posicion is None else self._leer(*posicion)
+
+    def obtener_por_usuario(self, id_usuario: str) -> Optional[dict]:
+        """Primer registro (el escrito hace más tiempo) del usuario, como el JSON antiguo."""
+        with self._lock:
+            plataformas = self._por_usuario.get(id_usuario)
+            if not plataformas:
+                return None
+            return self._leer(*self._indice[_clave(id_usuario, next(iter(plataformas)))])
+
+    def registros(self) -> List[dict]:
+        with self._lock:
+            return [self._leer(offset, longitud) for offset, longitud in self._indice.values()]
+
+    def __len__(self) -> int:
+        return len(self._indice)
+
+    # ---------------- Mantenimiento ----------------
+
+    def compactar(self) -> None:
+        """Reescribe el log solo con los registros vivos (en el mismo orden) y el índice nuevo."""
+        with self._lock:
+            self._log.flush()
+            nuevas_posiciones = []
+            # Sin índice hasta terminar: si se interrumpe, al abrir se reconstruye desde el log
+            if os.path.exists(self.ruta_indice):
+                os.remove(self.ruta_indice)
+
+            def partes():
+                offset = 0
+                for clave, (antiguo, longitud) in list(self._indice.items()):
+                    self._log.seek(antiguo)
+                    nuevas_posiciones.append((clave, offset, longitud))
+                    offset += longitud
+                    yield self._log.read(longitud)
+
+            _escribir_atomico(self.ruta_log, partes())
+            self._log.close()
+            self._log = open(self.ruta_log, "a+b")
+            self._indice.clear()
+            self._por_usuario.clear()
+            self._bytes_vivos = 0
+            for clave, offset, longitud in nuevas_posiciones:
+                self._registrar(clave, offset, longitud)
+            self._log.seek(0, os.SEEK_END)
+            self._guardar_indice()
+
+    def cerrar(self) -> None:
+        with self._lock:
+            if self._log.closed:
+                return
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._guardar_indice()
+            self._log.close()
+
+
+_almacenes: Dict[str, AlmacenRegistros] = {}
+_almacenes_lock = threading.Lock()
+
+
+def obtener_almacen(archivo: str) -> AlmacenRegistros:
+    """
+    Almacén compartido para `archivo` (p. ej. passwords.json -> passwords.log / passwords.idx).
+    Si el archivo JSON antiguo existe y el almacén aún no, se importa.
+    """
+    clave = os.path.abspath(archivo)
+    almacen = _almacenes.get(clave)
+    if almacen is None:
+        with _almacenes_lock:
+            almacen = _almacenes.get(clave)
+            if almacen is None:
+                almacen = AlmacenRegistros(os.path.splitext(clave)[0], archivo_legado=clave)
+                _almacenes[clave] = almacen
+    return almacen
+
+
+def cerrar_almacenes() -> None:
+    with _almacenes_lock:
+        for almacen in _almacenes.values():
+            almacen.cerrar()
+        _almacenes.clear()
+
+
+atexit.register(cerrar_almacenes)
@@ -0,0 +1,249 @@
+# Batería de pruebas de aleatoriedad sobre el volcado de claves de evaluación
+# (claves_privadas_sensibles_hash_phi_evaluacion.bin: registros de 256 bytes big endian).
+# El archivo se abre con np.memmap y se recorre por bloques de registros, así que funciona
+# con archivos mayores que la RAM. Todas las pruebas acumulan estadísticos por bloque:
+#   - monobit, rachas y frecuencia por bloques (NIST SP 800-22)
+#   - chi-cuadrado de bytes, correlación serial entre bytes consecutivos
+#   - claves duplicadas
+# El exponente es < n (256 bits): solo los últimos `bytes_utiles` bytes de cada registro tienen
+# información, el resto es relleno a cero y se excluye de las pruebas.
+import json
+import math
+import sys
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+archivo_claves = 'claves_privadas_sensibles_hash_phi_evaluacion.bin'
+bytes_por_registro = 256
+bytes_utiles = 32
+bytes_por_bloque_frecuencia = 16     # M = 128 bits
+registros_por_bloque = 1 << 16       # 16 MB de registros completos por vista
+alfa = 0.01                          # Nivel de significación para "pasa"
+
+# Número de bits a 1 de cada byte
+_BITS_POR_BYTE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _gamma_incompleta_superior(a: float, x: float) -> float:
+    """Función gamma incompleta superior regularizada Q(a, x) (igamc en NIST SP 800-22)."""
+    if x <= 0:
+        return 1.0
+    if x < a + 1:
+        # Serie para P(a, x)
+        termino = suma = 1.0 / a
+        ap = a
+        for _ in range(10000):
+            ap += 1
+            termino *= x / ap
+            suma += termino
+            if abs(termino) < abs(suma) * 1e-15:
+                break
+        return max(0.0, 1.0 - suma * math.exp(-x + a * math.log(x) - math.lgamma(a)))
+    # Fracción continua para Q(a, x) (método de Lentz)
+    minimo = 1e-300
+    b = x + 1 - a
+    c = 1 / minimo
+    d = 1 / b
+    h = d
+    for i in range(1, 10000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = minimo if abs(d) < minimo else d
+        c = b + an / c
+        c = minimo if abs(c) < minimo else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return math.exp(-x + a * math.log(x) - math.lgamma(a)) * h
+
+
+class _Acumulador:
+    """Estadísticos acumulados bloque a bloque sobre la secuencia de bytes útiles."""
+
+    def __init__(self, bytes_bloque_frecuencia: int):
+        self.bytes_bloque_frecuencia = bytes_bloque_frecuencia
+        self.n_bytes = 0
+        self.unos = 0
+        self.transiciones = 0            # Cambios de bit entre posiciones consecutivas
+        self.ultimo_byte: Optional[int] = None
+        self.suma_chi_bloques = 0.0      # Σ (π_i - 1/2)^2 de la prueba de frecuencia por bloques
+        self.n_bloques_frecuencia = 0
+        self.frecuencias = np.zeros(256, dtype=np.int64)
+        self.suma_x = 0
+        self.suma_x2 = 0
+        self.suma_xy = 0                 # Σ x_i * x_{i+1}
+        self.primer_byte: Optional[int] = None
+        self.huellas = []                # 8 bytes por clave para detectar duplicados
+
+    def agregar(self, utiles: np.ndarray) -> None:
+        """utiles: matriz (registros, bytes_utiles) uint8."""
+        secuencia = utiles.reshape(-1)
+        n = secuencia.size
+        if n == 0:
+            return
+        bits = _BITS_POR_BYTE[secuencia]
+
+        # Monobit
+        self.unos += int(bits.sum(dtype=np.int64))
+
+        # Rachas: cambios dentro de cada byte (bits adyacentes) y entre bytes consecutivos
+        self.transiciones += int(_BITS_POR_BYTE[(secuencia ^ (secuencia >> 1)) & 0x7F].sum(dtype=np.int64))
+        self.transiciones += int(np.count_nonzero((secuencia[:-1] & 1) != (secuencia[1:] >> 7)))
+        if self.ultimo_byte is not None:
+            self.transiciones += int((self.ultimo_byte & 1) != (int(secuencia[0]) >> 7))
+
+        # Frecuencia por bloques (los bloques no cruzan registros)
+        por_bloque = bits.reshape(-1, self.bytes_bloque_frecuencia).sum(axis=1, dtype=np.int64)
+        proporciones = por_bloque / (8 * self.bytes_bloque_frecuencia)
+        self.suma_chi_bloques += float(np.square(proporciones - 0.5).sum())
+        self.n_bloques_frecuencia += por_bloque.size
+
+        # Chi-cuadrado de bytes
+        self.frecuencias += np.bincount(secuencia, minlength=256)
+
+        # Correlación serial
+        x = secuencia.astype(np.int64)
+        self.suma_x += int(x.sum())
+        self.suma_x2 += int(np.dot(x, x))
+        self.suma_xy += int(np.dot(x[:-1], x[1:]))
+        if self.ultimo_byte is not None:
+            self.suma_xy += self.ultimo_byte * int(x[0])
+        if self.primer_byte is None:
+            self.primer_byte = int(x[0])
+
+        # Duplicados: los 8 bytes menos significativos como huella (se confirman después)
+        self.huellas.append(np.ascontiguousarray(utiles[:, -8:]).view(">u8").reshape(-1).copy())
+
+        self.ultimo_byte = int(secuencia[-1])
+        self.n_bytes += n
+
+
+def _duplicados(claves: np.ndarray, huellas: np.ndarray) -> Dict:
+    """Confirma byte a byte las claves cuya huella se repite."""
+    orden = np.argsort(huellas, kind="stable")
+    ordenadas = huellas[orden]
+    repetidas = np.flatnonzero(ordenadas[1:] == ordenadas[:-1])
+    grupos: Dict[int, list] = {}
+    for i in repetidas:
+        grupos.setdefault(int(ordenadas[i]), []).extend([int(orden[i]), int(orden[i + 1])])
+    duplicadas = 0
+    ejemplos = []
+    for indices in grupos.values():
+        unicos = sorted(set(indices))
+        vistos = {}
+        for indice in unicos:
+            contenido = bytes(claves[indice])
+            if contenido in vistos:
+                duplicadas += 1
+                if len(ejemplos) < 10:
+                    ejemplos.append([vistos[contenido], indice])
+            else:
+                vistos[contenido] = indice
+    return {"claves_duplicadas": duplicadas, "ejemplos_indices": ejemplos}
+
+
+def analizar(
+    ruta: str = archivo_claves,
+    bytes_utiles: int = bytes_utiles,
+    registros_por_bloque: int = registros_por_bloque,
+    bytes_bloque_frecuencia: int = bytes_por_bloque_frecuencia,
+) -> Dict:
+    if bytes_utiles % bytes_bloque_frecuencia:
+        raise ValueError("bytes_utiles debe ser múltiplo de bytes_bloque_frecuencia")
+    claves = np.memmap(ruta, dtype=np.uint8, mode="r")
+    if claves.size % bytes_por_registro:
+        raise ValueError(f"{ruta} no tiene un número entero de registros de {bytes_por_registro} bytes")
+    claves = claves.reshape(-1, bytes_por_registro)
+    n_registros = claves.shape[0]
+    if n_registros == 0:
+        raise ValueError(f"{ruta} está vacío")
+
+    inicio = time.perf_counter()
+    acumulador = _Acumulador(bytes_bloque_frecuencia)
+    relleno_no_nulo = 0
+    for desde in range(0, n_registros, registros_por_bloque):
+        vista = claves[desde:desde + registros_por_bloque]
+        relleno_no_nulo += int(np.count_nonzero(vista[:, :bytes_por_registro - bytes_utiles]))
+        acumulador.agregar(vista[:, bytes_por_registro - bytes_utiles:])
+
+    n_bits = acumulador.n_bytes * 8
+    resultados = {}
+
+    # Monobit
+    s = 2 * acumulador.unos - n_bits
+    p_monobit = math.erfc(abs(s) / math.sqrt(2 * n_bits))
+    resultados["monobit"] = {"proporcion_unos": acumulador.unos / n_bits, "p_valor": p_monobit}
+
+    # Rachas (requisito previo: el monobit no está muy desviado)
+    pi = acumulador.unos / n_bits
+    rachas = acumulador.transiciones + 1
+    if abs(pi - 0.5) >= 2 / math.sqrt(n_bits):
+        p_rachas = 0.0
+    else:
+        p_rachas = math.erfc(abs(rachas - 2 * n_bits * pi * (1 - pi)) / (2 * math.sqrt(2 * n_bits) * pi * (1 - pi)))
+    resultados["rachas"] = {"rachas": rachas, "p_valor": p_rachas}
+
+    # Frecuencia por bloques
+    m = 8 * bytes_bloque_frecuencia
+    chi_bloques = 4 * m * acumulador.suma_chi_bloques
+    p_bloques = _gamma_incompleta_superior(acumulador.n_bloques_frecuencia / 2, chi_bloques / 2)
+    resultados["frecuencia_bloques"] = {"m_bits": m, "bloques": acumulador.n_bloques_frecuencia,
+                                        "chi2": chi_bloques, "p_valor": p_bloques}
+
+    # Chi-cuadrado de bytes (255 grados de libertad)
+    esperado = acumulador.n_bytes / 256
+    chi_bytes = float(np.square(acumulador.frecuencias - esperado).sum() / esperado)
+    resultados["chi2_bytes"] = {"chi2": chi_bytes, "p_valor": _gamma_incompleta_superior(255 / 2, chi_bytes / 2)}
+
+    # Correlación serial (incluye el par último -> primero, como ent)
+    n = acumulador.n_bytes
+    suma_xy = acumulador.suma_xy + acumulador.ultimo_byte * acumulador.primer_byte
+    denominador = n * acumulador.suma_x2 - acumulador.suma_x ** 2
+    correlacion = (n * suma_xy - acumulador.suma_x ** 2) / denominador if denominador else 1.0
+    # Bajo H0 la correlación ~ N(0, 1/n)
+    p_correlacion = math.erfc(abs(correlacion) * math.sqrt(n) / math.sqrt(2))
+    resultados["correlacion_serial"] = {"coeficiente": correlacion, "p_valor": p_correlacion}
+
+    # Claves duplicadas
+    huellas = np.concatenate(acumulador.huellas)
+    resultados["duplicados"] = _duplicados(claves[:, bytes_por_registro - bytes_utiles:], huellas)
+
+    for nombre, resultado in resultados.items():
+        if "p_valor" in resultado:
+            resultado["pasa"] = resultado["p_valor"] >= alfa
+    resultados["duplicados"]["pasa"] = resultados["duplicados"]["claves_duplicadas"] == 0
+
+    return {
+        "archivo": ruta,
+        "registros": n_registros,
+        "bits_analizados": n_bits,
+        "bytes_utiles_por_registro": bytes_utiles,
+        "bytes_relleno_no_nulos": relleno_no_nulo,
+        "segundos": time.perf_counter() - inicio,
+        "pruebas": resultados,
+    }
+
+
+def main():
+    ruta = sys.argv[1] if len(sys.argv) > 1 else archivo_claves
+    informe = analizar(ruta)
+    print(f"Archivo: {informe['archivo']} ({informe['registros']} claves, {informe['bits_analizados']} bits, "
+          f"{informe['segundos']:.2f} s)")
+    if informe["bytes_relleno_no_nulos"]:
+        print(f"Aviso: {informe['bytes_relleno_no_nulos']} bytes no nulos fuera de los {bytes_utiles} bytes útiles")
+    print(f"{'prueba':>20} {'p-valor':>10} {'resultado':>10}")
+    for nombre, resultado in informe["pruebas"].items():
+        p = resultado.get("p_valor")
+        p_texto = f"{p:>10.4f}" if p is not None else f"{resultado['claves_duplicadas']:>10}"
+        print(f"{nombre:>20} {p_texto} {'pasa' if resultado['pasa'] else 'FALLA':>10}")
+    with open(ruta + ".aleatoriedad.json", "w", encoding="utf-8") as f:
+        json.dump(informe, f, ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+# Análisis de calidad de un corpus de contraseñas (una por línea, p. ej. contrasenas_evaluacion.txt)
+# El archivo se lee por bloques de bytes y cada bloque se procesa con NumPy, sin bucles por línea:
+#   - distribución de clases de carácter por posición y presencia de cada clase por contraseña
+#   - histograma de longitudes
+#   - entropía de Shannon (por carácter y estimada por contraseña) y entropía de adivinanza estimada
+#   - cobertura de constantes.SIMBOLOS_PERMITIDOS
+#   - tasa de duplicados exactos (hash de 64 bits por línea)
+# El resultado es un informe JSON estable (claves ordenadas) para comparar versiones del generador.
+import json
+import math
+import sys
+import time
+from typing import Dict
+
+import numpy as np
+
+import constantes
+import generator
+
+archivo_contrasenas = 'contrasenas_evaluacion.txt'
+tam_bloque = 1 << 26          # 64 MB por lectura
+max_posicion = 64             # Posiciones >= max_posicion se agregan en la última
+
+CLASES = ("otro", "mayuscula", "minuscula", "numerico", "simbolo")
+
+# Clase de cada byte (0 = otro: fuera del alfabeto o no ASCII)
+_CLASE_POR_BYTE = np.zeros(256, dtype=np.uint8)
+_CLASE_POR_BYTE[:len(generator.TABLA_TIPOS)] = np.frombuffer(generator.TABLA_TIPOS, dtype=np.uint8)
+
+_SIMBOLOS = np.frombuffer(constantes.SIMBOLOS_PERMITIDOS.encode("ascii"), dtype=np.uint8)
+
+# Base del hash polinómico por línea (impar, 64 bits)
+_BASE_HASH = np.uint64(0x100000001B3)
+_MEZCLA_LONGITUD = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _potencias(n: int) -> np.ndarray:
+    potencias = np.empty(n, dtype=np.uint64)
+    potencias[0] = 1
+    if n > 1:
+        potencias[1:] = _BASE_HASH
+        potencias = np.multiply.accumulate(potencias)  # Desbordamiento módulo 2^64 intencionado
+    return potencias
+
+
+class _Acumulador:
+    def __init__(self):
+        self.lineas = 0
+        self.vacias = 0
+        self.longitudes = np.zeros(0, dtype=np.int64)
+        self.caracteres_por_posicion = np.zeros((max_posicion, 256), dtype=np.int64)
+        self.presencia_clases = np.zeros(len(CLASES), dtype=np.int64)
+        self.hashes = []
+        self._potencias = _potencias(1)
+
+    def agregar(self, datos: bytes) -> None:
+        buf = np.frombuffer(datos, dtype=np.uint8)
+        fin = np.flatnonzero(buf == 10)
+        if fin.size == 0 or fin[-1] != buf.size - 1:
+            fin = np.append(fin, buf.size)   # Última línea sin salto de línea
+        inicios = np.empty_like(fin)
+        inicios[0] = 0
+        inicios[1:] = fin[:-1] + 1
+        longitudes = fin - inicios
+
+        # Contenido = todo salvo '\n' y el '\r' final de cada línea
+        es_contenido = np.ones(buf.size + 1, dtype=bool)
+        es_contenido[fin] = False
+        con_cr = (longitudes > 0) & (buf[np.maximum(fin - 1, 0)] == 13)
+        es_contenido[fin[con_cr] - 1] = False
+        longitudes = longitudes - con_cr
+        contenido = buf[es_contenido[:buf.size]]
+
+        no_vacias = longitudes > 0
+        self.vacias += int(np.count_nonzero(~no_vacias))
+        longitudes = longitudes[no_vacias]
+        if longitudes.size == 0:
+            return
+        self.lineas += longitudes.size
+
+        histograma = np.bincount(longitudes)
+        if histograma.size > self.longitudes.size:
+            histograma[:self.longitudes.size] += self.longitudes
+            self.longitudes = histograma
+        else:
+            self.longitudes[:histograma.size] += histograma
+
+        # Posición de cada carácter dentro de su línea
+        inicios_contenido = np.cumsum(longitudes) - longitudes
+        posiciones = np.arange(contenido.size) - np.repeat(inicios_contenido, longitudes)
+
+        # Frecuencia (posición, byte)
+        indice = np.minimum(posiciones, max_posicion - 1) * 256 + contenido
+        self.caracteres_por_posicion += np.bincount(indice, minlength=max_posicion * 256).reshape(max_posicion, 256)
+
+        # Clases presentes en cada contraseña (OR de bits por línea)
+        bits_clase = np.left_shift(np.uint8(1), _CLASE_POR_BYTE[contenido])
+        presentes = np.bitwise_or.reduceat(bits_clase, inicios_contenido)
+        for clase in range(len(CLASES)):
+            self.presencia_clases[clase] += int(np.count_nonzero(presentes & (1 << clase)))
+
+        # Hash polinómico de 64 bits por línea, mezclado con la longitud
+        if posiciones.size and int(posiciones.max()) + 1 > self._potencias.size:
+            self._potencias = _potencias(int(posiciones.max()) + 1)
+        terminos = contenido.astype(np.uint64) * self._potencias[posiciones]
+        hashes = np.add.reduceat(terminos, inicios_contenido) ^ (longitudes.astype(np.uint64) * _MEZCLA_LONGITUD)
+        self.hashes.append(hashes)
+
+
+def _entropia(conteos: np.ndarray) -> float:
+    total = conteos.sum()
+    if total == 0:
+        return 0.0
+    p = conteos[conteos > 0] / total
+    return float(-(p * np.log2(p)).sum())
+
+
+def _entropia_renyi_media(conteos: np.ndarray) -> float:
+    """Entropía de Rényi de orden 1/2 (bits): base de la estimación de adivinanza de Arikan."""
+    total = conteos.sum()
+    if total == 0:
+        return 0.0
+    p = conteos[conteos > 0] / total
+    return float(2 * np.log2(np.sqrt(p).sum()))
+
+
+def analizar(ruta: str = archivo_contrasenas) -> Dict:
+    inicio = time.perf_counter()
+    acumulador = _Acumulador()
+    resto = b""
+    with open(ruta, "rb") as f:
+        while True:
+            bloque = f.read(tam_bloque)
+            if not bloque:
+                break
+            bloque = resto + bloque
+            corte = bloque.rfind(b"\n") + 1
+            if corte == 0:
+                resto = bloque
+                continue
+            resto = bloque[corte:]
+            acumulador.agregar(bloque[:corte])
+    if resto:
+        acumulador.agregar(resto)
+
+    n = acumulador.lineas
+    if n == 0:
+        raise ValueError(f"{ruta} no contiene contraseñas")
+    por_posicion = acumulador.caracteres_por_posicion
+    frecuencias = por_posicion.sum(axis=0)
+    longitudes = acumulador.longitudes
+    total_caracteres = int(frecuencias.sum())
+
+    # Fracción de contraseñas que llegan a cada posición
+    # (una contraseña de longitud L ocupa las posiciones 0..L-1)
+    acumuladas = np.full(max_posicion, n, dtype=np.int64)
+    cortadas = np.cumsum(longitudes)[:max_posicion]
+    acumuladas[:cortadas.size] = cortadas
+    alcanzan = n - acumuladas
+
+    # Entropías por posición (condicionadas a que la contraseña tenga esa posición)
+    entropia_longitud = _entropia(longitudes)
+    shannon_posiciones = np.array([_entropia(fila) for fila in por_posicion])
+    renyi_posiciones = np.array([_entropia_renyi_media(fila) for fila in por_posicion])
+    peso = alcanzan / n
+    shannon_contrasena = entropia_longitud + float((peso * shannon_posiciones).sum())
+    renyi_contrasena = _entropia_renyi_media(longitudes) + float((peso * renyi_posiciones).sum())
+
+    # Distribución de clases por posición
+    clases_por_posicion = np.zeros((max_posicion, len(CLASES)), dtype=np.int64)
+    for clase in range(len(CLASES)):
+        clases_por_posicion[:, clase] = por_posicion[:, _CLASE_POR_BYTE == clase].sum(axis=1)
+    ultima = int(np.flatnonzero(alcanzan)[-1]) + 1 if np.any(alcanzan) else 0
+    distribucion_posiciones = []
+    for posicion in range(ultima):
+        total_posicion = int(clases_por_posicion[posicion].sum())
+        distribucion_posiciones.append({
+            "posicion": posicion,
+            "contrasenas": total_posicion,
+            **{clase: round(int(clases_por_posicion[posicion, i]) / total_posicion, 6) if total_posicion else 0.0
+               for i, clase in enumerate(CLASES)},
+        })
+
+    # Cobertura de símbolos permitidos
+    conteo_simbolos = {chr(s): int(frecuencias[s]) for s in _SIMBOLOS}
+    usados = sum(1 for c in conteo_simbolos.values() if c)
+
+    # Duplicados exactos
+    hashes = np.concatenate(acumulador.hashes)
+    unicos = int(np.unique(hashes).size)
+
+    informe = {
+        "archivo": ruta,
+        "contrasenas": n,
+        "lineas_vacias": acumulador.vacias,
+        "longitud": {
+            "histograma": {str(l): int(c) for l, c in enumerate(longitudes) if c},
+            "media": round(float((np.arange(longitudes.size) * longitudes).sum() / n), 4),
+            "minima": int(np.flatnonzero(longitudes)[0]),
+            "maxima": int(np.flatnonzero(longitudes)[-1]),
+        },
+        "entropia": {
+            "shannon_por_caracter_bits": round(_entropia(frecuencias), 4),
+            "shannon_longitud_bits": round(entropia_longitud, 4),
+            "shannon_por_contrasena_bits": round(shannon_contrasena, 4),
+            "renyi_1_2_por_contrasena_bits": round(renyi_contrasena, 4),
+            # Arikan: log2 E[G] >= H_1/2 - log2(1 + ln |espacio|), con posiciones independientes
+            "adivinanza_log2_estimada": round(
+                renyi_contrasena - math.log2(1 + (longitudes.size - 1) * math.log(256)), 4),
+            "shannon_por_posicion_bits": [round(float(h), 4) for h in shannon_posiciones[:ultima]],
+        },
+        "clases": {
+            "proporcion_caracteres": {clase: round(int(clases_por_posicion[:, i].sum()) / total_caracteres, 6)
+                                      for i, clase in enumerate(CLASES)},
+            "contrasenas_con_clase": {clase: round(int(acumulador.presencia_clases[i]) / n, 6)
+                                      for i, clase in enumerate(CLASES)},
+            "por_posicion": distribucion_posiciones,
+        },
+        "simbolos": {
+            "permitidos": len(conteo_simbolos),
+            "usados": usados,
+            "cobertura": round(usados / len(conteo_simbolos), 6),
+            "conteo": conteo_simbolos,
+            "caracteres_fuera_de_alfabeto": int(clases_por_posicion[:, 0].sum()),
+        },
+        "duplicados": {
+            "unicas": unicos,
+            "duplicadas": n - unicos,
+            "tasa": round((n - unicos) / n, 8),
+        },
+    }
+    informe["segundos"] = round(time.perf_counter() - inicio, 3)
+    return informe
+
+
+def main():
+    ruta = sys.argv[1] if len(sys.argv) > 1 else archivo_contrasenas
+    informe = analizar(ruta)
+    salida = ruta + ".calidad.json"
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2, sort_keys=True)
+    entropia = informe["entropia"]
+    print(f"{informe['contrasenas']} contraseñas analizadas en {informe['segundos']} s -> {salida}")
+    print(f"Shannon por contraseña: {entropia['shannon_por_contrasena_bits']} bits, "
+          f"adivinanza estimada: 2^{entropia['adivinanza_log2_estimada']}")
+    print(f"Cobertura de símbolos: {informe['simbolos']['usados']}/{informe['simbolos']['permitidos']}, "
+          f"duplicados: {informe['duplicados']['tasa']:.6%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+# Similitud entre las contraseñas de un mismo usuario en distintas plataformas
+# Todas salen de la misma unique_profile_description y solo cambian por el tag y el azar:
+# se mide cuánto revela una contraseña filtrada sobre las demás.
+# Para cada par de plataformas se comparan las contraseñas de todos los usuarios a la vez:
+#   - distancia de edición con el algoritmo bit-paralelo de Myers (una palabra de 64 bits por par)
+#   - Jaccard de n-gramas (n-gramas ordenados por fila, intersección por adyacencia)
+#   - subcadena común más larga (bit-paralela sobre las máscaras de coincidencia)
+# Como línea base se comparan las mismas plataformas entre usuarios distintos.
+import itertools
+import json
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import generador_lote
+import registro_tags
+from lector_json import iterar_lista_json
+
+input_json = 'resultado_palabras_sensible.json'
+archivo_tags = 'redes_sociales_con_tags.json'
+output_json = 'similitud_plataformas.json'
+max_usuarios = None            # None = todo el corpus
+semilla = 0
+pares_por_bloque = 1 << 15     # Filas procesadas a la vez (memoria ~ pares_por_bloque * 1 KB)
+tam_ngrama = 2
+LONGITUD_MAXIMA = 64           # Una palabra de 64 bits por contraseña
+_UNO = np.uint64(1)
+
+
+def _a_matriz(contrasenas: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Contraseñas ASCII -> matriz uint8 (filas, LONGITUD_MAXIMA) rellena con 0 y longitudes."""
+    longitudes = np.fromiter((len(c) for c in contrasenas), dtype=np.int64, count=len(contrasenas))
+    if longitudes.size and longitudes.max() > LONGITUD_MAXIMA:
+        raise ValueError(f"Contraseña de más de {LONGITUD_MAXIMA} caracteres")
+    ancho = int(longitudes.max()) if longitudes.size else 0
+    matriz = np.zeros((len(contrasenas), max(ancho, 1)), dtype=np.uint8)
+    datos = np.frombuffer("".join(contrasenas).encode("ascii"), dtype=np.uint8)
+    filas = np.repeat(np.arange(len(contrasenas)), longitudes)
+    columnas = np.arange(datos.size) - np.repeat(np.cumsum(longitudes) - longitudes, longitudes)
+    matriz[filas, columnas] = datos
+    return matriz, longitudes
+
+
+def _mascaras_coincidencia(a: np.ndarray, len_a: np.ndarray, b: np.ndarray, len_b: np.ndarray) -> np.ndarray:
+    """
+    M[f, j] = bits i tales que a[f, i] == b[f, j] (0 para j >= len_b[f]).
+    Se construye la tabla Peq de cada fila (128 caracteres ASCII) y se indexa con b.
+    """
+    filas = np.arange(a.shape[0])
+    peq = np.zeros((a.shape[0], 128), dtype=np.uint64)
+    for i in range(a.shape[1]):
+        validas = len_a > i
+        peq[filas[validas], a[validas, i]] |= _UNO << np.uint64(i)
+    mascaras = peq[filas[:, None], b]
+    mascaras[np.arange(b.shape[1])[None, :] >= len_b[:, None]] = 0
+    return mascaras
+
+
+def _distancia_myers(mascaras: np.ndarray, len_a: np.ndarray, len_b: np.ndarray) -> np.ndarray:
+    """Distancia de Levenshtein global, algoritmo bit-paralelo de Myers/Hyyrö vectorizado por filas."""
+    n = mascaras.shape[0]
+    todos = np.full(n, np.uint64(0xFFFFFFFFFFFFFFFF))
+    m = np.maximum(len_a, 1).astype(np.uint64)
+    pv = todos >> (np.uint64(64) - m)
+    mv = np.zeros(n, dtype=np.uint64)
+    bit_alto = _UNO << (m - _UNO)
+    puntuacion = len_a.copy()
+    for j in range(mascaras.shape[1]):
+        activas = len_b > j
+        if not activas.any():
+            break
+        eq = mascaras[:, j]
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        puntuacion += activas * (((ph & bit_alto) != 0).astype(np.int64) - ((mh & bit_alto) != 0).astype(np.int64))
+        ph = (ph << _UNO) | _UNO   # Distancia global: la fila 0 crece en 1 por columna
+        mh = mh << _UNO
+        pv = np.where(activas, mh | ~(xv | ph), pv)
+        mv = np.where(activas, ph & xv, mv)
+    # Cadena a vacía: la distancia es la longitud de b
+    return np.where(len_a == 0, len_b, puntuacion)
+
+
+def _subcadena_comun(mascaras: np.ndarray) -> np.ndarray:
+    """
+    Longitud de la subcadena común más larga. S_k[:, j] tiene el bit i si a[i-k+1..i] == b[j-k+1..j];
+    S_k[:, j] = M[:, j] & (S_{k-1}[:, j-1] << 1). Se itera hasta que ninguna fila tenga coincidencias,
+    así el coste es proporcional a la subcadena más larga (pocas iteraciones en la práctica).
+    """
+    resultado = np.zeros(mascaras.shape[0], dtype=np.int64)
+    actual = mascaras
+    k = 0
+    while True:
+        con_coincidencia = (actual != 0).any(axis=1)
+        if not con_coincidencia.any():
+            return resultado
+        k += 1
+        resultado[con_coincidencia] = k
+        siguiente = np.zeros_like(actual)
+        siguiente[:, 1:] = mascaras[:, 1:] & (actual[:, :-1] << _UNO)
+        actual = siguiente
+
+
+def _jaccard_ngramas(a: np.ndarray, len_a: np.ndarray, b: np.ndarray, len_b: np.ndarray, n: int) -> np.ndarray:
+    """
+    Jaccard entre los conjuntos de n-gramas de cada fila. Los n-gramas se codifican como enteros,
+    se ordenan por fila y se quitan los repetidos; la intersección son los valores iguales
+    adyacentes al ordenar juntos los de a y los de b.
+    """
+
+    def unicos(matriz, longitudes):
+        ancho = max(matriz.shape[1] - n + 1, 1)
+        codigo = np.zeros((matriz.shape[0], ancho), dtype=np.int64)
+        for desplazamiento in range(n):
+            columna = matriz[:, desplazamiento:desplazamiento + ancho]
+            codigo[:, :columna.shape[1]] = codigo[:, :columna.shape[1]] * 128 + columna
+        codigo[np.arange(ancho)[None, :] >= (longitudes - n + 1)[:, None]] = -1   # Fuera de la cadena
+        codigo.sort(axis=1)
+        repetido = np.zeros_like(codigo, dtype=bool)
+        repetido[:, 1:] = codigo[:, 1:] == codigo[:, :-1]
+        codigo[repetido] = -1
+        return codigo, (codigo >= 0).sum(axis=1)
+
+    codigos_a, tam_a = unicos(a, len_a)
+    codigos_b, tam_b = unicos(b, len_b)
+    juntos = np.concatenate([codigos_a, codigos_b], axis=1)
+    juntos.sort(axis=1)
+    interseccion = ((juntos[:, 1:] == juntos[:, :-1]) & (juntos[:, 1:] >= 0)).sum(axis=1)
+    union = tam_a + tam_b - interseccion
+    return np.where(union > 0, interseccion / np.maximum(union, 1), 1.0)
+
+
+def comparar(a: Sequence[str], b: Sequence[str], n: int = tam_ngrama) -> Dict[str, np.ndarray]:
+    """Compara a[i] con b[i] para todas las filas, por bloques de pares_por_bloque."""
+    distancias, similitudes, jaccards, subcadenas = [], [], [], []
+    for inicio in range(0, len(a), pares_por_bloque):
+        matriz_a, len_a = _a_matriz(a[inicio:inicio + pares_por_bloque])
+        matriz_b, len_b = _a_matriz(b[inicio:inicio + pares_por_bloque])
+        mascaras = _mascaras_coincidencia(matriz_a, len_a, matriz_b, len_b)
+        distancia = _distancia_myers(mascaras, len_a, len_b)
+        distancias.append(distancia)
+        similitudes.append(1 - distancia / np.maximum(np.maximum(len_a, len_b), 1))
+        jaccards.append(_jaccard_ngramas(matriz_a, len_a, matriz_b, len_b, n))
+        subcadenas.append(_subcadena_comun(mascaras))
+    vacio = np.zeros(0)
+    return {
+        "distancia_edicion": np.concatenate(distancias) if distancias else vacio,
+        "similitud_edicion": np.concatenate(similitudes) if similitudes else vacio,
+        "jaccard": np.concatenate(jaccards) if jaccards else vacio,
+        "subcadena_comun": np.concatenate(subcadenas) if subcadenas else vacio,
+    }
+
+
+def _resumen(metricas: Dict[str, np.ndarray]) -> Dict:
+    resumen = {"pares": int(metricas["distancia_edicion"].size)}
+    if resumen["pares"] == 0:
+        return resumen
+    for nombre, valores in metricas.items():
+        p50, p95, p99 = np.percentile(valores, [50, 95, 99])
+        resumen[nombre] = {
+            "media": round(float(valores.mean()), 6),
+            "p50": round(float(p50), 6),
+            "p95": round(float(p95), 6),
+            "p99": round(float(p99), 6),
+            "max": round(float(valores.max()), 6),
+        }
+    subcadenas = metricas["subcadena_comun"]
+    resumen["subcadena_comun"]["histograma"] = {
+        str(k): int(c) for k, c in enumerate(np.bincount(subcadenas.astype(np.int64))) if c
+    }
+    return resumen
+
+
+def comparar_plataformas(contrasenas_por_plataforma: Dict[str, List[Optional[str]]]) -> Dict:
+    """
+    contrasenas_por_plataforma: plataforma -> lista alineada por usuario (None si falta).
+    Devuelve, por cada par de plataformas, el resumen entre contraseñas del mismo usuario y la
+    línea base (mismo par de plataformas, usuarios distintos).
+    """
+    informe = {}
+    for p, q in itertools.combinations(sorted(contrasenas_por_plataforma), 2):
+        lista_p, lista_q = contrasenas_por_plataforma[p], contrasenas_por_plataforma[q]
+        completos = [i for i, (x, y) in enumerate(zip(lista_p, lista_q)) if x is not None and y is not None]
+        a = [lista_p[i] for i in completos]
+        b = [lista_q[i] for i in completos]
+        # Línea base: cada contraseña de p frente a la de q del siguiente usuario
+        b_otro = b[1:] + b[:1]
+        informe[f"{p}|{q}"] = {
+            "mismo_usuario": _resumen(comparar(a, b)),
+            "linea_base": _resumen(comparar(a, b_otro)) if len(b) > 1 else {"pares": 0},
+        }
+    return informe
+
+
+def main():
+    inicio = time.perf_counter()
+    perfiles = []
+    for perfil in iterar_lista_json(input_json):
+        perfiles.append(perfil)
+        if max_usuarios is not None and len(perfiles) >= max_usuarios:
+            break
+    plataformas = sorted(registro_tags.obtener_registro(archivo_tags).todos())
+    print(f"{len(perfiles)} usuarios, {len(plataformas)} plataformas")
+
+    contrasenas = {}
+    for indice, plataforma in enumerate(plataformas):
+        contrasenas[plataforma] = generador_lote.generar_contrasenas_lote(
+            perfiles, plataforma, archivo_tags, semilla=None if semilla is None else semilla + indice
+        )
+    generado = time.perf_counter()
+
+    informe = comparar_plataformas(contrasenas)
+    pares = sum(r["mismo_usuario"]["pares"] + r["linea_base"]["pares"] for r in informe.values())
+    segundos = time.perf_counter() - generado
+    print(f"Generación: {generado - inicio:.1f} s, comparación: {pares} pares en {segundos:.1f} s "
+          f"({pares / max(segundos, 1e-9):.0f} pares/s)")
+    for par, resultado in informe.items():
+        mismo, base = resultado["mismo_usuario"], resultado["linea_base"]
+        if mismo["pares"] and base["pares"]:
+            print(f"{par:>22}: similitud edición {mismo['similitud_edicion']['media']:.3f} "
+                  f"(base {base['similitud_edicion']['media']:.3f}), jaccard {mismo['jaccard']['media']:.3f} "
+                  f"(base {base['jaccard']['media']:.3f}), subcadena máx {mismo['subcadena_comun']['max']:.0f}")
+    with open(output_json, "w", encoding="utf-8") as f:
+        json.dump({"usuarios": len(perfiles), "plataformas": plataformas, "pares": informe},
+                  f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
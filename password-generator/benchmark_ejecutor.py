@@ -0,0 +1,90 @@
+# Benchmark de los modos de ejecución del pipeline (inline / thread / process)
+# Para cada modo y nivel de concurrencia (1, 8, 64 peticiones simultáneas) mide:
+#   - throughput (contraseñas/s) y latencia p50/p99 por petición
+#   - retraso máximo del event loop (lo que esperaría el parseo HTTP / verificación HMAC)
+import asyncio
+import json
+import time
+import ejecutor_pipeline
+import procesador_numerico_password
+
+archivo_perfil = "resultado_psicologico_example.json"
+plataforma = "instagram"
+modos = ejecutor_pipeline.MODOS
+concurrencias = [1, 8, 64]
+peticiones_por_prueba = 512
+
+
+def percentil(valores_ordenados: list, p: float) -> float:
+    indice = min(len(valores_ordenados) - 1, int(round(p / 100 * (len(valores_ordenados) - 1))))
+    return valores_ordenados[indice]
+
+
+async def medir_retraso_loop(detener: asyncio.Event, retrasos: list, intervalo: float = 0.001):
+    """Tarea testigo: cuánto tarda el loop en despertarla respecto a lo esperado."""
+    while not detener.is_set():
+        inicio = time.perf_counter()
+        await asyncio.sleep(intervalo)
+        retrasos.append(time.perf_counter() - inicio - intervalo)
+
+
+async def medir(modo: str, concurrencia: int, valores, cadena_usuario, tag) -> dict:
+    ejecutor = ejecutor_pipeline.EjecutorPipeline(modo=modo, max_pendientes=peticiones_por_prueba)
+    # Calentamiento (arranque de workers en modo process)
+    await asyncio.gather(*(ejecutor.ejecutar(valores, cadena_usuario, tag) for _ in range(concurrencia)))
+
+    semaforo = asyncio.Semaphore(concurrencia)
+    latencias = []
+
+    async def una_peticion():
+        async with semaforo:
+            inicio = time.perf_counter()
+            await ejecutor.ejecutar(valores, cadena_usuario, tag)
+            latencias.append(time.perf_counter() - inicio)
+            await asyncio.sleep(0)  # Punto de cesión, como haría el servidor al responder
+
+    detener = asyncio.Event()
+    retrasos = []
+    testigo = asyncio.create_task(medir_retraso_loop(detener, retrasos))
+    inicio = time.perf_counter()
+    await asyncio.gather(*(una_peticion() for _ in range(peticiones_por_prueba)))
+    total = time.perf_counter() - inicio
+    detener.set()
+    await testigo
+    ejecutor.cerrar()
+
+    latencias.sort()
+    return {
+        "modo": modo,
+        "concurrencia": concurrencia,
+        "ops_s": peticiones_por_prueba / total,
+        "p50_ms": percentil(latencias, 50) * 1000,
+        "p99_ms": percentil(latencias, 99) * 1000,
+        "max_retraso_loop_ms": max(retrasos, default=0.0) * 1000,
+    }
+
+
+async def main_async():
+    with open(archivo_perfil, "r", encoding="utf-8") as f:
+        perfil = json.load(f)
+    valores = list(perfil["predicted_scores"].values())
+    cadena_usuario = f"{perfil['unique_profile_description']} | usuario@example.com | {plataforma}"
+    tag = procesador_numerico_password.cargar_tag_redes("redes_sociales_con_tags.json", plataforma)
+
+    resultados = []
+    print(f"{'modo':>8} {'conc':>5} {'ops/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'max lag loop ms':>16}")
+    for modo in modos:
+        for concurrencia in concurrencias:
+            r = await medir(modo, concurrencia, valores, cadena_usuario, tag)
+            resultados.append(r)
+            print(f"{r['modo']:>8} {r['concurrencia']:>5} {r['ops_s']:>9.1f} {r['p50_ms']:>8.2f} "
+                  f"{r['p99_ms']:>8.2f} {r['max_retraso_loop_ms']:>16.2f}")
+    return resultados
+
+
+def main():
+    asyncio.run(main_async())
+
+
+if __name__ == "__main__":
+    main()
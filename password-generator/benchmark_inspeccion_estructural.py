@@ -0,0 +1,45 @@
+# Benchmark de latencia de generator.inspeccion_estructural_contrasena
+# Mide p50 / p99 / máximo por contraseña para cada longitud (10-16 y longitudes mayores)
+import random
+import time
+import constantes
+from generator import inspeccion_estructural_contrasena, LONGITUD_MAXIMA_ESTRUCTURAL
+
+alfabeto_extendido = constantes.ALFABETO_EXTENDIDO
+longitudes = list(range(constantes.longitud_minima, constantes.longitud_maxima + 1)) + [24, 32, 48, LONGITUD_MAXIMA_ESTRUCTURAL]
+repeticiones = 20000
+
+
+def percentil(valores_ordenados: list, p: float) -> float:
+    indice = min(len(valores_ordenados) - 1, int(round(p / 100 * (len(valores_ordenados) - 1))))
+    return valores_ordenados[indice]
+
+
+def medir_longitud(longitud: int, repeticiones: int) -> dict:
+    # Entradas con el mismo alfabeto que produce el cifrado César (incluye el peor caso: todo repetido)
+    entradas = ["".join(random.choice(alfabeto_extendido) for _ in range(longitud)) for _ in range(repeticiones - 1)]
+    entradas.append("a" * longitud)
+    tiempos = []
+    for cadena in entradas:
+        inicio = time.perf_counter_ns()
+        inspeccion_estructural_contrasena(cadena)
+        tiempos.append(time.perf_counter_ns() - inicio)
+    tiempos.sort()
+    return {
+        "longitud": longitud,
+        "p50_us": percentil(tiempos, 50) / 1000,
+        "p99_us": percentil(tiempos, 99) / 1000,
+        "max_us": tiempos[-1] / 1000,
+    }
+
+
+def main():
+    print(f"Benchmark inspección estructural ({repeticiones} contraseñas por longitud)")
+    print(f"{'longitud':>8} {'p50 (us)':>10} {'p99 (us)':>10} {'max (us)':>10}")
+    for longitud in longitudes:
+        r = medir_longitud(longitud, repeticiones)
+        print(f"{r['longitud']:>8} {r['p50_us']:>10.2f} {r['p99_us']:>10.2f} {r['max_us']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
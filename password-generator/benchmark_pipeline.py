@@ -0,0 +1,223 @@
+# Benchmark por etapas del pipeline de generación con perfiles realistas
+# Etapas medidas (cada una aislada, con entradas precalculadas):
+#   desplazamiento, preprocesador, contrasena, inspeccion, codificacion, exponente, encriptacion
+#   y el pipeline completo (ejecutor_pipeline.ejecutar_pipeline + exponente + encriptación ECC)
+# Los perfiles salen de resultado_psicologico_example.json y de ../psy_analizer/resultado_palabras.json.
+# Para cada etapa se guarda ops/s y latencia p50/p95/p99/máx en un JSON de línea base; en las
+# ejecuciones siguientes se compara con ella y se marca regresión si ops/s baja más de `umbral_regresion`.
+# Uso:
+#   python benchmark_pipeline.py                    -> mide y compara con la línea base (código 1 si hay regresión)
+#   python benchmark_pipeline.py --guardar-base     -> mide y guarda el resultado como nueva línea base
+import json
+import os
+import platform
+import sys
+import time
+from typing import Callable, Dict, List
+
+import curva_eliptica
+import ejecutor_pipeline
+import fuente_aleatoria
+import generator
+import preprocesador_texto
+import procesador_numerico_eliptico
+import procesador_numerico_password
+from constantes import ALFABETO_EXTENDIDO
+from lector_json import iterar_lista_json
+
+archivo_perfil = "resultado_psicologico_example.json"
+archivo_perfiles = os.path.join("..", "psy_analizer", "resultado_palabras.json")
+archivo_tags = "redes_sociales_con_tags.json"
+archivo_linea_base = "benchmark_pipeline_base.json"
+plataforma = "instagram"
+perfiles_maximos = 256
+claves_publicas_maximas = 32      # Derivar una clave por perfil es caro: se reutilizan en ciclo
+repeticiones = 2000               # Llamadas medidas por etapa y ronda
+rondas = 5                        # ops/s = mejor ronda (menos sensible al ruido de la máquina)
+repeticiones_calentamiento = 100
+repeticiones_lentas = 200         # Etapas con criptografía de curva elíptica
+umbral_regresion = 0.15           # Caída relativa de ops/s que se considera regresión
+semilla = 20240601                # Flujo determinista: las mismas entradas y sorteos en cada ejecución
+
+
+def percentil(valores_ordenados: list, p: float) -> float:
+    indice = min(len(valores_ordenados) - 1, int(round(p / 100 * (len(valores_ordenados) - 1))))
+    return valores_ordenados[indice]
+
+
+def cargar_perfiles() -> List[Dict]:
+    """Perfil de ejemplo + hasta `perfiles_maximos` perfiles del corpus (si existe)."""
+    perfiles = []
+    with open(archivo_perfil, "r", encoding="utf-8") as f:
+        perfiles.append(json.load(f))
+    if os.path.exists(archivo_perfiles):
+        for perfil in iterar_lista_json(archivo_perfiles):
+            if perfil.get("predicted_scores") and perfil.get("unique_profile_description"):
+                perfiles.append(perfil)
+            if len(perfiles) > perfiles_maximos:
+                break
+    else:
+        print(f"Aviso: no existe {archivo_perfiles}; solo se usa {archivo_perfil}")
+    return perfiles
+
+
+def preparar_entradas(perfiles: List[Dict], tag: str) -> List[Dict]:
+    """Entradas de cada etapa calculadas una vez, para medir cada etapa por separado."""
+    entradas = []
+    for i, perfil in enumerate(perfiles):
+        valores = list(perfil["predicted_scores"].values())
+        cadena_usuario = f"{perfil['unique_profile_description']} | usuario{i}@example.com | {plataforma}"
+        desplazamiento = procesador_numerico_password.calcular_desplazamiento(valores, tag, len(ALFABETO_EXTENDIDO))
+        cadena_cifrada, _ = preprocesador_texto.preprocesador_cadena(cadena_usuario, desplazamiento)
+        longitud = procesador_numerico_password.generar_longitud()
+        punto_inicio = procesador_numerico_password.generar_punto_inicio()
+        # Subcadena circular sin inspeccionar: la entrada real de inspeccion_estructural_contrasena
+        sin_inspeccionar = "".join(cadena_cifrada[(punto_inicio + j) % len(cadena_cifrada)] for j in range(longitud))
+        valor_numerico_cod = procesador_numerico_eliptico.calcular_codificacion_numerica(cadena_cifrada)
+        entradas.append({
+            "valores": valores,
+            "cadena_usuario": cadena_usuario,
+            "desplazamiento": desplazamiento,
+            "cadena_cifrada": cadena_cifrada,
+            "longitud": longitud,
+            "punto_inicio": punto_inicio,
+            "sin_inspeccionar": sin_inspeccionar,
+            "valor_numerico_cod": valor_numerico_cod,
+            "contrasena": generator.generar_contrasena(cadena_usuario, longitud, desplazamiento, punto_inicio),
+        })
+    for entrada in entradas[:claves_publicas_maximas]:
+        exponente = procesador_numerico_eliptico.calcular_exponente(entrada["valores"], entrada["valor_numerico_cod"])
+        entrada["clave_publica"] = curva_eliptica.construir_clave_privada(exponente).public_key()
+    return entradas
+
+
+def pipeline_completo(entrada: Dict, tag: str):
+    resultado = ejecutor_pipeline.ejecutar_pipeline(entrada["valores"], entrada["cadena_usuario"], tag)
+    exponente = procesador_numerico_eliptico.calcular_exponente(entrada["valores"], resultado["valor_numerico_cod"])
+    clave_publica = curva_eliptica.construir_clave_privada(exponente).public_key()
+    return curva_eliptica.ecc_encriptar_password(clave_publica, resultado["contrasena"])
+
+
+def etapas(tag: str) -> Dict[str, tuple]:
+    """nombre -> (función sobre una entrada, repeticiones, solo entradas con clave pública)"""
+    n_alfabeto = len(ALFABETO_EXTENDIDO)
+    return {
+        "desplazamiento": (
+            lambda e: procesador_numerico_password.calcular_desplazamiento(e["valores"], tag, n_alfabeto),
+            repeticiones, False),
+        "preprocesador": (
+            lambda e: preprocesador_texto.preprocesador_cadena(e["cadena_usuario"], e["desplazamiento"]),
+            repeticiones, False),
+        "contrasena": (
+            lambda e: generator.generar_contrasena(e["cadena_usuario"], e["longitud"], e["desplazamiento"], e["punto_inicio"]),
+            repeticiones, False),
+        "inspeccion": (
+            lambda e: generator.inspeccion_estructural_contrasena(e["sin_inspeccionar"]),
+            repeticiones, False),
+        "codificacion": (
+            lambda e: procesador_numerico_eliptico.calcular_codificacion_numerica(e["cadena_cifrada"]),
+            repeticiones, False),
+        "exponente": (
+            lambda e: procesador_numerico_eliptico.calcular_exponente(e["valores"], e["valor_numerico_cod"]),
+            repeticiones, False),
+        "encriptacion": (
+            lambda e: curva_eliptica.ecc_encriptar_password(e["clave_publica"], e["contrasena"]),
+            repeticiones_lentas, True),
+        "pipeline_completo": (
+            lambda e: pipeline_completo(e, tag),
+            repeticiones_lentas, False),
+    }
+
+
+def medir(funcion: Callable, entradas: List[Dict], n: int) -> Dict:
+    for i in range(repeticiones_calentamiento):
+        funcion(entradas[i % len(entradas)])
+    latencias = []
+    mejor_total = None
+    for _ in range(rondas):
+        inicio = time.perf_counter_ns()
+        for i in range(n):
+            entrada = entradas[i % len(entradas)]
+            t = time.perf_counter_ns()
+            funcion(entrada)
+            latencias.append(time.perf_counter_ns() - t)
+        total = time.perf_counter_ns() - inicio
+        mejor_total = total if mejor_total is None else min(mejor_total, total)
+    latencias.sort()
+    return {
+        "llamadas": n * rondas,
+        "ops_s": round(n / (mejor_total / 1e9), 1),
+        "p50_us": round(percentil(latencias, 50) / 1000, 2),
+        "p95_us": round(percentil(latencias, 95) / 1000, 2),
+        "p99_us": round(percentil(latencias, 99) / 1000, 2),
+        "max_us": round(latencias[-1] / 1000, 2),
+    }
+
+
+def comparar(resultados: Dict, base: Dict, umbral: float) -> List[str]:
+    """Etapas cuyo ops/s ha caído más de `umbral` respecto a la línea base."""
+    regresiones = []
+    for nombre, resultado in resultados.items():
+        anterior = base.get("etapas", {}).get(nombre)
+        if not anterior or not anterior.get("ops_s"):
+            continue
+        variacion = resultado["ops_s"] / anterior["ops_s"] - 1
+        resultado["variacion_ops_s"] = round(variacion, 4)
+        if variacion < -umbral:
+            regresiones.append(nombre)
+    return regresiones
+
+
+def main():
+    guardar_base = "--guardar-base" in sys.argv[1:]
+    fuente_aleatoria.configurar(semilla)
+    tag = procesador_numerico_password.cargar_tag_redes(archivo_tags, plataforma)
+    if tag is None:
+        print(f"Error: no hay tag para la plataforma {plataforma}")
+        sys.exit(2)
+    perfiles = cargar_perfiles()
+    entradas = preparar_entradas(perfiles, tag)
+    print(f"{len(entradas)} perfiles, plataforma {plataforma}")
+
+    base = None
+    if not guardar_base and os.path.exists(archivo_linea_base):
+        with open(archivo_linea_base, "r", encoding="utf-8") as f:
+            base = json.load(f)
+
+    resultados = {}
+    print(f"{'etapa':>18} {'ops/s':>11} {'p50 us':>9} {'p95 us':>9} {'p99 us':>9} {'max us':>9}")
+    for nombre, (funcion, n, con_clave) in etapas(tag).items():
+        disponibles = [e for e in entradas if "clave_publica" in e] if con_clave else entradas
+        r = medir(funcion, disponibles, n)
+        resultados[nombre] = r
+        print(f"{nombre:>18} {r['ops_s']:>11.1f} {r['p50_us']:>9.2f} {r['p95_us']:>9.2f} "
+              f"{r['p99_us']:>9.2f} {r['max_us']:>9.2f}")
+
+    informe = {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "maquina": platform.machine(),
+        "perfiles": len(entradas),
+        "plataforma": plataforma,
+        "etapas": resultados,
+    }
+
+    if guardar_base or base is None:
+        with open(archivo_linea_base, "w", encoding="utf-8") as f:
+            json.dump(informe, f, ensure_ascii=False, indent=4)
+        print(f"Línea base guardada en {archivo_linea_base}")
+        return
+
+    regresiones = comparar(resultados, base, umbral_regresion)
+    for nombre, r in resultados.items():
+        if "variacion_ops_s" in r:
+            marca = "REGRESIÓN" if nombre in regresiones else ""
+            print(f"{nombre:>18} {r['variacion_ops_s']:>+8.1%} frente a la línea base {marca}")
+    if regresiones:
+        print(f"Regresión de más del {umbral_regresion:.0%} en: {', '.join(regresiones)}")
+        sys.exit(1)
+    print("Sin regresiones respecto a la línea base")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# Cliente HTTP asíncrono hacia el Key-Manager
+# - Un único httpx.AsyncClient de larga vida (keep-alive, pool de conexiones configurable)
+# - Reintentos con backoff exponencial + jitter solo cuando es seguro repetir la petición
+# - Circuit breaker: tras N fallos seguidos se falla de inmediato durante un tiempo
+import asyncio
+import random
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+# Estados del circuit breaker
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+# Respuestas del KM que indican que la petición no se procesó (se puede repetir si es idempotente)
+ESTADOS_REINTENTABLES = {502, 503, 504}
+
+
+class KeyManagerNoDisponible(Exception):
+    """El Key-Manager no responde o el circuito está abierto."""
+
+    def __init__(self, mensaje: str, circuito_abierto: bool = False):
+        super().__init__(mensaje)
+        self.circuito_abierto = circuito_abierto
+
+
+class CircuitBreaker:
+    def __init__(self, umbral_fallos: int = 5, tiempo_apertura: float = 30.0):
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_apertura = tiempo_apertura
+        self.estado = CERRADO
+        self.fallos_consecutivos = 0
+        self._abierto_desde = 0.0
+        self._prueba_en_curso = False
+        self._prueba_desde = 0.0
+
+    def permitir(self) -> bool:
+        """Indica si se puede intentar una petición (en semiabierto solo pasa una de prueba)."""
+        if self.estado == ABIERTO:
+            if time.monotonic() - self._abierto_desde < self.tiempo_apertura:
+                return False
+            self.estado = SEMIABIERTO
+            self._prueba_en_curso = False
+        if self.estado == SEMIABIERTO:
+            # Una sola petición de prueba (si se pierde sin resultado, se permite otra tras tiempo_apertura)
+            if self._prueba_en_curso and time.monotonic() - self._prueba_desde < self.tiempo_apertura:
+                return False
+            self._prueba_en_curso = True
+            self._prueba_desde = time.monotonic()
+        return True
+
+    def registrar_exito(self) -> None:
+        self.estado = CERRADO
+        self.fallos_consecutivos = 0
+        self._prueba_en_curso = False
+
+    def registrar_fallo(self) -> None:
+        self.fallos_consecutivos += 1
+        if self.estado == SEMIABIERTO or self.fallos_consecutivos >= self.umbral_fallos:
+            self.estado = ABIERTO
+            self._abierto_desde = time.monotonic()
+            self._prueba_en_curso = False
+
+
+class ClienteKeyManager:
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        tam_pool: int = 20,
+        timeout: float = 5.0,
+        max_reintentos: int = 2,
+        backoff_base: float = 0.1,
+        umbral_fallos: int = 5,
+        tiempo_apertura: float = 30.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.tam_pool = tam_pool
+        self.timeout = timeout
+        self.max_reintentos = max_reintentos
+        self.backoff_base = backoff_base
+        self.breaker = CircuitBreaker(umbral_fallos, tiempo_apertura)
+        self._cliente: Optional[httpx.AsyncClient] = None
+
+    def _obtener_cliente(self) -> httpx.AsyncClient:
+        if self._cliente is None:
+            self._cliente = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=self.tam_pool, max_keepalive_connections=self.tam_pool),
+            )
+        return self._cliente
+
+    async def cerrar(self) -> None:
+        if self._cliente is not None:
+            await self._cliente.aclose()
+            self._cliente = None
+
+    def _espera_reintento(self, intento: int) -> float:
+        # Backoff exponencial con "full jitter"
+        return random.uniform(0, self.backoff_base * (2 ** intento))
+
+    async def post(self, ruta: str, payload: Dict[str, Any], idempotente: bool = False) -> httpx.Response:
+        """
+        Envía payload (JSON) a ruta. Los fallos de conexión (la petición no llegó al KM) se reintentan
+        siempre; timeouts de lectura y 502/503/504 solo si idempotente=True.
+        Lanza KeyManagerNoDisponible si el circuito está abierto o se agotan los reintentos.
+        """
+        if not self.breaker.permitir():
+            raise KeyManagerNoDisponible("Key-Manager circuit open", circuito_abierto=True)
+
+        cliente = self._obtener_cliente()
+        ultimo_error = "unknown"
+        for intento in range(self.max_reintentos + 1):
+            if intento:
+                await asyncio.sleep(self._espera_reintento(intento - 1))
+            try:
+                resp = await cliente.post(ruta, json=payload)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as exc:
+                ultimo_error = type(exc).__name__
+                continue
+            except httpx.TransportError as exc:
+                ultimo_error = type(exc).__name__
+                if idempotente:
+                    continue
+                break
+
+            if resp.status_code in ESTADOS_REINTENTABLES:
+                ultimo_error = f"status {resp.status_code}"
+                if idempotente and intento < self.max_reintentos:
+                    continue
+                self.breaker.registrar_fallo()
+                return resp
+            if resp.status_code >= 500:
+                self.breaker.registrar_fallo()
+            else:
+                self.breaker.registrar_exito()
+            return resp
+
+        self.breaker.registrar_fallo()
+        raise KeyManagerNoDisponible(f"Error connecting to Key-Manager: {ultimo_error}")
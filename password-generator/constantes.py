@@ -11,5 +11,11 @@ ascii_inicio_minuscula = 97
 ascii_fin_minuscula = 122
 ascii_inicio_numerico = 48
 ascii_fin_numerico = 57
+# Tipos de caracter usados en la inspección estructural de la contraseña
+TIPO_MAYUSCULA = 1
+TIPO_MINUSCULA = 2
+TIPO_NUMERICO = 3
+TIPO_SIMBOLO = 4
+minimo_simbolos = 3
 ALFABETO_EXTENDIDO = string.ascii_letters + string.digits + SIMBOLOS_PERMITIDOS
 ascii = string.ascii_letters + string.digits + string.punctuation
\ No newline at end of file
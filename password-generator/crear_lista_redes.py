@@ -1,6 +1,7 @@
 import random
 import json
 import os
+import registro_tags
 
 rango_aleatorio_min = 1000
 rango_aleatorio_max = 9999
@@ -18,9 +19,8 @@ def cargar_tags(nombre_archivo_json: str) -> dict:
     return {} # Si el archivo no existe, retorna un diccionario vacío
 
 def guardar_tags(nombre_archivo_json: str, tags: dict):
-    """Guarda la lista de tags en el archivo JSON."""
-    with open(nombre_archivo_json, 'w', encoding='utf-8') as f:
-        json.dump(tags, f, ensure_ascii=False, indent=4)
+    """Guarda la lista de tags en el archivo JSON (escritura atómica: temporal + rename)."""
+    registro_tags.obtener_registro(nombre_archivo_json).guardar(tags)
     print(f"Tags guardados en '{nombre_archivo_json}'.")
 
 def generar_tag_random():
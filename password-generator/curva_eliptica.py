@@ -1,5 +1,6 @@
 import os
 import json
+import almacen_registros
 from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
@@ -87,7 +88,8 @@ def ecc_encriptar_password(clave_publica, contrasena):
     
  
     
-# Guardar contraseña en json 
+# Guardar contraseña en el almacén de registros (log indexado por id_usuario + plataforma)
+# `archivo` sigue siendo el JSON antiguo: se usa para derivar el almacén y se importa la primera vez
 def guardar_en_json(id_usuario, data_encriptada, archivo: str, plataforma:str):
     registro = {
         "id_usuario": id_usuario,
@@ -100,30 +102,6 @@ def guardar_en_json(id_usuario, data_encriptada, archivo: str, plataforma:str):
         },
     }
 
-    # Cargar archivo si existe
-    lista = []
-    try:
-        if os.path.exists(archivo):
-            with open(archivo, "r", encoding= 'utf-8') as f:
-                lista = json.load(f)
-    except FileNotFoundError:
-        # Si el archivo no existe, inicializamos con una lista vacía
-        lista = []
-    except json.JSONDecodeError:
-        # Si el archivo está vacío o corrupto, inicializamos con una lista vacía
-        lista = []
-    
-    # Agregar nuevo registro y guardar, si encuentra un registro que coincida el id de usuario y la plataforma, se actualiza el registro y el viejo se elimina
-    registro_encontrado = False
-    for i, registro_existente in enumerate(lista):
-        if registro_existente["id_usuario"] == id_usuario and registro_existente["plataforma"] == plataforma.encode('utf-8').hex():
-            lista.pop(i)
-            lista.append(registro)
-            registro_encontrado = True
-            break
-    if not registro_encontrado:
-        lista.append(registro)
-
-    with open(archivo, "w", encoding='utf-8') as f:
-        json.dump(lista, f, ensure_ascii=False, indent=4)
-    print(f"Datos guardados en {archivo}")
\ No newline at end of file
+    # Si ya existe un registro con el mismo id de usuario y plataforma, se reemplaza
+    almacen_registros.obtener_almacen(archivo).guardar(registro)
+    print(f"Datos guardados en {archivo}")
@@ -0,0 +1,167 @@
+# Ejecución del pipeline de generación fuera del event loop
+# Modos (GEN_EXECUTOR_MODE):
+#   inline  -> se ejecuta en el propio event loop (comportamiento anterior)
+#   thread  -> ThreadPoolExecutor
+#   process -> ProcessPoolExecutor (paralelismo real de CPU)
+# La cola está acotada (GEN_EXECUTOR_MAX_PENDING): si se llena se rechaza la petición
+# en lugar de acumular latencia.
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import procesador_numerico_password
+import preprocesador_texto
+import procesador_numerico_eliptico
+import generador_lote
+import fuente_aleatoria
+from generator import generar_contrasena
+from constantes import ALFABETO_EXTENDIDO
+
+MODOS = ("inline", "thread", "process")
+ETAPAS = ("desplazamiento", "preprocesador", "longitud_inicio", "contrasena", "codificacion")
+
+
+class PipelineSaturado(Exception):
+    """La cola del ejecutor está llena."""
+
+
+def ejecutar_pipeline(valores: List[float], cadena_usuario: str, tag: str) -> Dict:
+    """
+    Pipeline completo de generación (función de nivel de módulo para poder enviarse a un proceso).
+    Devuelve la contraseña, la codificación numérica y el tiempo de cada etapa en ms.
+    La aleatoriedad sale de la fuente del hilo/proceso que lo ejecuta (fuente_aleatoria.fuente_actual()).
+    """
+    fuente = fuente_aleatoria.fuente_actual()
+    tiempos = {}
+    t = time.perf_counter()
+
+    desplazamiento = procesador_numerico_password.calcular_desplazamiento(valores, tag, len(ALFABETO_EXTENDIDO))
+    tiempos["desplazamiento"] = time.perf_counter() - t; t = time.perf_counter()
+
+    cadena_cifrada, _ = preprocesador_texto.preprocesador_cadena(cadena_usuario, desplazamiento, fuente)
+    tiempos["preprocesador"] = time.perf_counter() - t; t = time.perf_counter()
+
+    # Se decide no usar una semilla de generación para la longitud para evitar que todas las contraseñas del mismo usuario tengan la misma longitud
+    longitud = procesador_numerico_password.generar_longitud(fuente=fuente)
+    punto_inicio = procesador_numerico_password.generar_punto_inicio(fuente)
+    tiempos["longitud_inicio"] = time.perf_counter() - t; t = time.perf_counter()
+
+    contrasena = generar_contrasena(cadena_usuario, longitud, desplazamiento, punto_inicio, fuente)
+    tiempos["contrasena"] = time.perf_counter() - t; t = time.perf_counter()
+
+    valor_numerico_cod = procesador_numerico_eliptico.calcular_codificacion_numerica(cadena_cifrada)
+    tiempos["codificacion"] = time.perf_counter() - t
+
+    return {
+        "contrasena": contrasena,
+        "valor_numerico_cod": valor_numerico_cod,
+        "tiempos_ms": {etapa: segundos * 1000 for etapa, segundos in tiempos.items()},
+    }
+
+
+def ejecutar_pipeline_lote(valores: List[float], cadenas_usuario: List[str], tags: List[str]) -> Dict:
+    """
+    Pipeline para varias plataformas del mismo perfil: los desplazamientos de todos los tags
+    se calculan en un solo paso vectorizado y después se genera cada contraseña.
+    """
+    fuente = fuente_aleatoria.fuente_actual()
+    tiempos = {}
+    t = time.perf_counter()
+
+    desplazamientos = generador_lote.calcular_desplazamientos_tags(valores, tags).tolist()
+    tiempos["desplazamiento"] = time.perf_counter() - t; t = time.perf_counter()
+
+    cifradas = preprocesador_texto.preprocesador_cadenas_lote(cadenas_usuario, desplazamientos, fuente)
+    tiempos["preprocesador"] = time.perf_counter() - t; t = time.perf_counter()
+
+    longitudes = [procesador_numerico_password.generar_longitud(fuente=fuente) for _ in tags]
+    puntos_inicio = [procesador_numerico_password.generar_punto_inicio(fuente) for _ in tags]
+    tiempos["longitud_inicio"] = time.perf_counter() - t; t = time.perf_counter()
+
+    contrasenas = [
+        generar_contrasena(cadena, longitud, desplazamiento, punto_inicio, fuente)
+        for cadena, longitud, desplazamiento, punto_inicio in zip(cadenas_usuario, longitudes, desplazamientos, puntos_inicio)
+    ]
+    tiempos["contrasena"] = time.perf_counter() - t; t = time.perf_counter()
+
+    valores_numericos = [procesador_numerico_eliptico.calcular_codificacion_numerica(cifrada) for cifrada, _ in cifradas]
+    tiempos["codificacion"] = time.perf_counter() - t
+
+    return {
+        "contrasenas": contrasenas,
+        "valores_numericos_cod": valores_numericos,
+        "tiempos_ms": {etapa: segundos * 1000 for etapa, segundos in tiempos.items()},
+    }
+
+
+class EjecutorPipeline:
+    def __init__(self, modo: str = "inline", max_workers: Optional[int] = None, max_pendientes: int = 256):
+        if modo not in MODOS:
+            raise ValueError(f"Modo de ejecución no válido: {modo}. Opciones: {MODOS}")
+        self.modo = modo
+        self.max_pendientes = max_pendientes
+        self.pendientes = 0
+        self._executor: Optional[Executor] = None
+        if modo == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gen-pipeline")
+        elif modo == "process":
+            self._executor = ProcessPoolExecutor(max_workers=max_workers)
+
+        # Tiempos acumulados por etapa (ms) + espera en cola
+        self.ejecuciones = 0
+        self.tiempos_totales_ms = {etapa: 0.0 for etapa in ETAPAS + ("cola",)}
+
+    async def ejecutar(self, valores: List[float], cadena_usuario: str, tag: str) -> Dict:
+        return await self._enviar(ejecutar_pipeline, valores, cadena_usuario, tag)
+
+    async def ejecutar_lote(self, valores: List[float], cadenas_usuario: List[str], tags: List[str]) -> Dict:
+        return await self._enviar(ejecutar_pipeline_lote, valores, cadenas_usuario, tags)
+
+    async def _enviar(self, funcion, *args) -> Dict:
+        if self.pendientes >= self.max_pendientes:
+            raise PipelineSaturado(f"Generation queue full ({self.max_pendientes} pending)")
+        self.pendientes += 1
+        inicio = time.perf_counter()
+        try:
+            if self._executor is None:
+                resultado = funcion(*args)
+            else:
+                loop = asyncio.get_running_loop()
+                resultado = await loop.run_in_executor(self._executor, funcion, *args)
+        finally:
+            self.pendientes -= 1
+
+        # Tiempo en cola = total - tiempo de las etapas
+        total_ms = (time.perf_counter() - inicio) * 1000
+        resultado["tiempos_ms"]["cola"] = max(0.0, total_ms - sum(resultado["tiempos_ms"].values()))
+        self.ejecuciones += 1
+        for etapa, ms in resultado["tiempos_ms"].items():
+            self.tiempos_totales_ms[etapa] = self.tiempos_totales_ms.get(etapa, 0.0) + ms
+        return resultado
+
+    def estadisticas(self) -> Dict:
+        """Tiempo medio por etapa (ms) y estado de la cola."""
+        n = max(self.ejecuciones, 1)
+        return {
+            "modo": self.modo,
+            "ejecuciones": self.ejecuciones,
+            "pendientes": self.pendientes,
+            "max_pendientes": self.max_pendientes,
+            "media_ms": {etapa: total / n for etapa, total in self.tiempos_totales_ms.items()},
+        }
+
+    def cerrar(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+def crear_desde_entorno() -> EjecutorPipeline:
+    max_workers = os.environ.get("GEN_EXECUTOR_WORKERS")
+    return EjecutorPipeline(
+        modo=os.environ.get("GEN_EXECUTOR_MODE", "inline").lower(),
+        max_workers=int(max_workers) if max_workers else None,
+        max_pendientes=int(os.environ.get("GEN_EXECUTOR_MAX_PENDING", "256")),
+    )
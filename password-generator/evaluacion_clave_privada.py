@@ -1,12 +1,12 @@
-import json 
-from cryptography.hazmat.primitives import serialization
-import cryptography.hazmat.primitives.asymmetric as ec
 import os
-import curva_eliptica
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import preprocesador_texto
 import procesador_numerico_password
 import procesador_numerico_eliptico
 import constantes
+from lector_json import iterar_lista_json
 
 alfabeto_extendido = constantes.ALFABETO_EXTENDIDO
 longitud_minima = constantes.longitud_minima
@@ -17,35 +17,111 @@ input_json = 'resultado_palabras_sensible.json'
 output_claves_binario = 'claves_privadas_sensibles_hash_phi_evaluacion.bin'
 plataforma = "facebook"
 
+# Paralelismo: bloques de usuarios repartidos entre procesos, escritos en orden por un único escritor
+procesos = os.cpu_count() or 1
+usuarios_por_bloque = 512
+bloques_en_vuelo_por_proceso = 4
+tam_buffer_escritura = 1 << 22   # 4 MB
+intervalo_progreso = 5.0         # segundos
+bytes_por_clave = 256
+
+_tag_worker = None
+
+
+def _iniciar_worker(tag: str):
+    global _tag_worker
+    _tag_worker = tag
+
+
+def calcular_clave(usuario: dict, tag: str):
+    """Clave de evaluación (256 bytes big endian) de un usuario, o None si no tiene valores."""
+    cadena_usuario = usuario.get('unique_profile_description', '')
+    valores = list(usuario.get("predicted_scores", {}).values())
+    if not valores:
+        return None
+    desplazamiento = procesador_numerico_password.calcular_desplazamiento(valores, tag, len(alfabeto_extendido))
+    cadena_cifrada, indice_generacion = preprocesador_texto.preprocesador_cadena(cadena_usuario, desplazamiento)
+    valor_numerico_cod = procesador_numerico_eliptico.calcular_codificacion_numerica(cadena_cifrada)
+    exponente = procesador_numerico_eliptico.calcular_exponente(valores, valor_numerico_cod)
+    # Convertir la clave privada a bytes para evaluacion sin usar cryptography
+    return exponente.to_bytes(bytes_por_clave, byteorder='big')  # BigEndian
+
+
+def procesar_bloque(usuarios: list) -> tuple:
+    """Devuelve (claves concatenadas, ids de usuarios omitidos) para un bloque."""
+    claves = []
+    omitidos = []
+    for usuario in usuarios:
+        clave = calcular_clave(usuario, _tag_worker)
+        if clave is None:
+            omitidos.append(usuario.get('id_usuario', ''))
+        else:
+            claves.append(clave)
+    return b"".join(claves), omitidos
+
+
+def _bloques(ruta: str, tamano: int):
+    bloque = []
+    for usuario in iterar_lista_json(ruta):
+        bloque.append(usuario)
+        if len(bloque) == tamano:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+
 def main():
     print("Inicio de la evaluación de la clave privada masiva...")
-    # Borrar el archivo binario si existe para asegurar un inicio limpio
-    if os.path.exists(output_claves_binario):
-        os.remove(output_claves_binario)
+    tag = procesador_numerico_password.cargar_tag_redes("redes_sociales_con_tags.json", plataforma)
+    if tag is None:
+        print(f"Error: no hay tag para la plataforma {plataforma}")
+        return
+
+    claves_escritas = 0
+    usuarios_omitidos = 0
+    inicio = time.perf_counter()
+    ultimo_informe = inicio
+    max_en_vuelo = procesos * bloques_en_vuelo_por_proceso
+
+    def informe(final: bool = False):
+        transcurrido = time.perf_counter() - inicio
+        ritmo = claves_escritas / transcurrido if transcurrido > 0 else 0.0
+        mb = claves_escritas * bytes_por_clave / (1 << 20)
+        etiqueta = "Total" if final else "Progreso"
+        print(f"{etiqueta}: {claves_escritas} claves, {mb:.1f} MB, {ritmo:.0f} claves/s, "
+              f"{usuarios_omitidos} omitidos, {transcurrido:.1f} s")
+
     try:
-        with open(input_json, 'r', encoding='utf-8') as archivo:
-            datos_usuarios = json.load(archivo)
-        for usuario in datos_usuarios:
-            cadena_usuario = usuario.get('unique_profile_description', '')
-            id_usuario = usuario.get('id_usuario', '')
-            scores = usuario.get("predicted_scores", {})
-            valores = list(scores.values())
-            if valores is None:
-                print(f"Advertencia: No se encontraron valores para el usuario ID {id_usuario}. Se omite este usuario.")
-                continue
-            tag = procesador_numerico_password.cargar_tag_redes("redes_sociales_con_tags.json", plataforma)
-            desplazamiento = procesador_numerico_password.calcular_desplazamiento(valores, tag, len(alfabeto_extendido))
-            cadena_cifrada, indice_generacion = preprocesador_texto.preprocesador_cadena(cadena_usuario, desplazamiento)
-            valor_numerico_cod = procesador_numerico_eliptico.calcular_codificacion_numerica(cadena_cifrada)
-            exponente = procesador_numerico_eliptico.calcular_exponente(valores, valor_numerico_cod)
-            #llave_privada = curva_eliptica.construir_clave_privada(exponente)
-            llave_privada_bytes = exponente.to_bytes(256, byteorder='big')#BigEndian
-            # Convertir la clave privada a bytes para evaluacion sin usar cryptography
-            with open(output_claves_binario, 'ab') as archivo_binario:
-                archivo_binario.write(llave_privada_bytes)
+        # Un único archivo abierto (se trunca para asegurar un inicio limpio) con buffer grande
+        with open(output_claves_binario, 'wb', buffering=tam_buffer_escritura) as archivo_binario, \
+                ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_worker, initargs=(tag,)) as pool:
+            en_vuelo = deque()
+
+            def escribir_siguiente():
+                # Se escribe siempre el bloque más antiguo: el orden del archivo es el del JSON
+                nonlocal claves_escritas, usuarios_omitidos
+                claves, omitidos = en_vuelo.popleft().result()
+                archivo_binario.write(claves)
+                claves_escritas += len(claves) // bytes_por_clave
+                usuarios_omitidos += len(omitidos)
+                for id_usuario in omitidos:
+                    print(f"Advertencia: No se encontraron valores para el usuario ID {id_usuario}. Se omite este usuario.")
+
+            for bloque in _bloques(input_json, usuarios_por_bloque):
+                en_vuelo.append(pool.submit(procesar_bloque, bloque))
+                if len(en_vuelo) >= max_en_vuelo:
+                    escribir_siguiente()
+                if time.perf_counter() - ultimo_informe >= intervalo_progreso:
+                    informe()
+                    ultimo_informe = time.perf_counter()
+            while en_vuelo:
+                escribir_siguiente()
+
+        informe(final=True)
         print("Evaluación completada. Claves privadas almacenadas en el archivo binario.")
     except Exception as e:
         print(f"Error durante la evaluación masiva: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,147 @@
+# Fuentes de aleatoriedad del pipeline de generación
+# Todas exponen la interfaz de random.Random (random, randint, randrange, choice, ...) para que
+# generator, preprocesador_texto y procesador_numerico_password las reciban como parámetro `fuente`.
+#   - FuenteUrandom: producción. Pool de palabras de 64 bits de os.urandom (una llamada al sistema
+#     cada `tam_pool` bytes). Los enteros acotados se obtienen por rechazo, sin sesgo de módulo.
+#   - FuenteDeterminista: benchmarks y pruebas reproducibles (random.Random con semilla derivada).
+# fuente_actual() da una fuente propia por hilo (y por proceso tras un fork), de modo que los
+# workers nunca comparten estado. configurar(semilla) cambia el modo de todas ellas.
+import hashlib
+import os
+import random
+import threading
+import weakref
+from typing import Optional
+
+TAM_POOL = 4096  # bytes por lectura de os.urandom
+
+
+class FuenteUrandom(random.Random):
+    """random.Random sobre un pool de os.urandom. No es segura entre hilos: usar una por hilo."""
+
+    def __init__(self, tam_pool: int = TAM_POOL):
+        self._tam_pool = max(8, tam_pool - tam_pool % 8)
+        self._palabras = memoryview(b"").cast("Q")
+        self._pos = 0
+        super().__init__()
+        _fuentes_urandom.add(self)
+
+    def seed(self, *args, **kwargs) -> None:
+        # Sin estado que sembrar (se llama desde random.Random.__init__)
+        return None
+
+    def getstate(self):
+        raise NotImplementedError("FuenteUrandom no tiene estado reproducible")
+
+    def setstate(self, estado):
+        raise NotImplementedError("FuenteUrandom no tiene estado reproducible")
+
+    def __reduce__(self):
+        # Copiar el pool a otro proceso repetiría los mismos bytes: se crea uno nuevo
+        return (self.__class__, (self._tam_pool,))
+
+    def _descartar_pool(self) -> None:
+        self._palabras = memoryview(b"").cast("Q")
+        self._pos = 0
+
+    def _palabra(self) -> int:
+        """Siguiente palabra aleatoria de 64 bits del pool."""
+        pos = self._pos
+        if pos >= len(self._palabras):
+            self._palabras = memoryview(os.urandom(self._tam_pool)).cast("Q")
+            pos = 0
+        self._pos = pos + 1
+        return self._palabras[pos]
+
+    def _randbelow(self, n: int) -> int:
+        # Entero uniforme en [0, n) por rechazo: se toman los bits justos de n y se descarta si >= n
+        # (probabilidad < 1/2 por intento), sin sesgo de módulo. Lo usan randrange, randint y choice.
+        k = n.bit_length()
+        if k > 64:
+            return super()._randbelow_with_getrandbits(n)
+        desplazamiento = 64 - k
+        r = self._palabra() >> desplazamiento
+        while r >= n:
+            r = self._palabra() >> desplazamiento
+        return r
+
+    def getrandbits(self, k: int) -> int:
+        if k < 0:
+            raise ValueError("el número de bits no puede ser negativo")
+        if k <= 64:
+            return self._palabra() >> (64 - k) if k else 0
+        return int.from_bytes(self.randbytes((k + 7) // 8), "big") >> (-k % 8)
+
+    def random(self) -> float:
+        # 53 bits de mantisa, igual que random.SystemRandom
+        return (self._palabra() >> 11) * (2 ** -53)
+
+    def randbytes(self, n: int) -> bytes:
+        palabras = [self._palabra() for _ in range((n + 7) // 8)]
+        return b"".join(p.to_bytes(8, "little") for p in palabras)[:n]
+
+
+class FuenteDeterminista(random.Random):
+    """Flujo reproducible: mismo (semilla, flujo) -> misma secuencia."""
+
+    def __init__(self, semilla: int, flujo: int = 0):
+        super().__init__(semilla_flujo(semilla, flujo))
+
+
+def semilla_flujo(semilla: int, flujo: int) -> int:
+    """Semilla independiente para el flujo `flujo` (hash, para que flujos consecutivos no se solapen)."""
+    digest = hashlib.sha256(f"{semilla}:{flujo}".encode("ascii")).digest()
+    return int.from_bytes(digest[:16], "big")
+
+
+# Fuentes urandom vivas: tras un fork el hijo descarta sus pools heredados
+_fuentes_urandom = weakref.WeakSet()
+
+_estado = threading.local()
+_cerrojo = threading.Lock()
+_semilla: Optional[int] = None
+_generacion = 0          # Se incrementa en configurar(): invalida las fuentes por hilo
+_siguiente_flujo = 0
+
+
+def configurar(semilla: Optional[int] = None) -> None:
+    """None -> os.urandom (producción). Entero -> flujos deterministas, uno por hilo en orden de creación."""
+    global _semilla, _generacion, _siguiente_flujo
+    with _cerrojo:
+        _semilla = semilla
+        _generacion += 1
+        _siguiente_flujo = 0
+
+
+def nueva_fuente() -> random.Random:
+    """Fuente independiente según el modo configurado (p. ej. una por worker)."""
+    global _siguiente_flujo
+    with _cerrojo:
+        if _semilla is None:
+            return FuenteUrandom()
+        flujo = _siguiente_flujo
+        _siguiente_flujo += 1
+        return FuenteDeterminista(_semilla, flujo)
+
+
+def fuente_actual() -> random.Random:
+    """Fuente del hilo actual (se crea la primera vez que se usa)."""
+    if getattr(_estado, "generacion", None) != _generacion:
+        _estado.fuente = nueva_fuente()
+        _estado.generacion = _generacion
+    return _estado.fuente
+
+
+def _despues_de_fork() -> None:
+    global _estado, _cerrojo, _siguiente_flujo
+    _cerrojo = threading.Lock()
+    _estado = threading.local()
+    for fuente in list(_fuentes_urandom):
+        fuente._descartar_pool()
+    if _semilla is not None:
+        # Flujos del hijo distintos de los del padre y de los demás hijos
+        _siguiente_flujo = os.getpid() << 20
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_despues_de_fork)
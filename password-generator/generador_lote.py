@@ -0,0 +1,277 @@
+# Generación masiva de contraseñas (evaluación de corpus)
+# Replica el pipeline de generator.generar_contrasena sobre arreglos NumPy uint8:
+# desplazamiento -> cifrado César -> corte circular -> inspección estructural
+import math
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+import constantes
+import generator
+import preprocesador_texto
+import procesador_numerico_password
+
+ALFABETO_EXTENDIDO = constantes.ALFABETO_EXTENDIDO
+SIMBOLOS_PERMITIDOS = constantes.SIMBOLOS_PERMITIDOS
+longitud_minima = constantes.longitud_minima
+longitud_maxima = constantes.longitud_maxima
+
+TAM_ALFABETO = len(ALFABETO_EXTENDIDO)
+INDICE_INVALIDO = 255  # Marca de caracter fuera del alfabeto extendido
+
+# Alfabeto extendido como bytes (todos los caracteres son ASCII)
+_ALFABETO_BYTES = np.frombuffer(ALFABETO_EXTENDIDO.encode("ascii"), dtype=np.uint8)
+
+# Tabla ASCII -> índice en el alfabeto extendido (INDICE_INVALIDO si no pertenece)
+_INDICE_POR_ASCII = np.full(256, INDICE_INVALIDO, dtype=np.uint8)
+_INDICE_POR_ASCII[_ALFABETO_BYTES] = np.arange(TAM_ALFABETO, dtype=np.uint8)
+
+# Reemplazo de caracteres no permitidos (igual que preprocesador_texto)
+_RUIDO_BYTES = np.frombuffer((SIMBOLOS_PERMITIDOS + "0123456789").encode("ascii"), dtype=np.uint8)
+
+# Tipos de caracter y códigos por tipo (misma representación que generator.inspeccion_estructural_contrasena)
+TIPO_SIMBOLO = constantes.TIPO_SIMBOLO
+_TIPO_POR_ASCII = np.frombuffer(generator.TABLA_TIPOS, dtype=np.uint8)
+_CODIGOS_POR_TIPO = {tipo: np.array(lista, dtype=np.int64) for tipo, lista in generator.CODIGOS_POR_TIPO.items()}
+
+# Desplazamiento final por cada base posible (0-999), calculado con math.log1p
+# para obtener exactamente el mismo valor que calcular_desplazamiento
+_DESPLAZAMIENTO_POR_BASE = np.array(
+    [1 + int((TAM_ALFABETO - 1) * math.log1p(base) / math.log1p(1000)) for base in range(1000)],
+    dtype=np.int64,
+)
+
+_MASK32 = np.uint64(2**32 - 1)
+_PHI32 = np.uint64(2654435769)
+
+
+def _mezclar_valores(matriz_valores: np.ndarray) -> np.ndarray:
+    """Mezcla XOR / áurea / rotación de calcular_desplazamiento, una fila por perfil."""
+    # int(x * escala) trunca hacia cero -> np.trunc; el & 32 bits se hace en complemento a dos
+    enteros = np.trunc(np.asarray(matriz_valores, dtype=np.float64) * 1000).astype(np.int64)
+    enteros = enteros.view(np.uint64) & _MASK32
+
+    mezcla = np.zeros(enteros.shape[0], dtype=np.uint64)
+    for columna in range(enteros.shape[1]):
+        mezcla ^= enteros[:, columna]
+        mezcla = (mezcla * _PHI32) & _MASK32  # El producto desborda en 64 bits, los 32 bajos se conservan
+        mezcla = ((mezcla << np.uint64(13)) | (mezcla >> np.uint64(19))) & _MASK32
+    return mezcla
+
+
+def _aplicar_tags(mezcla: np.ndarray, tags_num: np.ndarray) -> np.ndarray:
+    """Incorpora el tag de plataforma y convierte la mezcla en desplazamiento."""
+    mezcla = (mezcla + (tags_num & _MASK32) * _PHI32) & _MASK32
+    base = (mezcla % np.uint64(1000)).astype(np.int64)
+    return _DESPLAZAMIENTO_POR_BASE[base]
+
+
+def calcular_desplazamientos_lote(matriz_valores: np.ndarray, tag_plataforma: str) -> np.ndarray:
+    """Versión vectorizada de procesador_numerico_password.calcular_desplazamiento.
+
+    matriz_valores: (n_perfiles, n_valores) con los scores de cada perfil.
+    Devuelve un arreglo int64 con el desplazamiento de cada perfil (idéntico al escalar).
+    """
+    mezcla = _mezclar_valores(matriz_valores)
+    return _aplicar_tags(mezcla, np.full(mezcla.shape[0], int(tag_plataforma) & (2**32 - 1), dtype=np.uint64))
+
+
+def calcular_desplazamientos_tags(valores: List[float], tags: List[str]) -> np.ndarray:
+    """Desplazamiento de un mismo perfil para varias plataformas (idéntico al escalar por tag)."""
+    mezcla = _mezclar_valores(np.array([valores], dtype=np.float64))[0]
+    tags_num = np.array([int(tag) & (2**32 - 1) for tag in tags], dtype=np.uint64)
+    return _aplicar_tags(np.full(tags_num.shape[0], mezcla, dtype=np.uint64), tags_num)
+
+
+def _puntos_de_codigo(cadenas: List[str]):
+    """Elimina espacios y diacríticos de todas las cadenas (preprocesador_texto.normalizar_descripcion).
+
+    Devuelve (puntos, longitudes): arreglo uint32 con los puntos de código
+    concatenados y la longitud final de cada cadena.
+    """
+    normalizadas = [preprocesador_texto.normalizar_descripcion(c) for c in cadenas]
+    longitudes = np.fromiter((len(c) for c in normalizadas), dtype=np.int64, count=len(normalizadas))
+    puntos = np.frombuffer("".join(normalizadas).encode("utf-32-le"), dtype=np.uint32)
+    return puntos, longitudes
+
+
+def _cifrar_puntos(puntos: np.ndarray, desplazamientos: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Cifrado César de puntos de código (cualquier forma) con su desplazamiento elemento a elemento."""
+    # Caracteres no ASCII nunca pertenecen al alfabeto extendido
+    indices = np.where(puntos < 128, _INDICE_POR_ASCII[puntos & 127], INDICE_INVALIDO).astype(np.int64)
+    validos = indices != INDICE_INVALIDO
+
+    cifrado = np.empty(puntos.shape, dtype=np.uint8)
+    cifrado[validos] = _ALFABETO_BYTES[(indices[validos] + desplazamientos[validos]) % TAM_ALFABETO]
+    # Caracteres fuera del alfabeto -> ruido aleatorio (símbolos + dígitos)
+    n_invalidos = int(np.count_nonzero(~validos))
+    cifrado[~validos] = _RUIDO_BYTES[rng.integers(0, _RUIDO_BYTES.shape[0], n_invalidos)]
+    return cifrado
+
+
+def cifrar_descripciones_lote(cadenas: List[str], desplazamientos: np.ndarray, rng: np.random.Generator):
+    """Cifrado César de todas las descripciones concatenadas en un solo arreglo uint8.
+
+    Devuelve (cifrado, offsets, longitudes): la descripción i ocupa
+    cifrado[offsets[i]:offsets[i] + longitudes[i]].
+    """
+    puntos, longitudes = _puntos_de_codigo(cadenas)
+    offsets = np.zeros(longitudes.shape[0], dtype=np.int64)
+    np.cumsum(longitudes[:-1], out=offsets[1:])
+
+    # Desplazamiento de cada caracter según la descripción a la que pertenece
+    desplazamiento_por_punto = np.repeat(np.asarray(desplazamientos, dtype=np.int64), longitudes)
+    return _cifrar_puntos(puntos, desplazamiento_por_punto, rng), offsets, longitudes
+
+
+def inspeccion_estructural_lote(codigos: np.ndarray, longitudes: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Versión vectorizada de generator.inspeccion_estructural_contrasena.
+
+    codigos: matriz uint8 (n_contraseñas, ancho); solo son válidas las columnas
+    j < longitudes[i]. Recorre las columnas una sola vez aplicando a todas las filas
+    las mismas reglas (tipo consecutivo, mínimo de símbolos y códigos únicos).
+    """
+    codigos = codigos.copy()
+    n, ancho = codigos.shape
+    if ancho > generator.LONGITUD_MAXIMA_ESTRUCTURAL:
+        raise ValueError(f"La inspección estructural admite como máximo {generator.LONGITUD_MAXIMA_ESTRUCTURAL} caracteres.")
+
+    requeridos = np.minimum(constantes.minimo_simbolos, (longitudes + 1) // 2)
+    simbolos = np.zeros(n, dtype=np.int64)
+    anterior = np.zeros(n, dtype=np.int64)
+    usados = np.zeros((n, 128), dtype=bool)
+    libres = np.zeros((n, 5), dtype=np.int64)  # Códigos aún libres por tipo (columna = tipo)
+    for tipo in generator.TIPOS:
+        libres[:, tipo] = _CODIGOS_POR_TIPO[tipo].shape[0]
+
+    for j in range(ancho):
+        filas = np.nonzero(longitudes > j)[0]
+        if filas.shape[0] == 0:
+            break
+        k = filas.shape[0]
+        restantes = longitudes[filas] - j - 1
+        faltan = requeridos[filas] - simbolos[filas]
+        previo = anterior[filas]
+        viable_simbolo = (previo != TIPO_SIMBOLO) & (faltan - 1 <= restantes // 2)
+        viable_otro = faltan <= (restantes + 1) // 2
+
+        codigo = codigos[filas, j].astype(np.int64)
+        tipo = _TIPO_POR_ASCII[codigo].astype(np.int64)
+        conservar = (tipo != 0) & (tipo != previo) & ~usados[filas, codigo] & np.where(
+            tipo == TIPO_SIMBOLO, viable_simbolo, viable_otro
+        )
+
+        # Conversión a símbolo con probabilidad faltan / posiciones restantes (obligatoria si no hay otra opción)
+        candidata = (faltan > 0) & (tipo != TIPO_SIMBOLO) & viable_simbolo & (libres[filas, TIPO_SIMBOLO] > 0)
+        convertir = candidata & (~viable_otro | (rng.random(k) * (restantes + 1) < faltan))
+        conservar &= ~convertir
+
+        # Tipo de las posiciones a cambiar: símbolo si se convierte, si no uniforme entre los permitidos
+        opciones = np.zeros((k, 5), dtype=bool)
+        for t in generator.TIPOS:
+            opciones[:, t] = (t != previo) & (libres[filas, t] > 0) & (
+                viable_simbolo if t == TIPO_SIMBOLO else viable_otro
+            )
+        claves = np.where(opciones, rng.random((k, 5)), -1.0)
+        tipo_final = np.where(conservar, tipo, np.where(convertir, TIPO_SIMBOLO, np.argmax(claves, axis=1)))
+
+        # Código libre uniforme del tipo elegido para cada posición cambiada
+        for t in generator.TIPOS:
+            cambiar = np.nonzero(~conservar & (tipo_final == t))[0]
+            if cambiar.shape[0] == 0:
+                continue
+            pool = _CODIGOS_POR_TIPO[t]
+            claves = rng.random((cambiar.shape[0], pool.shape[0]))
+            claves[usados[filas[cambiar]][:, pool]] = -1.0
+            codigo[cambiar] = pool[np.argmax(claves, axis=1)]
+
+        codigos[filas, j] = codigo
+        usados[filas, codigo] = True
+        libres[filas, tipo_final] -= 1
+        anterior[filas] = tipo_final
+        simbolos[filas] += tipo_final == TIPO_SIMBOLO
+
+    return codigos
+
+
+def generar_contrasenas_lote(
+    perfiles: List[Dict],
+    plataforma: str,
+    archivo_tags: str = "redes_sociales_con_tags.json",
+    semilla: Optional[int] = None,
+) -> List[Optional[str]]:
+    """
+    Genera una contraseña por perfil en un solo paso vectorizado.
+
+    perfiles: lista de diccionarios con "predicted_scores" y "unique_profile_description"
+    (mismo formato que resultado_palabras.json).
+    Devuelve una lista alineada con perfiles; None si el perfil no se pudo procesar.
+    """
+    tag = procesador_numerico_password.cargar_tag_redes(archivo_tags, plataforma)
+    if tag is None:
+        raise ValueError(f"No existe tag para la plataforma '{plataforma}'.")
+
+    rng = np.random.default_rng(semilla)
+    resultado: List[Optional[str]] = [None] * len(perfiles)
+
+    # Los perfiles se agrupan por número de scores para formar matrices rectangulares
+    grupos: Dict[int, List[int]] = {}
+    for i, perfil in enumerate(perfiles):
+        valores = list((perfil.get("predicted_scores") or {}).values())
+        if not valores or not perfil.get("unique_profile_description"):
+            print(f"Advertencia: Perfil {perfil.get('id_usuario', i)} sin valores o sin descripción. Se omite.")
+            continue
+        grupos.setdefault(len(valores), []).append(i)
+
+    for indices in grupos.values():
+        matriz_valores = np.array([list(perfiles[i]["predicted_scores"].values()) for i in indices], dtype=np.float64)
+        desplazamientos = calcular_desplazamientos_lote(matriz_valores, tag)
+
+        cadenas = [perfiles[i]["unique_profile_description"] for i in indices]
+        puntos, longitudes_cadena = _puntos_de_codigo(cadenas)
+        offsets = np.zeros(longitudes_cadena.shape[0], dtype=np.int64)
+        np.cumsum(longitudes_cadena[:-1], out=offsets[1:])
+
+        # Descripciones que quedan vacías tras quitar espacios no pueden generar contraseña
+        no_vacias = longitudes_cadena > 0
+        for i in np.array(indices)[~no_vacias]:
+            print(f"Advertencia: Perfil {perfiles[i].get('id_usuario', i)} con descripción vacía. Se omite.")
+        indices = [i for i, ok in zip(indices, no_vacias) if ok]
+        offsets, longitudes_cadena = offsets[no_vacias], longitudes_cadena[no_vacias]
+        desplazamientos = desplazamientos[no_vacias]
+        n = len(indices)
+        if n == 0:
+            continue
+
+        # Longitud y punto de inicio como generar_longitud() y generar_punto_inicio()
+        longitudes = rng.integers(longitud_minima, longitud_maxima + 1, n)
+        puntos_inicio = rng.integers(
+            constantes.minimos_generacion_punto_inicio, constantes.maximos_generacion_punto_inicio + 1, n
+        )
+
+        # Corte circular: (punto_inicio + j) % len(cadena_cifrada)
+        # Solo se cifran los caracteres seleccionados; el resto de la cadena cifrada no se usa
+        columnas = np.arange(longitud_maxima)
+        posiciones = offsets[:, None] + (puntos_inicio[:, None] + columnas[None, :]) % longitudes_cadena[:, None]
+        desplazamiento_por_punto = np.broadcast_to(desplazamientos[:, None], posiciones.shape)
+        codigos = _cifrar_puntos(puntos[posiciones], desplazamiento_por_punto, rng)
+
+        codigos = inspeccion_estructural_lote(codigos, longitudes, rng)
+
+        for fila, i in enumerate(indices):
+            resultado[i] = codigos[fila, :longitudes[fila]].tobytes().decode("ascii")
+
+    return resultado
+
+
+def escribir_contrasenas(contrasenas: Iterable[Optional[str]], archivo: str, modo: str = "w") -> int:
+    """Escribe las contraseñas (una por línea) con un único escritor bufferizado. Devuelve cuántas escribió."""
+    escritas = 0
+    with open(archivo, modo, encoding="utf-8", buffering=1024 * 1024) as f:
+        for contrasena in contrasenas:
+            if contrasena is None:
+                continue
+            f.write(contrasena)
+            f.write("\n")
+            escritas += 1
+    return escritas
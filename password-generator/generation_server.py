@@ -3,19 +3,19 @@ import os
 import json
 import hmac
 import hashlib
+from contextlib import asynccontextmanager
 from typing import Dict, Any, List, Optional
 
-import requests
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field, ValidationError
 
 # === MÓDULOS LOCALES ===
-import procesador_numerico_password
-import preprocesador_texto
-import procesador_numerico_eliptico
-from generator import generar_contrasena
-from constantes import ALFABETO_EXTENDIDO  
+import registro_tags
+import ejecutor_pipeline
+from ejecutor_pipeline import PipelineSaturado
+from cliente_key_manager import ClienteKeyManager, KeyManagerNoDisponible
+from outbox_km import OutboxKeyManager
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -42,6 +42,52 @@ if not KEY_MANAGER_API_KEY:
 
 
 
+# Cliente compartido hacia el Key-Manager (pool de conexiones, reintentos y circuit breaker)
+KM_CLIENT = ClienteKeyManager(
+    base_url=KEY_MANAGER_URL,
+    api_key=KEY_MANAGER_API_KEY,
+    tam_pool=int(os.environ.get("KM_POOL_SIZE", "20")),
+    timeout=float(os.environ.get("KM_TIMEOUT", "5")),
+    max_reintentos=int(os.environ.get("KM_MAX_RETRIES", "2")),
+    umbral_fallos=int(os.environ.get("KM_CB_FAILURES", "5")),
+    tiempo_apertura=float(os.environ.get("KM_CB_RESET_SECONDS", "30")),
+)
+
+# Entrega al Key-Manager:
+#   outbox -> el km_payload se confirma en SQLite local y un drenador lo entrega en segundo plano
+#   sync   -> /generate espera a que el KM acepte el payload (comportamiento anterior)
+KM_DELIVERY = os.environ.get("GEN_KM_DELIVERY", "outbox").lower()
+if KM_DELIVERY not in ("outbox", "sync"):
+    raise RuntimeError(f"GEN_KM_DELIVERY no válido: {KM_DELIVERY}")
+OUTBOX = None
+if KM_DELIVERY == "outbox":
+    OUTBOX = OutboxKeyManager(
+        ruta_db=os.environ.get("GEN_OUTBOX_DB", "outbox_km.sqlite3"),
+        cliente=KM_CLIENT,
+        tam_lote=int(os.environ.get("GEN_OUTBOX_BATCH", "50")),
+        backoff_max=float(os.environ.get("GEN_OUTBOX_BACKOFF_MAX", "300")),
+    )
+
+# Pool donde se ejecuta el pipeline de generación (inline | thread | process)
+PIPELINE = ejecutor_pipeline.crear_desde_entorno()
+
+# Versiones de firma HMAC (cabecera X-Signature-Version)
+#   v1 -> HMAC sobre el JSON canónico (claves ordenadas), clientes antiguos
+#   v2 -> HMAC sobre los bytes exactos del cuerpo
+SIGNATURE_VERSION_HEADER = "X-Signature-Version"
+SIGNATURE_V1 = "v1"
+SIGNATURE_V2 = "v2"
+SIGNATURE_VERSIONS = (SIGNATURE_V1, SIGNATURE_V2)
+
+# Máximo de plataformas por petición a /generate/batch
+MAX_PLATAFORMAS_LOTE = int(os.environ.get("GEN_BATCH_MAX_PLATFORMS", "32"))
+
+# Tags de plataforma: se cargan una vez al arrancar y se recargan solo si el archivo cambia
+# "redes_sociales_con_tags.json" debe estar accesible para este servicio
+ARCHIVO_TAGS = os.environ.get("GEN_TAGS_FILE", "redes_sociales_con_tags.json")
+REGISTRO_TAGS = registro_tags.obtener_registro(ARCHIVO_TAGS)
+
+
 # ===================
 #   MODELOS Pydantic 
 # ===================
@@ -60,11 +106,33 @@ class GenerationPayload(BaseModel):
     psy_profile: PsyProfile
 
 
+class BatchGenerationPayload(BaseModel):
+    request_id: str
+    user_id: str
+    email: str
+    platforms: List[str] = Field(min_length=1, max_length=MAX_PLATAFORMAS_LOTE)
+    session_token: str
+    psy_profile: PsyProfile
+
+
 # ======================================================
 #   FASTAPI APP
 # ======================================================
 
-app = FastAPI(title="Psy Password Generation Server", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if OUTBOX is not None:
+        OUTBOX.iniciar()
+    yield
+    # Detener el drenador (lo pendiente sigue en disco), cerrar las conexiones
+    # keep-alive hacia el Key-Manager y el pool de generación
+    if OUTBOX is not None:
+        await OUTBOX.detener()
+    await KM_CLIENT.cerrar()
+    PIPELINE.cerrar()
+
+
+app = FastAPI(title="Psy Password Generation Server", version="1.0.0", lifespan=lifespan)
 
 
 # ======================================================
@@ -79,24 +147,19 @@ def canonical_json(obj: Any) -> bytes:
         separators=(",", ":"),
     ).encode("utf-8")
 
-def verify_payload_signature(body: Dict[str, Any], header_sig: Optional[str]) -> None:
-    """
-    Verifica que el payload JSON ha sido firmado por server_analysis
-    usando HMAC-SHA256 con GEN_HMAC_SECRET.
+def _firma_esperada(mensaje: bytes) -> str:
+    return hmac.new(
+        GEN_HMAC_SECRET.encode("utf-8"),
+        mensaje,
+        hashlib.sha256
+    ).hexdigest()
 
-    """
 
+def _comprobar_firma(mensaje: bytes, header_sig: Optional[str]) -> None:
     if not header_sig:
         raise HTTPException(status_code=401, detail="Missing X-Payload-Signature header")
 
-    body_canon = canonical_json(body)
-
-    expected_sig = hmac.new(
-        GEN_HMAC_SECRET.encode("utf-8"),
-        body_canon,
-        hashlib.sha256
-    ).hexdigest()
-
+    expected_sig = _firma_esperada(mensaje)
 
     if DEBUG_LOGS:
         pass
@@ -108,6 +171,53 @@ def verify_payload_signature(body: Dict[str, Any], header_sig: Optional[str]) ->
     print("✔ Firma válida")
 
 
+def verify_payload_signature(body: Dict[str, Any], header_sig: Optional[str]) -> None:
+    """
+    Verifica que el payload JSON ha sido firmado por server_analysis
+    usando HMAC-SHA256 con GEN_HMAC_SECRET (modo v1: JSON canónico).
+
+    """
+    _comprobar_firma(canonical_json(body), header_sig)
+
+
+def verify_raw_signature(raw_body: bytes, header_sig: Optional[str]) -> None:
+    """
+    Modo v2: la firma cubre los bytes exactos del cuerpo, sin parsear ni re-serializar.
+
+    """
+    _comprobar_firma(raw_body, header_sig)
+
+
+async def read_signed_body(request: Request) -> Dict[str, Any]:
+    """
+    Lee el cuerpo y verifica la firma según X-Signature-Version:
+      - v1 (por defecto, clientes antiguos): se parsea el JSON y se firma su forma canónica
+      - v2: se verifica sobre los bytes crudos antes de parsear; una firma inválida
+            se rechaza sin decodificar el JSON
+
+    """
+    version = request.headers.get(SIGNATURE_VERSION_HEADER, SIGNATURE_V1).strip().lower()
+    if version not in SIGNATURE_VERSIONS:
+        raise HTTPException(status_code=400, detail=f"Unsupported signature version: {version}")
+
+    header_sig = request.headers.get("X-Payload-Signature")
+    raw_body = await request.body()
+
+    if version == SIGNATURE_V2:
+        verify_raw_signature(raw_body, header_sig)
+
+    try:
+        body = json.loads(raw_body)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+
+    if version == SIGNATURE_V1:
+        verify_payload_signature(body, header_sig)
+    return body
+
+
 def extract_valores_and_cadena(psy_profile: PsyProfile, email: str, platform: str) -> tuple[list[float], str]:
     """
     A partir de los scores Big Five y la descripción única, construye:
@@ -134,28 +244,20 @@ def extract_valores_and_cadena(psy_profile: PsyProfile, email: str, platform: st
     return valores, cadena_usuario
 
 
-def send_to_key_manager(payload: dict) -> None:
+async def send_to_key_manager(payload: dict, ruta: str = "/process_generation") -> None:
     """
     Envía la información final al Key-Manager usando HTTPS y API KEY.
+    Usa el cliente asíncrono compartido (pool keep-alive, reintentos y circuit breaker),
+    por lo que no bloquea el event loop mientras espera al KM.
 
     """
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {KEY_MANAGER_API_KEY}",
-    }
-
     try:
-        resp = requests.post(
-            url = f"{KEY_MANAGER_URL}/process_generation",
-            json=payload,
-            headers=headers,
-            timeout=5,       # Evita que se quede colgado
-        )
-    except requests.RequestException as exc:
+        resp = await KM_CLIENT.post(ruta, payload)
+    except KeyManagerNoDisponible as exc:
         #Manejo de errores
         raise HTTPException(
-            status_code=502,
-            detail=f"Error connecting to Key-Manager: {type(exc).__name__}"
+            status_code=503 if exc.circuito_abierto else 502,
+            detail=str(exc)
         )
 
     if resp.status_code != 200:
@@ -166,6 +268,25 @@ def send_to_key_manager(payload: dict) -> None:
         )
 
 
+async def deliver_to_key_manager(payload: dict, ruta: str = "/process_generation") -> str:
+    """
+    Con outbox el payload queda confirmado en disco y se entrega en segundo plano
+    (devuelve "queued"); en modo sync se envía y se espera al KM (devuelve "sent").
+
+    """
+    if OUTBOX is None:
+        await send_to_key_manager(payload, ruta=ruta)
+        return "sent"
+    try:
+        nuevo = await OUTBOX.encolar(payload["request_id"], ruta, payload)
+    except Exception as exc:
+        print(f"❌ Error guardando en outbox: {exc}")
+        raise HTTPException(status_code=500, detail="Could not persist Key-Manager payload")
+    if not nuevo and DEBUG_LOGS:
+        print(f"[GEN-SERVER] request_id={payload['request_id']} ya estaba en el outbox")
+    return "queued"
+
+
 # ======================================================
 #   ENDPOINT PRINCIPAL -> ANALYSIS -> GENERATOR -> SERVER KEYMANAGER
 # ======================================================
@@ -178,14 +299,8 @@ async def generate_password(request: Request):
 
     """
 
-    try:
-        body = await request.json()
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid JSON body")
-
-    # Verificar firma HMAC del payload
-    header_sig = request.headers.get("X-Payload-Signature")
-    verify_payload_signature(body, header_sig)
+    # Verificar firma HMAC del payload (v1 canónica o v2 sobre el cuerpo crudo)
+    body = await read_signed_body(request)
 
     #  Validar estructura con Pydantic
     try:
@@ -213,43 +328,22 @@ async def generate_password(request: Request):
     #   PIPELINE DE GENERACIÓN SEGÚN TU ESPECIFICACIÓN
     # ==================================================
 
-    # Tag de la plataforma
-    # "redes_sociales_con_tags.json" debe estar accesible para este servicio
-    tag = procesador_numerico_password.cargar_tag_redes(
-        "redes_sociales_con_tags.json",
-        platform
-    )
-    # Calcular desplazamiento
-    desplazamiento = procesador_numerico_password.calcular_desplazamiento(
-        valores,
-        tag,
-        len(ALFABETO_EXTENDIDO)
-    )
-
-    # Preprocesar/cifrar cadena de usuario
-    cadena_cifrada, indice_generacion = preprocesador_texto.preprocesador_cadena(
-        cadena_usuario,
-        desplazamiento
-    )
-
-    #  Generar semilla, longitud y punto de inicio
-    #semilla = procesador_numerico_password.recoger_semilla_longitud(tag, valores)
-    # Se decide no usar una semilla de generación para la longitud para evitar que todas las contraseñas del mismo usuario tengan la misma longitud
-    longitud = procesador_numerico_password.generar_longitud()
-    punto_inicio = procesador_numerico_password.generar_punto_inicio()
-
-    #  Generar contraseña final
-    contrasena = generar_contrasena(
-        cadena_usuario,
-        longitud,
-        desplazamiento,
-        punto_inicio
-    )
+    # Tag de la plataforma (registro en memoria, sin I/O en el camino de la petición)
+    tag = REGISTRO_TAGS.obtener(platform)
+    if tag is None:
+        raise HTTPException(status_code=400, detail=f"Unknown platform: {platform}")
+    # Desplazamiento -> cifrado -> longitud/punto de inicio -> contraseña -> codificación numérica
+    # Se ejecuta en el pool configurado (GEN_EXECUTOR_MODE) para no bloquear el event loop
+    try:
+        resultado = await PIPELINE.ejecutar(valores, cadena_usuario, tag)
+    except PipelineSaturado as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    contrasena = resultado["contrasena"]
+    valor_numerico_cod = resultado["valor_numerico_cod"]
 
-    # Codificación numérica 
-    valor_numerico_cod = procesador_numerico_eliptico.calcular_codificacion_numerica(
-        cadena_cifrada
-    )
+    if DEBUG_LOGS:
+        tiempos = " ".join(f"{etapa}={ms:.2f}ms" for etapa, ms in resultado["tiempos_ms"].items())
+        print(f"[GEN-SERVER] request_id={data.request_id} {tiempos}")
 
     # ==================================================
     #   ENVÍO SEGURO AL KEY-MANAGER
@@ -267,19 +361,103 @@ async def generate_password(request: Request):
     }
     print("✔  km_payload generado")
 
-    # Enviar al Key-Manager (HTTPS + API KEY)
-    send_to_key_manager(km_payload)
+    # Enviar al Key-Manager (HTTPS + API KEY), directamente o a través del outbox
+    delivery = await deliver_to_key_manager(km_payload)
 
     if DEBUG_LOGS:
-        print(f"✔ Datos enviados al Key-Manager para request_id={data.request_id}")
+        print(f"✔ Datos {delivery} al Key-Manager para request_id={data.request_id}")
 
     # Respuesta al server_analysis 
     return JSONResponse(
         status_code=200,
         content={
             "success": True,
-            "message": "Password generated and sent to Key-Manager",
+            "message": "Password generated and sent to Key-Manager" if delivery == "sent"
+                       else "Password generated and queued for Key-Manager",
+            "request_id": data.request_id,
+            "platform": platform,
+            "delivery": delivery
+        }
+    )
+
+
+# ======================================================
+#   ENDPOINT LOTE -> UNA CONTRASEÑA POR PLATAFORMA, UN SOLO ENVÍO AL KM
+# ======================================================
+
+@app.post("/generate/batch", summary="Generar contraseñas para varias plataformas y enviarlas al Key-Manager")
+async def generate_password_batch(request: Request):
+    """
+    Igual que /generate pero para una lista de plataformas del mismo perfil:
+    desplazamientos de todos los tags en un solo paso y un único envío al Key-Manager.
+
+    """
+    # Verificar firma HMAC del payload (v1 canónica o v2 sobre el cuerpo crudo)
+    body = await read_signed_body(request)
+
+    #  Validar estructura con Pydantic
+    try:
+        data = BatchGenerationPayload(**body)
+    except ValidationError as e:
+        print("❌ Error Pydantic:", e.json())
+        raise HTTPException(status_code=400, detail=f"Invalid payload structure: {e}")
+
+    # Plataformas normalizadas y sin repetir (se conserva el orden)
+    platforms = list(dict.fromkeys(p.lower().strip() for p in data.platforms))
+    tags = [REGISTRO_TAGS.obtener(p) for p in platforms]
+    desconocidas = [p for p, tag in zip(platforms, tags) if tag is None]
+    if desconocidas:
+        raise HTTPException(status_code=400, detail=f"Unknown platform(s): {', '.join(desconocidas)}")
+
+    if DEBUG_LOGS:
+        print(f"[GEN-SERVER] request_id={data.request_id} platforms={platforms}")
+
+    valores = None
+    cadenas_usuario = []
+    for platform in platforms:
+        valores, cadena_usuario = extract_valores_and_cadena(
+            psy_profile=data.psy_profile,
+            email=data.email,
+            platform=platform
+        )
+        cadenas_usuario.append(cadena_usuario)
+
+    try:
+        resultado = await PIPELINE.ejecutar_lote(valores, cadenas_usuario, tags)
+    except PipelineSaturado as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+
+    if DEBUG_LOGS:
+        tiempos = " ".join(f"{etapa}={ms:.2f}ms" for etapa, ms in resultado["tiempos_ms"].items())
+        print(f"[GEN-SERVER] request_id={data.request_id} {tiempos}")
+
+    km_payload = {
+        "user_id": data.user_id,
+        "session_token": data.session_token,
+        "email": data.email,
+        "purpose": "PASSWORD",
+        "psy_values": valores,
+        "request_id": data.request_id,
+        "items": [
+            {"platform": platform, "password": contrasena, "numeric_code": valor_numerico_cod}
+            for platform, contrasena, valor_numerico_cod in zip(
+                platforms, resultado["contrasenas"], resultado["valores_numericos_cod"]
+            )
+        ],
+    }
+    print(f"✔  km_payload generado ({len(platforms)} plataformas)")
+
+    # Un solo envío al Key-Manager para todas las plataformas
+    delivery = await deliver_to_key_manager(km_payload, ruta="/process_generation_batch")
+
+    return JSONResponse(
+        status_code=200,
+        content={
+            "success": True,
+            "message": "Passwords generated and sent to Key-Manager" if delivery == "sent"
+                       else "Passwords generated and queued for Key-Manager",
             "request_id": data.request_id,
-            "platform": platform
+            "platforms": platforms,
+            "delivery": delivery
         }
-    )
\ No newline at end of file
+    )
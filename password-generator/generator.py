@@ -3,7 +3,7 @@ import time
 import curva_eliptica
 import preprocesador_texto
 import string
-import random
+import fuente_aleatoria
 import procesador_numerico_password
 import procesador_numerico_eliptico
 import json
@@ -22,14 +22,16 @@ numero_simbolos = len(SIMBOLOS_PERMITIDOS)
 # longitud => longitud de la contraseña a generar
 # desplazamiento => valor del desplazamiento para el cifrado Cesar
 # punto_inicio => punto de inicio para la selección de la contraseña en la cadena cifrada
+# fuente => fuente de aleatoriedad (random.Random); por defecto la del hilo actual (fuente_aleatoria)
 
-def generar_contrasena(cadena_usuario, longitud, desplazamiento, punto_inicio):
+def generar_contrasena(cadena_usuario, longitud, desplazamiento, punto_inicio, fuente=None):
     contrasena = ""
+    fuente = fuente or fuente_aleatoria.fuente_actual()
     # Validar la longitud de la cadena de usuario
     if not (longitud_minima <= longitud <= longitud_maxima):
         raise ValueError(f"La longitud para la generación de la contraseña no está dentro de los límites permitidos ({longitud_minima}-{longitud_maxima}).")
     # Generar la contraseña cifrada usando el preprocesador
-    cadena_cifrada, indice_cifrado = preprocesador_texto.preprocesador_cadena(cadena_usuario, desplazamiento)
+    cadena_cifrada, indice_cifrado = preprocesador_texto.preprocesador_cadena(cadena_usuario, desplazamiento, fuente)
     # Validar el punto de inicio
     if punto_inicio < 0:
         raise ValueError("El punto de inicio y la longitud especificados no son válidos para la cadena cifrada.")
@@ -44,7 +46,7 @@ def generar_contrasena(cadena_usuario, longitud, desplazamiento, punto_inicio):
 
     # Inspeccionar si dentro de la contraseña hay valores consecutivos del mismo tipo y verificar que no haya el mismo codigo ascii 
     #print("Contraseña antes de ajustes:",contrasena)
-    contrasena_modificada= inspeccion_estructural_contrasena(contrasena)    
+    contrasena_modificada= inspeccion_estructural_contrasena(contrasena, fuente)
     #print("Contraseña final generada:",contrasena_modificada)
     return contrasena_modificada
 
@@ -53,8 +55,8 @@ def matriz_grupo_ascii(cadena: str) -> list:
     TIPO: 
     1 -> Mayúsculas
     2 -> Minúsculas
-    3 -> Caracter especial (dentro de los símbolos permitidos)
-    4 -> Numéricos
+    3 -> Numéricos
+    4 -> Caracter especial (dentro de los símbolos permitidos)
 
     Matriz: [tipo, código_ascii]
     """
@@ -78,156 +80,99 @@ def matriz_grupo_ascii(cadena: str) -> list:
     #print("matriz: ", matriz)
     return matriz
 
-def inspeccion_estructural_contrasena(cadena: str) -> str:
-    """ Inspecciona la estructura de la contraseña y se asegura de no tener más de dos caracteres consecutivos del mismo grupo ASCII
-        y devuelve la cadena corregida si es necesario y asegurarse de que los caracteres no se repiten ni una sola vez.
-
-        Se usan diccionarios uno por columna, se usan los valores de la columna como claves 
-        como valor el índice de la fila donde se encuentra el valor. 
-        Si se encuentra el valor más de una vez, se registrará más de una posición 
-        Solo se guardan los valores que tengan más de un índice (duplicados)
-    """
-    contrasena_lista = list(cadena)
-    matriz = matriz_grupo_ascii(cadena)
-
+# Representación compacta para la inspección estructural:
+# tabla ASCII -> tipo (0 = no reconocido) y conjunto de códigos disponibles por tipo
+TIPOS = (constantes.TIPO_MAYUSCULA, constantes.TIPO_MINUSCULA, constantes.TIPO_NUMERICO, constantes.TIPO_SIMBOLO)
+TIPO_SIMBOLO = constantes.TIPO_SIMBOLO
+CODIGOS_POR_TIPO = {
+    constantes.TIPO_MAYUSCULA: list(range(constantes.ascii_inicio_Mayusculas, constantes.ascii_fin_Mayusculas + 1)),
+    constantes.TIPO_MINUSCULA: list(range(constantes.ascii_inicio_minuscula, constantes.ascii_fin_minuscula + 1)),
+    constantes.TIPO_NUMERICO: list(range(constantes.ascii_inicio_numerico, constantes.ascii_fin_numerico + 1)),
+    constantes.TIPO_SIMBOLO: list(constantes.SIMBOLOS_PERMITIDOS_ascii),
+}
+_tabla_tipos = bytearray(128)
+for _tipo, _codigos in CODIGOS_POR_TIPO.items():
+    for _codigo in _codigos:
+        _tabla_tipos[_codigo] = _tipo
+TABLA_TIPOS = bytes(_tabla_tipos)
+
+# Hasta esta longitud nunca se agotan los códigos: para quedarse sin opciones habría que haber usado
+# todos los códigos de tres tipos distintos (como mínimo 10 números + 19 símbolos + 26 letras = 55)
+LONGITUD_MAXIMA_ESTRUCTURAL = sum(sorted(len(c) for c in CODIGOS_POR_TIPO.values())[:3])
+
+
+def _capacidad_simbolos(posiciones: int, anterior_es_simbolo: bool) -> int:
+    """Máximo de símbolos no consecutivos que caben en las posiciones restantes."""
+    return posiciones // 2 if anterior_es_simbolo else (posiciones + 1) // 2
+
+
+def inspeccion_estructural_contrasena(cadena: str, fuente=None) -> str:
+    """ Corrige la estructura de la contraseña en una sola pasada, garantizando a la vez que:
+        - dos caracteres consecutivos nunca son del mismo tipo (Mayúscula, Minúscula, Numérico, Símbolo)
+        - hay al menos constantes.minimo_simbolos símbolos (o los que quepan si la cadena es muy corta)
+        - ningún código ASCII se repite
+
+        Cada posición se decide una sola vez (se conserva el caracter original si cumple las reglas
+        y no compromete el mínimo de símbolos; si no, se sortea un tipo permitido y un código aún libre
+        de ese tipo), por lo que el trabajo es O(longitud) sin re-sorteos.
+        Los sorteos usan `fuente` (por defecto fuente_aleatoria.fuente_actual()).
     """
-    TIPO: 
-    1 -> Mayúsculas
-    2 -> Minúsculas
-    3 -> Caracter especial (dentro de los símbolos permitidos)
-    4 -> Numéricos
+    n = len(cadena)
+    if n > LONGITUD_MAXIMA_ESTRUCTURAL:
+        raise ValueError(f"La inspección estructural admite como máximo {LONGITUD_MAXIMA_ESTRUCTURAL} caracteres.")
+
+    fuente = fuente or fuente_aleatoria.fuente_actual()
+    codigos = bytearray(ord(c) if ord(c) < 128 else 0 for c in cadena)
+    disponibles = {tipo: list(lista) for tipo, lista in CODIGOS_POR_TIPO.items()}
+    usados = bytearray(128)
+    requeridos = min(constantes.minimo_simbolos, (n + 1) // 2)
+    simbolos = 0
+    anterior = 0
 
-    matriz [tipo, ascii]
-
-    """
-
-    #Inspección para verificar que el tipo no se repita con el elemento anterior o el siguiente
-    n = len(matriz)
     for i in range(n):
-        #matriz (tipo, codigo_ascii)
-        actual_tipo = matriz[i][0]
-        anterior_tipo = matriz[i-1][0] if i > 0 else None
-
-        if actual_tipo == anterior_tipo:
-            nuevo_tipo = actual_tipo
-            
-            # Generar un nuevo tipo que sea diferente al actual
-            while nuevo_tipo == anterior_tipo:
-                nuevo_tipo = random.randint(1, 4)
-            if nuevo_tipo == 1: # Mayúscula
-                nuevo_ascii = random.randint(constantes.ascii_inicio_Mayusculas, constantes.ascii_fin_Mayusculas)
-            elif nuevo_tipo == 2: # Minúscula
-                nuevo_ascii = random.randint(constantes.ascii_inicio_minuscula, constantes.ascii_fin_minuscula)
-            elif nuevo_tipo == 3: # Símbolo
-                nuevo_ascii = random.choice(constantes.SIMBOLOS_PERMITIDOS_ascii)
-            elif nuevo_tipo == 4: # Número
-                nuevo_ascii = random.randint(constantes.ascii_inicio_numerico, constantes.ascii_fin_numerico)
-            else:
-                print(f"Error: Tipo de dato no válido generado ({nuevo_tipo}) en el índice {i}")
-                nuevo_ascii = matriz[i][1] # Mantener el valor viejo si hay error
-                
-            # Debugging
-           # print(f"Corrección de Tipo en {i}: {matriz[i]} -> ({nuevo_tipo}, {nuevo_ascii})")
-                
-            #Actualización
-            matriz[i] = (nuevo_tipo, nuevo_ascii)
-            #print("matriz_nueva:" , matriz)
-            contrasena_lista[i] = chr(nuevo_ascii)
-            
-    # print("Contraseña después de corregir tipos:", contrasena_lista)
-    # print("Matriz después de corregir tipos:", matriz)
-
-    #Asegurar que al menos haya 3 símbolos
-    simbolos_actuales = sum(1 for tipo, _ in matriz if tipo ==3)
-    simbolos_faltantes = 3 - simbolos_actuales
-
-    if simbolos_faltantes > 0:
-        #print(f"\nDetectados {simbolos_actuales} símbolos. Faltan {simbolos_faltantes} para el mínimo de 3.")
-    
-        indices_no_simbolos = [i for i, (tipo, _) in enumerate(matriz) if tipo != 3]
-        
-        # 3. Sortear índices a cambiar (asegurando no exceder los disponibles)
-        if len(indices_no_simbolos) >= simbolos_faltantes:
-            indices_a_cambiar = random.sample(indices_no_simbolos, simbolos_faltantes)
+        restantes = n - i - 1
+        faltan = requeridos - simbolos
+        # Viabilidad del mínimo de símbolos según el tipo que tome esta posición
+        viable_simbolo = anterior != TIPO_SIMBOLO and faltan - 1 <= _capacidad_simbolos(restantes, True)
+        viable_otro = faltan <= _capacidad_simbolos(restantes, False)
+
+        codigo = codigos[i]
+        tipo = TABLA_TIPOS[codigo]
+        conservar = tipo != 0 and tipo != anterior and not usados[codigo] and (
+            viable_simbolo if tipo == TIPO_SIMBOLO else viable_otro
+        )
+
+        # Muestreo secuencial de las posiciones que pasan a ser símbolo: probabilidad faltan / posiciones
+        # restantes, y obligatorio cuando el mínimo dejaría de ser alcanzable
+        if faltan > 0 and tipo != TIPO_SIMBOLO and viable_simbolo and disponibles[TIPO_SIMBOLO]:
+            if not viable_otro or fuente.random() * (restantes + 1) < faltan:
+                conservar = False
+                tipo = TIPO_SIMBOLO
+            elif not conservar:
+                tipo = 0
+        elif not conservar:
+            tipo = 0
+
+        if conservar:
+            disponibles[tipo].remove(codigo)
         else:
-            # Si la matriz es muy pequeña, cambia todos los que no son símbolos
-            indices_a_cambiar = indices_no_simbolos 
-
-        # 4. Realizar los cambios
-        for i in indices_a_cambiar:
-            nuevo_tipo = 3
-            
-            # Generar el nuevo código ASCII 
-            nuevo_ascii = random.choice(constantes.SIMBOLOS_PERMITIDOS_ascii)
-            
-            # Actualizar la matriz y la lista de contraseña
-            # El valor anterior es: matriz[i]
-            matriz[i] = (nuevo_tipo, nuevo_ascii)
-            contrasena_lista[i] = chr(nuevo_ascii)
-
-
-    #Corregir Códigos ASCII Duplicados 
-    # Inicializa diccionarios para inspeccionar duplicados de código ASCII 
-    duplicados_codigo = {}
-    for i, (tipo, codigo) in enumerate(matriz): # Desempaquetamos para obtener el código
-        if codigo in duplicados_codigo:
-            duplicados_codigo[codigo].append(i)
-        else: 
-            duplicados_codigo[codigo]=[i]
-
-    # Filtrar solo los verdaderos duplicados
-    duplicados_codigo = {valor: indices for valor, indices in duplicados_codigo.items() if len(indices) > 1}
-    # print("Lista Duplicados de Código:", duplicados_codigo)
-
-    # Reemplazo de códigos duplicados
-    for codigo, indices in duplicados_codigo.items():
-        cantidad_duplicados = len(indices)
-        
-        # Determinar cuántos cambiar (lógica: 2->1 cambio, 3+-> cantidad_duplicados-1)
-        if cantidad_duplicados == 2:
-            num_cambios = 1
-        elif cantidad_duplicados >= 3:
-            # Se cambia la mayoría para reducir la duplicación, dejando 1 original
-            num_cambios = cantidad_duplicados - 1
-            
-        # Sorteo de índices a cambiar
-        indices_cambiar = random.sample(indices, num_cambios)
-
-        # Escoger randomicamente segun el tipo
-        for indice in indices_cambiar:
-            tipo_original = matriz[indice][0]
-            valor_original = matriz[indice][1]
-            
-            # Inicializar nuevo_ascii para evitar UnboundLocalError
-            nuevo_ascii = valor_original 
-            
-            # Función para generar un nuevo ASCII
-            def generar_nuevo_ascii(valor_original, tipo):
-                nuevo_ascii = valor_original
-                
-                # Bucle de re-generación (mientras esté en el rango valor_original +/- 2)
-                while (nuevo_ascii >= valor_original - 2) and (nuevo_ascii <= valor_original + 2):
-                    if tipo == 1: # Mayúscula
-                        nuevo_ascii = random.randint(constantes.ascii_inicio_Mayusculas, constantes.ascii_fin_Mayusculas)
-                    elif tipo == 2: # Minúscula
-                        nuevo_ascii = random.randint(constantes.ascii_inicio_minuscula, constantes.ascii_fin_minuscula)
-                    elif tipo == 3: # Símbolo
-                        nuevo_ascii = random.choice(constantes.SIMBOLOS_PERMITIDOS_ascii)
-                    elif tipo == 4: # Número
-                        nuevo_ascii = random.randint(constantes.ascii_inicio_numerico, constantes.ascii_fin_numerico)
-                    else:
-                        print(f"Error: Tipo de dato no válido en reeplazo ({tipo})")
-                        break # Salir del bucle while para evitar loop infinito
-                return nuevo_ascii
-
-            # Generar y asignar el nuevo código
-            nuevo_ascii = generar_nuevo_ascii(valor_original, tipo_original)
-
-            # Actualizar la matriz y la lista de contraseña
-            matriz[indice] = (tipo_original, nuevo_ascii)
-            contrasena_lista[indice] = chr(nuevo_ascii)
-
-    return ''.join(contrasena_lista)
+            if tipo == 0:
+                opciones = [t for t in TIPOS if t != anterior and disponibles[t]
+                            and (viable_simbolo if t == TIPO_SIMBOLO else viable_otro)]
+                tipo = fuente.choice(opciones)
+            # Código libre del tipo elegido (intercambio con el último y pop -> O(1))
+            pool = disponibles[tipo]
+            j = fuente.randrange(len(pool))
+            pool[j], pool[-1] = pool[-1], pool[j]
+            codigo = pool.pop()
+            codigos[i] = codigo
+
+        usados[codigo] = 1
+        anterior = tipo
+        if tipo == TIPO_SIMBOLO:
+            simbolos += 1
+
+    return codigos.decode("ascii")
 
 """
 #---PRUEBAS DE ENTRADA Y SALIDA DE FUNCIONES INDIVIDUAL---#
@@ -0,0 +1,74 @@
+# Lectura en streaming de archivos JSON con una lista de objetos en la raíz
+# ([{...}, {...}, ...]) sin cargar el archivo entero en memoria.
+# Se decodifica elemento a elemento con JSONDecoder.raw_decode sobre bloques del archivo.
+import json
+from typing import Any, Iterator
+
+TAM_BLOQUE = 1 << 20  # 1 MB
+
+_ESPACIOS = " \t\r\n"
+
+
+def iterar_lista_json(ruta: str, tam_bloque: int = TAM_BLOQUE) -> Iterator[Any]:
+    """
+    Devuelve los elementos de la lista raíz de `ruta` uno a uno.
+    Si el archivo termina sin el ']' final (p. ej. un volcado interrumpido) se avisa
+    y se devuelven los elementos completos leídos hasta ese punto.
+    """
+    decodificador = json.JSONDecoder()
+    with open(ruta, "r", encoding="utf-8") as f:
+        buffer = f.read(tam_bloque)
+        pos = 0
+        fin_archivo = False
+
+        def rellenar():
+            # Descarta lo ya consumido y añade el siguiente bloque
+            nonlocal buffer, pos, fin_archivo
+            bloque = f.read(tam_bloque)
+            if not bloque:
+                fin_archivo = True
+            buffer = buffer[pos:] + bloque
+            pos = 0
+
+        def saltar_espacios():
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in _ESPACIOS:
+                    pos += 1
+                if pos < len(buffer) or fin_archivo:
+                    return
+                rellenar()
+
+        saltar_espacios()
+        if pos >= len(buffer) or buffer[pos] != "[":
+            raise ValueError(f"{ruta} no contiene una lista JSON en la raíz")
+        pos += 1
+
+        primero = True
+        while True:
+            saltar_espacios()
+            if pos >= len(buffer):
+                print(f"Aviso: {ruta} termina sin cerrar la lista; se usan los elementos completos")
+                return
+            if buffer[pos] == "]":
+                return
+            if not primero:
+                if buffer[pos] != ",":
+                    raise ValueError(f"Se esperaba ',' en {ruta}")
+                pos += 1
+                saltar_espacios()
+            while True:
+                try:
+                    elemento, fin = decodificador.raw_decode(buffer, pos)
+                    break
+                except json.JSONDecodeError:
+                    # Elemento partido entre bloques: leer más (o el archivo está truncado)
+                    if fin_archivo:
+                        print(f"Aviso: {ruta} termina con un elemento incompleto; se descarta")
+                        return
+                    rellenar()
+            pos = fin
+            primero = False
+            yield elemento
+            if pos > tam_bloque:
+                rellenar()
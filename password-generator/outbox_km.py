@@ -0,0 +1,259 @@
+# Outbox duradero para la entrega generador -> Key-Manager
+# - /generate confirma el km_payload en SQLite local (WAL + synchronous=FULL) y responde
+# - Un drenador en segundo plano entrega en lotes al KM con backoff exponencial + jitter
+# - Las entradas se reservan con un lease (proximo_intento) para que varios workers
+#   puedan compartir el archivo sin entregar dos veces lo mismo a la vez
+# - El KM es idempotente por request_id + plataforma, así que una reentrega tras un
+#   timeout no duplica la contraseña
+import asyncio
+import json
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from cliente_key_manager import ClienteKeyManager, KeyManagerNoDisponible
+
+RUTA_INDIVIDUAL = "/process_generation"
+RUTA_BULK = "/process_generation_bulk"
+
+PENDIENTE = "pendiente"
+FALLIDO = "fallido"    # Rechazo permanente del KM (4xx): no se reintenta
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    clave TEXT NOT NULL UNIQUE,
+    ruta TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    intentos INTEGER NOT NULL DEFAULT 0,
+    proximo_intento REAL NOT NULL,
+    creado REAL NOT NULL,
+    ultimo_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_pendientes ON outbox (estado, proximo_intento);
+"""
+
+
+def _es_permanente(status_code: int) -> bool:
+    return 400 <= status_code < 500 and status_code not in (408, 429)
+
+
+class OutboxKeyManager:
+    def __init__(
+        self,
+        ruta_db: str,
+        cliente: ClienteKeyManager,
+        tam_lote: int = 50,
+        intervalo: float = 0.5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 300.0,
+        lease: float = 60.0,
+    ):
+        self.ruta_db = ruta_db
+        self.cliente = cliente
+        self.tam_lote = tam_lote
+        self.intervalo = intervalo
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(ruta_db, check_same_thread=False, isolation_level=None)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=FULL")
+        self._conexion.execute("PRAGMA busy_timeout=5000")
+        self._conexion.executescript(_ESQUEMA)
+        self._despertar: Optional[asyncio.Event] = None
+        self._tarea: Optional[asyncio.Task] = None
+        self.entregados = 0
+        self.fallos = 0
+
+    # ---------------- SQLite (se llama desde hilos con asyncio.to_thread) ----------------
+
+    def _insertar(self, clave: str, ruta: str, payload: str) -> bool:
+        ahora = time.time()
+        with self._lock:
+            cursor = self._conexion.execute(
+                "INSERT OR IGNORE INTO outbox (clave, ruta, payload, estado, proximo_intento, creado) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (clave, ruta, payload, PENDIENTE, ahora, ahora),
+            )
+        return cursor.rowcount == 1
+
+    def _reservar(self, limite: int) -> List[tuple]:
+        """Toma hasta `limite` entradas vencidas y las reserva durante `lease` segundos."""
+        ahora = time.time()
+        with self._lock:
+            self._conexion.execute("BEGIN IMMEDIATE")
+            try:
+                filas = self._conexion.execute(
+                    "SELECT id, ruta, payload, intentos FROM outbox "
+                    "WHERE estado = ? AND proximo_intento <= ? ORDER BY id LIMIT ?",
+                    (PENDIENTE, ahora, limite),
+                ).fetchall()
+                if filas:
+                    self._conexion.executemany(
+                        "UPDATE outbox SET proximo_intento = ? WHERE id = ?",
+                        [(ahora + self.lease, fila[0]) for fila in filas],
+                    )
+                self._conexion.execute("COMMIT")
+            except BaseException:
+                self._conexion.execute("ROLLBACK")
+                raise
+        return filas
+
+    def _eliminar(self, ids: List[int]) -> None:
+        with self._lock:
+            self._conexion.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+
+    def _reprogramar(self, fallos: List[tuple]) -> None:
+        """fallos: (id, intentos_previos, error)"""
+        ahora = time.time()
+        filas = []
+        for id_fila, intentos, error in fallos:
+            espera = min(self.backoff_max, self.backoff_base * (2 ** intentos))
+            filas.append((intentos + 1, ahora + random.uniform(espera / 2, espera), error, id_fila))
+        with self._lock:
+            self._conexion.executemany(
+                "UPDATE outbox SET intentos = ?, proximo_intento = ?, ultimo_error = ? WHERE id = ?", filas
+            )
+
+    def _marcar_fallido(self, fallos: List[tuple]) -> None:
+        """fallos: (id, error)"""
+        with self._lock:
+            self._conexion.executemany(
+                "UPDATE outbox SET estado = ?, ultimo_error = ? WHERE id = ?",
+                [(FALLIDO, error, id_fila) for id_fila, error in fallos],
+            )
+
+    def _contar(self) -> Dict[str, int]:
+        with self._lock:
+            filas = self._conexion.execute("SELECT estado, COUNT(*) FROM outbox GROUP BY estado").fetchall()
+        conteo = {PENDIENTE: 0, FALLIDO: 0}
+        conteo.update(dict(filas))
+        return conteo
+
+    # ---------------- API asíncrona ----------------
+
+    async def encolar(self, request_id: str, ruta: str, payload: Dict[str, Any]) -> bool:
+        """
+        Confirma el payload en disco. Devuelve False si ya existía (mismo request_id y ruta),
+        en cuyo caso se conserva el primero.
+        """
+        payload_json = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+        nuevo = await asyncio.to_thread(self._insertar, f"{ruta}:{request_id}", ruta, payload_json)
+        if self._despertar is not None:
+            self._despertar.set()
+        return nuevo
+
+    async def drenar_una_vez(self) -> int:
+        """Entrega un lote de entradas vencidas. Devuelve cuántas se entregaron."""
+        filas = await asyncio.to_thread(self._reservar, self.tam_lote)
+        if not filas:
+            return 0
+
+        entregados, reintentar, fallidos = [], [], []
+        individuales = [fila for fila in filas if fila[1] == RUTA_INDIVIDUAL]
+        otras = [fila for fila in filas if fila[1] != RUTA_INDIVIDUAL]
+
+        # Todas las /process_generation vencidas viajan en una sola petición
+        if individuales:
+            await self._entregar_bulk(individuales, entregados, reintentar, fallidos)
+        for fila in otras:
+            await self._entregar_una(fila, entregados, reintentar, fallidos)
+
+        if entregados:
+            await asyncio.to_thread(self._eliminar, entregados)
+        if reintentar:
+            await asyncio.to_thread(self._reprogramar, reintentar)
+        if fallidos:
+            await asyncio.to_thread(self._marcar_fallido, fallidos)
+            for id_fila, error in fallidos:
+                print(f"❌ [OUTBOX] Entrada {id_fila} rechazada por el Key-Manager: {error}")
+        self.entregados += len(entregados)
+        self.fallos += len(reintentar) + len(fallidos)
+        return len(entregados)
+
+    async def _entregar_bulk(self, filas, entregados, reintentar, fallidos) -> None:
+        payloads = [json.loads(fila[2]) for fila in filas]
+        try:
+            resp = await self.cliente.post(RUTA_BULK, {"items": payloads}, idempotente=True)
+        except KeyManagerNoDisponible as exc:
+            reintentar.extend((fila[0], fila[3], str(exc)) for fila in filas)
+            return
+
+        if resp.status_code != 200:
+            error = f"status {resp.status_code}"
+            if _es_permanente(resp.status_code):
+                fallidos.extend((fila[0], error) for fila in filas)
+            else:
+                reintentar.extend((fila[0], fila[3], error) for fila in filas)
+            return
+
+        resultados = resp.json().get("results", {})
+        for fila, payload in zip(filas, payloads):
+            resultado = resultados.get(payload.get("request_id"), {})
+            if resultado.get("status") == "ok":
+                entregados.append(fila[0])
+            elif _es_permanente(int(resultado.get("code", 500))):
+                fallidos.append((fila[0], str(resultado.get("detail"))))
+            else:
+                reintentar.append((fila[0], fila[3], str(resultado.get("detail", "missing result"))))
+
+    async def _entregar_una(self, fila, entregados, reintentar, fallidos) -> None:
+        id_fila, ruta, payload_json, intentos = fila
+        try:
+            resp = await self.cliente.post(ruta, json.loads(payload_json), idempotente=True)
+        except KeyManagerNoDisponible as exc:
+            reintentar.append((id_fila, intentos, str(exc)))
+            return
+        if resp.status_code == 200:
+            entregados.append(id_fila)
+        elif _es_permanente(resp.status_code):
+            fallidos.append((id_fila, f"status {resp.status_code}"))
+        else:
+            reintentar.append((id_fila, intentos, f"status {resp.status_code}"))
+
+    async def _bucle(self) -> None:
+        while True:
+            try:
+                entregados = await self.drenar_una_vez()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                print(f"❌ [OUTBOX] Error en el drenador: {exc}")
+                entregados = 0
+            if entregados == 0:
+                # Nada que entregar (o todo en backoff): esperar a una nueva entrada o al intervalo
+                self._despertar.clear()
+                try:
+                    await asyncio.wait_for(self._despertar.wait(), timeout=self.intervalo)
+                except asyncio.TimeoutError:
+                    pass
+
+    def iniciar(self) -> None:
+        if self._tarea is None:
+            self._despertar = asyncio.Event()
+            self._tarea = asyncio.create_task(self._bucle())
+
+    async def detener(self) -> None:
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+        with self._lock:
+            self._conexion.close()
+
+    async def estadisticas(self) -> Dict[str, int]:
+        conteo = await asyncio.to_thread(self._contar)
+        return {
+            "pendientes": conteo[PENDIENTE],
+            "fallidos": conteo[FALLIDO],
+            "entregados": self.entregados,
+            "fallos_entrega": self.fallos,
+        }
@@ -2,34 +2,90 @@ import string  # Manejo de cadenas de texto
 from typing import Union
 import unicodedata   # Anotaciones de tipos
 import constantes
-import random
+import fuente_aleatoria
 
 # Para el cifrado Cesar de los párrafos de descripción del usuario se usa un alfabeto extendido que incluye letras, dígitos y signos de puntuación
 alfabeto_extendido = constantes.ALFABETO_EXTENDIDO
 simbolos_permitidos = constantes.SIMBOLOS_PERMITIDOS
 numeros_permitidos = string.digits
 
+tam_alfabeto = len(alfabeto_extendido)
+ruido_permitido = simbolos_permitidos + numeros_permitidos
+MARCA_RUIDO = "\x00"  # Marca temporal de caracter fuera del alfabeto (nunca aparece en la salida)
+
+# Rango de puntos de código cubierto por la tabla de acentos (Latin-1 + Latin Extendido A/B)
+LIMITE_TABLA_ACENTOS = 0x250
+
+
+def _quitar_diacriticos(cadena: str) -> str:
+    """Eliminar acentos y diacríticos (NFD + descartar caracteres combinantes)."""
+    cadena = unicodedata.normalize('NFD', cadena)
+    return "".join([c for c in cadena if not unicodedata.combining(c)])
+
+
+# Tabla de acentos: cada caracter del rango se traduce a su versión sin diacríticos y
+# los espacios se eliminan. Equivale a replace(" ", "") + NFD + filtro de combinantes
+TABLA_ACENTOS = str.maketrans({chr(cp): _quitar_diacriticos(chr(cp)) for cp in range(LIMITE_TABLA_ACENTOS)})
+TABLA_ACENTOS[ord(" ")] = None
+
+# Una tabla de traducción por cada desplazamiento posible (0..80):
+# caracteres del alfabeto -> caracter cifrado, resto de ASCII -> MARCA_RUIDO
+_indice_alfabeto = {caracter: indice for indice, caracter in enumerate(alfabeto_extendido)}
+TABLAS_CESAR = []
+for _desplazamiento in range(tam_alfabeto):
+    _tabla = {cp: MARCA_RUIDO for cp in range(128)}
+    for _caracter, _indice in _indice_alfabeto.items():
+        _tabla[ord(_caracter)] = alfabeto_extendido[(_indice + _desplazamiento) % tam_alfabeto]
+    TABLAS_CESAR.append(_tabla)
+
+
+def normalizar_descripcion(cadena_usuario: str) -> str:
+    """Elimina espacios, acentos y diacríticos de la descripción del usuario."""
+    cadena = cadena_usuario.translate(TABLA_ACENTOS)
+    if cadena.isascii():
+        return cadena
+    # Caracteres fuera de la tabla (incluye combinantes sueltos, U+0300 en adelante) -> ruta completa con unicodedata
+    if max(cadena) >= chr(LIMITE_TABLA_ACENTOS):
+        return _quitar_diacriticos(cadena_usuario.replace(" ", ""))
+    return cadena
+
+
 # Cifrado de Sustitución por Desplazamiento con Preprocesamiento de Datos y Ofuscación de Ruido -> Basado en <Cifrado César Cíclico del párrafo
-def preprocesador_cadena(cadena_usuario, desplazamiento):
-
-    cadena_cifrada = ""
-    cadena_usuario = cadena_usuario.replace(" ", "")  # Eliminar espacios en blanco
-    cadena_usuario = unicodedata.normalize('NFD', cadena_usuario)
-    cadena_usuario = "".join([c for c in cadena_usuario if not unicodedata.combining(c)])  # Eliminar acentos y diacríticos
-    for caracter in cadena_usuario:
-        if caracter in alfabeto_extendido:
-            indice_original = alfabeto_extendido.index(caracter)
-            # Se suma el desplazamiento y se usa el modulo para evitar salir del rango del alfabeto
-            indice_cifrado = (indice_original + desplazamiento) % len(alfabeto_extendido)
-            #Reemplazo del caracter original por el caracter cifrado
-            cadena_cifrada += alfabeto_extendido[indice_cifrado]
-    
-        else:
-            cadena_cifrada += random.choice(simbolos_permitidos + numeros_permitidos)  # Reemplazar caracteres no permitidos con un carácter aleatorio del alfabeto extendido
-    cadena_cifrada = cadena_cifrada.strip()  # Eliminar espacios en blanco al inicio y al final
-    #indice_cifrado = desplazamiento  # Retornar el índice de cifrado usado
+def preprocesador_cadena(cadena_usuario, desplazamiento, fuente=None):
+    cadena_usuario = normalizar_descripcion(cadena_usuario)
+    if not cadena_usuario.isascii():
+        # Los caracteres no ASCII nunca pertenecen al alfabeto extendido
+        cadena_usuario = "".join([c if c < "\x80" else MARCA_RUIDO for c in cadena_usuario])
+
+    # Se suma el desplazamiento y se usa el modulo para evitar salir del rango del alfabeto (tabla precalculada)
+    cadena_cifrada = cadena_usuario.translate(TABLAS_CESAR[desplazamiento % tam_alfabeto])
+
+    # Índice del último caracter cifrado del alfabeto (mismo valor que devolvía el recorrido caracter a caracter)
+    ultimo_valido = cadena_cifrada.rstrip(MARCA_RUIDO)
+    indice_cifrado = _indice_alfabeto[ultimo_valido[-1]] if ultimo_valido else None
+
+    if MARCA_RUIDO in cadena_cifrada:
+        # Reemplazar caracteres no permitidos con un carácter aleatorio (en orden, uno por caracter)
+        partes = cadena_cifrada.split(MARCA_RUIDO)
+        fuente = fuente or fuente_aleatoria.fuente_actual()
+        ruido = [fuente.choice(ruido_permitido) for _ in range(len(partes) - 1)]
+        cadena_cifrada = "".join([parte + r for parte, r in zip(partes, ruido)]) + partes[-1]
 
+    # La salida solo contiene caracteres del alfabeto y ruido, no hay espacios que recortar
     return cadena_cifrada, indice_cifrado
+
+
+def preprocesador_cadenas_lote(cadenas_usuario, desplazamientos, fuente=None):
+    """
+    Cifra una lista de descripciones. desplazamientos puede ser un entero (el mismo para todas)
+    o una lista con un desplazamiento por descripción. Devuelve [(cadena_cifrada, indice_cifrado), ...].
+    """
+    if isinstance(desplazamientos, int):
+        desplazamientos = [desplazamientos] * len(cadenas_usuario)
+    fuente = fuente or fuente_aleatoria.fuente_actual()
+    return [preprocesador_cadena(cadena, int(d), fuente) for cadena, d in zip(cadenas_usuario, desplazamientos)]
+
+
 """# Ejemplo de uso
 cadena_usuario = "Hola, Mundo! 123"
 cadena_cifrada = preprocesador_cadena(cadena_usuario, 8)  
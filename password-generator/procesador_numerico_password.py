@@ -5,8 +5,9 @@ import os
 import string
 from typing import List, Union
 import preprocesador_texto
-import random
+import fuente_aleatoria
 import constantes
+import registro_tags
 
 # Definición del Alfabeto Extendido (Debe coincidir exactamente con el usado en el cifrado)
 SIMBOLOS_PERMITIDOS = constantes.SIMBOLOS_PERMITIDOS
@@ -44,30 +45,17 @@ def cargar_valores_de_usuario(nombre_archivo: str) -> Union[List[float], None]:
     
 def cargar_tag_redes(nombre_archivo: str, plataforma_actual: str) -> str | None:
     """
-    Carga el contenido de un archivo JSON y devuelve el tag
-    asociado a la plataforma especificada.
+    Devuelve el tag asociado a la plataforma especificada.
+    Los tags se sirven desde el registro en memoria (registro_tags), que solo
+    vuelve a leer el archivo JSON cuando este cambia.
 
     """
     try:
-        # Abrir y leer el archivo JSON
-        with open(nombre_archivo, 'r', encoding='utf-8') as archivo:
-            # Los datos cargados son un diccionario: {"Plataforma": "Tag"}
-            datos_redes = json.load(archivo)
-
-            # Verificar si la plataforma existe en el diccionario
-            if plataforma_actual in datos_redes:
-                # Devolver el tag asociado
-                return datos_redes[plataforma_actual]
-            else:
-                print(f"Advertencia: No se encontró la plataforma '{plataforma_actual}' en el archivo JSON.")
-                return None
-
-    except FileNotFoundError:
-        print(f"Error: El archivo '{nombre_archivo}' no se encontró en la ruta: {os.path.abspath(nombre_archivo)}")
-        return None
-    except json.JSONDecodeError:
-        print(f"Error: El archivo '{nombre_archivo}' no tiene un formato JSON válido.")
-        return None
+        # Los datos del registro son un diccionario: {"Plataforma": "Tag"}
+        tag = registro_tags.obtener_registro(nombre_archivo).obtener(plataforma_actual)
+        if tag is None:
+            print(f"Advertencia: No se encontró la plataforma '{plataforma_actual}' en el archivo JSON.")
+        return tag
     except Exception as e:
         print(f"Ocurrió un error inesperado al cargar los datos: {e}")
         return None
@@ -116,17 +104,19 @@ def recoger_semilla_longitud(tag_plataforma: str, lista_valores: List[float]) ->
     semilla = penultimo_digito * ultimo_digito_tag
     return semilla
 
-def generar_longitud(min_length: int = longitud_minima, max_length: int = longitud_maxima) -> int:
+def generar_longitud(min_length: int = longitud_minima, max_length: int = longitud_maxima, fuente=None) -> int:
     """Genera una longitud para la contraseña entre min_length y max_length ."""
     #random.seed(semilla)
-    numero = random.randint(min_length, max_length)
+    fuente = fuente or fuente_aleatoria.fuente_actual()
+    numero = fuente.randint(min_length, max_length)
     
     #random.seed()  # Restablecer la semilla del generador de números aleatorios
     return numero
 
-def generar_punto_inicio() -> int:
+def generar_punto_inicio(fuente=None) -> int:
     """Genera un punto de inicio aleatorio para la selección de caracteres en la contraseña."""
-    punto_inicio = random.randint(constantes.minimos_generacion_punto_inicio, constantes.maximos_generacion_punto_inicio)
+    fuente = fuente or fuente_aleatoria.fuente_actual()
+    punto_inicio = fuente.randint(constantes.minimos_generacion_punto_inicio, constantes.maximos_generacion_punto_inicio)
     return punto_inicio
     
 
@@ -1,13 +1,24 @@
 import os
 import curva_eliptica
-import json
+import almacen_registros
 
-def leer_entrada_por_id(id_usuario: str, archivo:str) -> dict:
-    if not os.path.exists(archivo):
+
+def _almacen_existente(archivo: str) -> almacen_registros.AlmacenRegistros:
+    base = os.path.splitext(archivo)[0]
+    if not os.path.exists(archivo) and not os.path.exists(base + ".log"):
         raise FileNotFoundError(f"No existe {archivo}")
-    with open(archivo, "r", encoding="utf-8") as f:
-        lista = json.load(f)
-    for e in lista:
-        if e.get("id_usuario") == id_usuario:
-            return e
-    raise KeyError(f"No se encontró id_usuario={id_usuario} en {archivo}")
\ No newline at end of file
+    return almacen_registros.obtener_almacen(archivo)
+
+
+def leer_entrada_por_id(id_usuario: str, archivo:str) -> dict:
+    entrada = _almacen_existente(archivo).obtener_por_usuario(id_usuario)
+    if entrada is None:
+        raise KeyError(f"No se encontró id_usuario={id_usuario} en {archivo}")
+    return entrada
+
+
+def leer_entrada(id_usuario: str, plataforma: str, archivo: str) -> dict:
+    entrada = _almacen_existente(archivo).obtener(id_usuario, plataforma.encode('utf-8').hex())
+    if entrada is None:
+        raise KeyError(f"No se encontró id_usuario={id_usuario} plataforma={plataforma} en {archivo}")
+    return entrada
@@ -0,0 +1,121 @@
+# Registro en memoria de los tags de plataforma (redes_sociales_con_tags.json)
+# - Se carga una sola vez y las búsquedas se sirven desde un diccionario
+# - Se recarga solo si cambia el mtime/tamaño del archivo y además cambia el hash del contenido
+# - Las escrituras son atómicas (archivo temporal + os.replace) para que ningún worker lea un JSON a medias
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+# Segundos mínimos entre dos comprobaciones del archivo (os.stat) desde el camino de petición
+INTERVALO_REVISION = float(os.environ.get("TAGS_INTERVALO_REVISION", "1.0"))
+
+
+def escribir_json_atomico(nombre_archivo: str, datos) -> bytes:
+    """Escribe el JSON en un temporal del mismo directorio y lo renombra sobre el destino.
+    Devuelve el contenido escrito."""
+    contenido = json.dumps(datos, ensure_ascii=False, indent=4).encode("utf-8")
+    directorio = os.path.dirname(os.path.abspath(nombre_archivo))
+    descriptor, ruta_temporal = tempfile.mkstemp(prefix=".tmp_", suffix=".json", dir=directorio)
+    try:
+        with os.fdopen(descriptor, "wb") as f:
+            f.write(contenido)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(ruta_temporal, nombre_archivo)  # Atómico en el mismo sistema de archivos
+    except BaseException:
+        if os.path.exists(ruta_temporal):
+            os.remove(ruta_temporal)
+        raise
+    return contenido
+
+
+class RegistroTags:
+    """Tags de plataforma en memoria con recarga automática cuando el archivo cambia."""
+
+    def __init__(self, nombre_archivo: str, intervalo_revision: float = INTERVALO_REVISION):
+        self.nombre_archivo = nombre_archivo
+        self.intervalo_revision = intervalo_revision
+        self._tags: Dict[str, str] = {}
+        self._firma_stat = None      # (mtime_ns, tamaño) de la última lectura
+        self._hash_contenido = None  # SHA-256 del contenido cargado
+        self._ultima_revision = 0.0
+        self._lock = threading.Lock()
+        self.recargas = 0
+
+    def _revisar(self, forzar: bool = False) -> None:
+        ahora = time.monotonic()
+        if not forzar and ahora - self._ultima_revision < self.intervalo_revision:
+            return
+        with self._lock:
+            if not forzar and ahora - self._ultima_revision < self.intervalo_revision:
+                return
+            self._ultima_revision = ahora
+            try:
+                stat = os.stat(self.nombre_archivo)
+            except FileNotFoundError:
+                print(f"Error: El archivo '{self.nombre_archivo}' no se encontró en la ruta: {os.path.abspath(self.nombre_archivo)}")
+                return
+            firma = (stat.st_mtime_ns, stat.st_size)
+            if not forzar and firma == self._firma_stat:
+                return
+
+            with open(self.nombre_archivo, "rb") as f:
+                contenido = f.read()
+            self._firma_stat = firma
+            hash_contenido = hashlib.sha256(contenido).hexdigest()
+            if hash_contenido == self._hash_contenido:
+                return  # Solo cambió el mtime (p. ej. touch): no se vuelve a parsear
+            try:
+                datos = json.loads(contenido.decode("utf-8"))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                # Se mantienen los últimos tags válidos
+                print(f"Error: El archivo '{self.nombre_archivo}' no tiene un formato JSON válido.")
+                return
+            self._tags = dict(datos)
+            self._hash_contenido = hash_contenido
+            self.recargas += 1
+
+    def recargar(self) -> None:
+        """Fuerza la relectura del archivo."""
+        self._revisar(forzar=True)
+
+    def obtener(self, plataforma: str) -> Optional[str]:
+        """Devuelve el tag de la plataforma o None si no existe."""
+        self._revisar()
+        return self._tags.get(plataforma)
+
+    def todos(self) -> Dict[str, str]:
+        self._revisar()
+        return dict(self._tags)
+
+    def guardar(self, tags: Dict[str, str]) -> None:
+        """Escribe los tags de forma atómica y actualiza el registro en memoria."""
+        with self._lock:
+            contenido = escribir_json_atomico(self.nombre_archivo, tags)
+            self._tags = dict(tags)
+            self._hash_contenido = hashlib.sha256(contenido).hexdigest()
+            stat = os.stat(self.nombre_archivo)
+            self._firma_stat = (stat.st_mtime_ns, stat.st_size)
+            self._ultima_revision = time.monotonic()
+
+
+_registros: Dict[str, RegistroTags] = {}
+_registros_lock = threading.Lock()
+
+
+def obtener_registro(nombre_archivo: str) -> RegistroTags:
+    """Registro compartido (uno por ruta de archivo) dentro del proceso."""
+    clave = os.path.abspath(nombre_archivo)
+    registro = _registros.get(clave)
+    if registro is None:
+        with _registros_lock:
+            registro = _registros.get(clave)
+            if registro is None:
+                registro = RegistroTags(clave)
+                registro.recargar()
+                _registros[clave] = registro
+    return registro
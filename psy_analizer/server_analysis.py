@@ -9,7 +9,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from fastapi import FastAPI, HTTPException, Request
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from datetime import datetime
 import time
 import uuid, json, hmac, hashlib, os, requests
@@ -54,7 +54,15 @@ def canonical_json(obj: Any) -> bytes:
         separators=(",", ":"),
     ).encode("utf-8")
 
-def verify_node_signature(body: dict, sig: str, ts: str):
+# Versiones de firma HMAC (cabecera X-Signature-Version)
+#   v1 -> HMAC sobre "ts." + JSON canónico (claves ordenadas), clientes antiguos
+#   v2 -> HMAC sobre "ts." + bytes exactos del cuerpo (sin re-serializar)
+SIGNATURE_VERSION_HEADER = "x-signature-version"
+SIGNATURE_V1 = "v1"
+SIGNATURE_V2 = "v2"
+SIGNATURE_VERSIONS = (SIGNATURE_V1, SIGNATURE_V2)
+
+def _check_node_signature(body_bytes: bytes, sig: str, ts: str):
     if not sig or not ts:
         raise HTTPException(status_code=401, detail="Missing signature headers")
 
@@ -68,7 +76,7 @@ def verify_node_signature(body: dict, sig: str, ts: str):
     if abs(now - req_time) > 600_000:
         raise HTTPException(status_code=401, detail="Expired timestamp")
 
-    msg = f"{ts}.".encode() + canonical_json(body)
+    msg = f"{ts}.".encode() + body_bytes
 
     expected = hmac.new(
         NODE_ANALYZER_SECRET.encode(),
@@ -79,6 +87,39 @@ def verify_node_signature(body: dict, sig: str, ts: str):
     if not hmac.compare_digest(expected, sig):
         raise HTTPException(status_code=401, detail="Invalid signature")
 
+def verify_node_signature(body: dict, sig: str, ts: str):
+    _check_node_signature(canonical_json(body), sig, ts)
+
+def verify_node_raw_signature(raw_body: bytes, sig: str, ts: str):
+    _check_node_signature(raw_body, sig, ts)
+
+async def read_signed_node_body(request: Request) -> dict:
+    """
+    Verifica la firma de Node según x-signature-version y devuelve el cuerpo parseado.
+    En v2 se verifica sobre los bytes crudos antes de decodificar el JSON.
+    """
+    version = request.headers.get(SIGNATURE_VERSION_HEADER, SIGNATURE_V1).strip().lower()
+    if version not in SIGNATURE_VERSIONS:
+        raise HTTPException(status_code=400, detail=f"Unsupported signature version: {version}")
+
+    sig = request.headers.get("x-payload-signature")
+    ts = request.headers.get("x-timestamp")
+    raw_body = await request.body()
+
+    if version == SIGNATURE_V2:
+        verify_node_raw_signature(raw_body, sig, ts)
+
+    try:
+        body = json.loads(raw_body)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+
+    if version == SIGNATURE_V1:
+        verify_node_signature(body, sig, ts)
+    return body
+
 # Obtener IP real del cliente (detrás de proxy)
 def get_real_client_ip(request: Request) -> str:
     xff = request.headers.get("x-forwarded-for")
@@ -115,17 +156,19 @@ class BioRegistrationPayload(BaseModel):
     session_token: str
 # Endpoint para recibir datos desde Node después de BIOMETRÍA
 @app.post("/api/biometric-registration")
-async def biometric_registration(request: Request, data: BioRegistrationPayload):
+async def biometric_registration(request: Request):
     print("🔥 POST biometric-registration ejecutado")
     """
     Recibe datos del server Node (backend central) después de que BIOMETRÍA
     completa el registro y provee la cadena de valores psicológicos.
     """
     try:
-        # Verificar firma HMAC-SHA256
-        sig = request.headers.get("x-payload-signature")
-        ts = request.headers.get("x-timestamp")
-        verify_node_signature(data.dict(), sig, ts)
+        # Verificar firma HMAC-SHA256 (antes de validar el payload)
+        body = await read_signed_node_body(request)
+        try:
+            data = BioRegistrationPayload(**body)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors())
 
         print("🔵 —— DATA RECIBIDA DESDE NODE ——")
 
@@ -247,6 +290,7 @@ async def generator_init(request: Request, data: GeneratorInit):
         
     }
 
+    # Firma v2: se firman exactamente los bytes que se envían
     body_bytes = canonical_json(outbound_payload)
     signature = hmac.new(
         GEN_SECRET.encode("utf-8"),
@@ -255,7 +299,8 @@ async def generator_init(request: Request, data: GeneratorInit):
     ).hexdigest()
     headers = {
         "Content-Type": "application/json",
-        "X-Payload-Signature": signature
+        "X-Payload-Signature": signature,
+        "X-Signature-Version": SIGNATURE_V2
     }
     
     if DEBUG_LOGS:
@@ -264,7 +309,7 @@ async def generator_init(request: Request, data: GeneratorInit):
         #print("DEBUG Body:", outbound_payload)
 
     try:
-        resp = requests.post(f"{GENERATION_SERVER_URL}/generate", json=outbound_payload, headers=headers, timeout=5)
+        resp = requests.post(f"{GENERATION_SERVER_URL}/generate", data=body_bytes, headers=headers, timeout=5)
         if resp.status_code != 200:
             raise Exception(resp.text)
         add_log(request_id, "Datos enviados al generador final")